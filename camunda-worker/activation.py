@@ -0,0 +1,142 @@
+import asyncio
+import os
+
+from pyzeebe import ZeebeWorker
+from pyzeebe.worker.job_poller import JobPoller
+
+# Job activation settings per task type.
+#
+# Every task type starts from the defaults of its kind ("rule" or "ai"),
+# each overridable with ZEEBE_RULE_<SETTING> / ZEEBE_AI_<SETTING>, and then
+# per task type with ZEEBE_<TASK_TYPE>_<SETTING>, where <TASK_TYPE> is the
+# type upper-cased with dashes as underscores, e.g.
+# ZEEBE_AI_REPORT_TIMEOUT_MS or ZEEBE_WIRE_TRANSPARENCY_MAX_RUNNING_JOBS.
+#
+#   max_jobs_to_activate - jobs requested per activation call
+#   max_running_jobs     - jobs held by this worker at once
+#   timeout_ms           - how long Zeebe waits before handing a job to another worker
+#   poll_interval_ms     - wait before polling again when no job slot is free
+DEFAULTS = {
+    "rule": {"max_jobs_to_activate": 64, "max_running_jobs": 128, "timeout_ms": 10000, "poll_interval_ms": 50},
+    "ai": {"max_jobs_to_activate": 4, "max_running_jobs": 4, "timeout_ms": 300000, "poll_interval_ms": 1000},
+}
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+def task_settings(task_type: str, kind: str = "rule", **defaults) -> dict:
+    """Activation settings for `task_type`; `defaults` override the kind's."""
+    settings = dict(DEFAULTS[kind], **defaults)
+    prefix = task_type.upper().replace("-", "_")
+    return {
+        name: _env_int(f"ZEEBE_{prefix}_{name.upper()}", _env_int(f"ZEEBE_{kind.upper()}_{name.upper()}", value))
+        for name, value in settings.items()
+    }
+
+def task_options(settings: dict) -> dict:
+    """The subset of `settings` that ZeebeTaskRouter.task accepts."""
+    return {k: settings[k] for k in ("max_jobs_to_activate", "max_running_jobs", "timeout_ms")}
+
+# -------------------------------
+# Adaptive backpressure
+# -------------------------------
+class AdaptiveLimit:
+    """Running-job limit for one task type that backs off under load.
+
+    Each agent call reports its latency and outcome through `record`.
+    While the smoothed latency stays under `target_latency` seconds and the
+    smoothed error rate under `max_error_rate`, the limit grows by about
+    one per `limit` calls, up to `max_limit`. A slow or failed call cuts it
+    by `backoff`, down to `min_limit`. The job poller reads `current`
+    before each activation, so fewer AI jobs are taken from the broker
+    while the agent service struggles and the rest stay queued in Zeebe.
+    """
+
+    def __init__(self, max_limit, min_limit=1, target_latency=30.0, max_error_rate=0.2, backoff=0.7, smoothing=0.2):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.limit = float(self.max_limit)
+        self.latency = 0.0
+        self.error_rate = 0.0
+
+    def record(self, latency: float, ok: bool):
+        a = self.smoothing
+        self.latency = latency if not self.latency else (1 - a) * self.latency + a * latency
+        self.error_rate = (1 - a) * self.error_rate + a * (0.0 if ok else 1.0)
+        if not ok or self.latency > self.target_latency or self.error_rate > self.max_error_rate:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    def stats(self) -> dict:
+        return {"limit": self.current, "latency": round(self.latency, 3), "error_rate": round(self.error_rate, 3)}
+
+# -------------------------------
+# Worker
+# -------------------------------
+class TunedJobPoller(JobPoller):
+    """JobPoller with its own poll interval and an optional adaptive limit,
+    scaled by `scale` running jobs per unit of limit."""
+
+    def __init__(self, *args, poll_interval=0.05, limit=None, scale=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.poll_interval = poll_interval
+        self.limit = limit
+        self.scale = scale
+
+    async def activate_max_jobs(self) -> None:
+        if self.calculate_max_jobs_to_activate() > 0:
+            await self.poll_once()
+        else:
+            await asyncio.sleep(self.poll_interval)
+
+    def calculate_max_jobs_to_activate(self) -> int:
+        max_running = self.task.config.max_running_jobs
+        if self.limit is not None:
+            max_running = min(max_running, self.limit.current * self.scale)
+        return min(max_running - self.task_state.count_active(), self.task.config.max_jobs_to_activate)
+
+
+class TunedWorker(ZeebeWorker):
+    """ZeebeWorker that polls each task type on its own schedule.
+
+    `settings` maps task type to its task_settings (for the poll interval);
+    `limits` maps task type to `(AdaptiveLimit, scale)`. Every task type
+    still has its own poller, queue and running-job count, so a backlog of
+    AI jobs never delays activation of rule jobs.
+    """
+
+    def __init__(self, grpc_channel, settings=None, limits=None, **kwargs):
+        super().__init__(grpc_channel, **kwargs)
+        self.settings = settings or {}
+        self.limits = limits or {}
+
+    def _init_tasks(self) -> None:
+        super()._init_tasks()
+        self._job_pollers = [self._tuned(poller) for poller in self._job_pollers]
+
+    def _tuned(self, poller: JobPoller) -> TunedJobPoller:
+        task_type = poller.task.type
+        limit, scale = self.limits.get(task_type, (None, 1))
+        return TunedJobPoller(
+            zeebe_adapter=poller.zeebe_adapter,
+            task=poller.task,
+            queue=poller.queue,
+            worker_name=poller.worker_name,
+            request_timeout=poller.request_timeout,
+            task_state=poller.task_state,
+            poll_retry_delay=poller.poll_retry_delay,
+            tenant_ids=poller.tenant_ids,
+            poll_interval=self.settings.get(task_type, DEFAULTS["rule"])["poll_interval_ms"] / 1000,
+            limit=limit,
+            scale=scale,
+        )
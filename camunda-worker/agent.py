@@ -1,10 +1,20 @@
+import logging
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from azure.ai.projects import AIProjectClient
 from azure.identity import DefaultAzureCredential
-from azure.ai.agents.models import CodeInterpreterTool
+from azure.ai.agents.models import AgentStreamEvent, CodeInterpreterTool, MessageDeltaChunk, ThreadRun, TruncationObject
 import json
 
+from metrics import METRICS
+from streaming import FieldStream
+
+log = logging.getLogger("agent")
+
 # Create an AIProjectClient from an endpoint, copied from your Azure AI Foundry project.
 # You need to login to Azure subscription via Azure CLI and set the environment variables
 subscription_id = ""
@@ -13,89 +23,342 @@ resource_name=""
 project_name = ""  # Extracted from your URL
 # agent_id = ""
 
-def run_non_deterministic(agent_id, message_text="Hello from Python!"):
-    """Test communication with an existing Azure AI Foundry agent"""
-    
-    print("🔧 Configuration:")
-    print(f"   Subscription ID: {subscription_id}")
-    print(f"   Resource Group: {resource_group_name}")
-    print(f"   Project Name: {project_name}")
-    print(f"   Agent ID: {agent_id}")
-    print(f"   Authentication: DefaultAzureCredential (az login)")
-    print("=" * 60)
-    
-    try:
-        # Create an AIProjectClient instance
-        print("🔐 Authenticating with Azure AI Foundry...")
-        # Correct endpoint format: https://<ai-services-account>.services.ai.azure.com/api/projects/<project-name>
-        endpoint = f"https://{resource_name}.services.ai.azure.com/api/projects/{project_name}"
-        print(f"🌐 Using endpoint: {endpoint}")
-        
-        project_client = AIProjectClient(
-            endpoint=endpoint,
-            credential=DefaultAzureCredential(),  # Uses az login credentials
-        )
-        print("✅ Successfully created AI Project Client")
-        
-        with project_client:
-            # First, let's try to list available agents to verify our agent exists
-            print("\n🔍 Listing available agents...")
-            agent_found = False
+# Client pool and agent cache settings
+CLIENT_POOL_SIZE = int(os.getenv("AGENT_CLIENT_POOL_SIZE", "4"))
+CLIENT_MAX_AGE_SECONDS = float(os.getenv("AGENT_CLIENT_MAX_AGE_SECONDS", "3600"))
+CLIENT_WAIT_SECONDS = float(os.getenv("AGENT_CLIENT_WAIT_SECONDS", "60"))
+AGENT_CACHE_TTL_SECONDS = float(os.getenv("AGENT_CACHE_TTL_SECONDS", "300"))
+
+# Agent thread (conversation) policy, see AgentThreads:
+#   reuse  - keep up to AGENT_THREAD_POOL_SIZE idle threads per agent and
+#            run each new call on one of them
+#   delete - a new thread per call, deleted once the call is done
+AGENT_THREAD_POLICY = os.getenv("AGENT_THREAD_POLICY", "reuse")
+AGENT_THREAD_POOL_SIZE = int(os.getenv("AGENT_THREAD_POOL_SIZE", "4"))
+AGENT_THREAD_MAX_RUNS = int(os.getenv("AGENT_THREAD_MAX_RUNS", "50"))
+AGENT_THREAD_MAX_AGE_SECONDS = float(os.getenv("AGENT_THREAD_MAX_AGE_SECONDS", "3600"))
+
+
+def _endpoint():
+    # Correct endpoint format: https://<ai-services-account>.services.ai.azure.com/api/projects/<project-name>
+    return f"https://{resource_name}.services.ai.azure.com/api/projects/{project_name}"
+
+
+class ClientPool:
+    """Process-wide pool of AIProjectClient instances sharing one credential.
+
+    Clients keep their HTTP connections open between calls and are only
+    rebuilt once they are older than `max_age` seconds. At most `size`
+    clients exist at a time; callers beyond that wait up to `wait` seconds
+    for one to be returned, then get a TimeoutError.
+    """
+
+    def __init__(self, size=CLIENT_POOL_SIZE, max_age=CLIENT_MAX_AGE_SECONDS, wait=CLIENT_WAIT_SECONDS):
+        self.size = size
+        self.max_age = max_age
+        self.wait = wait
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._credential = None
+
+    def _new_client(self):
+        with self._lock:
+            if self._credential is None:
+                log.info("Authenticating with Azure AI Foundry", extra={
+                    "subscription_id": subscription_id, "resource_group": resource_group_name, "project": project_name,
+                })
+                self._credential = DefaultAzureCredential()  # Uses az login credentials
+        client = AIProjectClient(endpoint=_endpoint(), credential=self._credential)
+        log.info("Created AI project client", extra={"endpoint": _endpoint()})
+        return client, time.monotonic()
+
+    def _replace(self, client=None):
+        """A new client taking the slot of `client` (closed first), or a
+        newly counted slot; the slot is given up if creation fails."""
+        if client is not None:
+            client.close()
+        try:
+            return self._new_client()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def client(self):
+        entry = None
+        try:
+            entry = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                entry = self._replace()
+            else:
+                try:
+                    entry = self._idle.get(timeout=self.wait)
+                except queue.Empty:
+                    raise TimeoutError(f"no AI project client free after {self.wait}s ({self.size} in use)") from None
+
+        if time.monotonic() - entry[1] > self.max_age:
+            entry = self._replace(entry[0])
+
+        try:
+            yield entry[0]
+        finally:
+            self._idle.put(entry)
+
+    def close(self):
+        while True:
             try:
-                agents = project_client.agents.list_agents()
-                print("✅ Available agents:")
-                for agent in agents:
-                    print(f"   - ID: {agent.id}, Name: {getattr(agent, 'name', 'N/A')}")
-                    if agent.id == agent_id:
-                        print(f"     ✅ Found target agent: {getattr(agent, 'name', 'N/A')}")
-                        agent_found = True
-                
-                if not agent_found:
-                    print(f"❌ Agent with ID '{agent_id}' not found!")
-                    print("Available agent IDs:")
-                    for agent in agents:
-                        print(f"   - {agent.id}")
+                client, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            client.close()
+            with self._lock:
+                self._created -= 1
+
+
+class AgentCache:
+    """TTL cache of the project's agents, refreshed with a single list call."""
+
+    def __init__(self, ttl=AGENT_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._agents = {}
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, project_client, agent_id):
+        """Return the agent's metadata, or None if the project has no such agent."""
+        with self._lock:
+            if time.monotonic() >= self._expires:
+                self.refresh(project_client)
+            return self._agents.get(agent_id)
+
+    def refresh(self, project_client):
+        log.debug("Refreshing agent cache")
+        self._agents = {agent.id: agent for agent in project_client.agents.list_agents()}
+        self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        with self._lock:
+            self._expires = 0.0
+
+
+class ThreadLease:
+    """An agent thread checked out for one run. Set `reusable` once the run
+    completed cleanly; anything else retires the thread."""
+
+    __slots__ = ("agent_id", "id", "runs", "created", "reusable")
+
+    def __init__(self, agent_id, thread_id, runs=0, created=None):
+        self.agent_id = agent_id
+        self.id = thread_id
+        self.runs = runs
+        self.created = time.monotonic() if created is None else created
+        self.reusable = False
+
+
+class AgentThreads:
+    """Per-agent pool of agent threads with background deletion.
+
+    With policy "reuse", a finished thread goes back to its agent's idle
+    list (at most `size` per agent) and is handed to the next call, which
+    saves creating one; runs on it are truncated to the latest message so
+    earlier calls never leak into a verdict. A thread is retired after
+    `max_runs` runs or `max_age` seconds, after a failed run, or when the
+    idle list is full. With policy "delete" every thread is retired after
+    its run. Retired threads are deleted by a background thread, so the
+    number of threads alive on the service stays bounded.
+    """
+
+    def __init__(self, policy=AGENT_THREAD_POLICY, size=AGENT_THREAD_POOL_SIZE,
+                 max_runs=AGENT_THREAD_MAX_RUNS, max_age=AGENT_THREAD_MAX_AGE_SECONDS):
+        if policy not in ("reuse", "delete"):
+            raise ValueError(f"unknown agent thread policy: {policy}")
+        self.policy = policy
+        self.size = size
+        self.max_runs = max_runs
+        self.max_age = max_age
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._retired = queue.Queue()
+        self._cleaner = None
+
+    @property
+    def truncation(self):
+        """Truncation strategy for runs on pooled threads."""
+        if self.policy == "reuse":
+            return TruncationObject(type="last_messages", last_messages=1)
+        return None
+
+    @contextmanager
+    def thread(self, project_client, agent_id):
+        """Check out a thread for one run on `agent_id`."""
+        lease = None
+        with self._lock:
+            idle = self._idle.get(agent_id)
+            while idle and lease is None:
+                lease = idle.pop()
+                if time.monotonic() - lease.created > self.max_age:
+                    self.retire(lease)
+                    lease = None
+        if lease is None:
+            with _phase("thread_create"):
+                thread = project_client.agents.threads.create()
+            lease = ThreadLease(agent_id, thread.id)
+            METRICS.inc("agent_threads_created_total")
+        else:
+            METRICS.inc("agent_threads_reused_total")
+        try:
+            yield lease
+        finally:
+            lease.runs += 1
+            self.release(lease)
+
+    def release(self, lease):
+        keep = (
+            self.policy == "reuse" and lease.reusable
+            and lease.runs < self.max_runs
+            and time.monotonic() - lease.created <= self.max_age
+        )
+        if keep:
+            lease.reusable = False
+            with self._lock:
+                idle = self._idle.setdefault(lease.agent_id, [])
+                if len(idle) < self.size:
+                    idle.append(lease)
                     return
-                    
+        self.retire(lease)
+
+    def retire(self, lease):
+        """Queue the thread for deletion."""
+        self._retired.put(lease)
+        METRICS.set("agent_threads_pending_delete", self._retired.qsize())
+        with self._lock:
+            if self._cleaner is None:
+                self._cleaner = threading.Thread(target=self._clean, name="agent-thread-cleanup", daemon=True)
+                self._cleaner.start()
+
+    def _clean(self):
+        while True:
+            lease = self._retired.get()
+            if lease is None:
+                return
+            try:
+                with client_pool.client() as project_client:
+                    project_client.agents.threads.delete(lease.id)
+                METRICS.inc("agent_threads_deleted_total", status="ok")
             except Exception as e:
-                print(f"❌ Error listing agents: {e}")
-                print("Continuing with the provided agent ID...")
-                agent_found = True  # Continue even if listing fails
-            
-            # Create a thread for communication
-            print(f"\n📝 Creating a new thread...")
-            thread = project_client.agents.threads.create()
-            print(f"✅ Created thread with ID: {thread.id}")
-            
-            # Add a message to the thread
-            print(f"\n💬 Adding message to thread...")
-            message = project_client.agents.messages.create(
-                thread_id=thread.id,
-                role="user",
-                content=message_text,
-            )
-            print(f"✅ Created message with ID: {message.id}")
-            print(f"📤 Message content: {message_text}")
-            
-            # Create and process an agent run
-            print(f"\n🚀 Creating and processing agent run...")
-            run = project_client.agents.runs.create_and_process(
-                thread_id=thread.id,
-                agent_id=agent_id,
-                additional_instructions="Please provide a helpful and detailed response.",
-            )
-            print(f"✅ Run completed with status: {run.status}")
-            
-            # Check if the run failed
-            if run.status == "failed":
-                print(f"❌ Run failed: {getattr(run, 'last_error', 'Unknown error')}")
+                METRICS.inc("agent_threads_deleted_total", status="error")
+                log.warning("Could not delete agent thread", extra={"thread_id": lease.id, "error": str(e)})
+            METRICS.set("agent_threads_pending_delete", self._retired.qsize())
+
+    def close(self, timeout=30.0):
+        """Delete the idle threads and wait up to `timeout` seconds for the
+        pending deletions."""
+        with self._lock:
+            leases = [lease for idle in self._idle.values() for lease in idle]
+            self._idle.clear()
+        for lease in leases:
+            self.retire(lease)
+        with self._lock:
+            cleaner, self._cleaner = self._cleaner, None
+        if cleaner is not None:
+            self._retired.put(None)
+            cleaner.join(timeout)
+
+
+client_pool = ClientPool()
+agent_cache = AgentCache()
+agent_threads = AgentThreads()
+
+@contextmanager
+def _phase(name):
+    """Time one step of an agent call into agent_phase_seconds{phase=name}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.observe("agent_phase_seconds", time.perf_counter() - start, phase=name)
+
+def _agent_exists(project_client, agent_id) -> bool:
+    """False if the project has no such agent."""
+    # Check the agent exists against the cached agent list
+    try:
+        with _phase("agent_lookup"):
+            agent = agent_cache.get(project_client, agent_id)
+        if agent is None:
+            log.error("Agent not found", extra={"agent_id": agent_id})
+            return False
+    except Exception as e:
+        log.warning("Could not list agents; using the agent ID as given", extra={"agent_id": agent_id, "error": str(e)})
+    return True
+
+def _post_message(project_client, agent_id, thread_id, message_text):
+    # Add a message to the thread
+    with _phase("message_create"):
+        message = project_client.agents.messages.create(
+            thread_id=thread_id,
+            role="user",
+            content=message_text,
+        )
+    log.debug("Created agent message", extra={"agent_id": agent_id, "thread_id": thread_id, "message_id": message.id})
+
+def _parse_reply(text_value):
+    if not text_value:
+        return None
+    # Try parsing as JSON, else return raw text
+    try:
+        return json.loads(text_value)
+    except json.JSONDecodeError:
+        return text_value
+
+def _log_failure(agent_id, e):
+    METRICS.inc("agent_errors_total", error_type=type(e).__name__)
+    # check `az login`, the project endpoint, the 'Azure AI User' role on
+    # the project and that the agent exists in this (Foundry) project
+    log.error("Agent call failed", extra={"agent_id": agent_id, "error_type": type(e).__name__, "error": str(e)})
+
+def run_non_deterministic(agent_id, message_text="Hello from Python!"):
+    """Send `message_text` to an existing Azure AI Foundry agent and return
+    its reply, parsed as JSON when possible, or None if the call failed."""
+    try:
+        start = time.perf_counter()
+        with client_pool.client() as project_client:
+            METRICS.observe("agent_phase_seconds", time.perf_counter() - start, phase="client")
+
+            if not _agent_exists(project_client, agent_id):
                 return
-            elif run.status == "completed":
-                print("✅ Agent run completed successfully!")
-            
-            # Fetch and display all messages in the thread
-            print(f"\n📥 Fetching messages from thread...")
-            messages = list(project_client.agents.messages.list(thread_id=thread.id))
+
+            with agent_threads.thread(project_client, agent_id) as thread:
+                _post_message(project_client, agent_id, thread.id, message_text)
+
+                # Create and process an agent run
+                with _phase("run"):
+                    run = project_client.agents.runs.create_and_process(
+                        thread_id=thread.id,
+                        agent_id=agent_id,
+                        additional_instructions="Please provide a helpful and detailed response.",
+                        truncation_strategy=agent_threads.truncation,
+                    )
+                METRICS.inc("agent_runs_total", status=str(run.status))
+                log.debug("Agent run finished", extra={"agent_id": agent_id, "thread_id": thread.id, "status": run.status})
+
+                # Check if the run failed
+                if run.status == "failed":
+                    log.error("Agent run failed", extra={
+                        "agent_id": agent_id, "thread_id": thread.id, "error": getattr(run, "last_error", "unknown"),
+                    })
+                    return
+
+                # Fetch this run's messages
+                with _phase("message_fetch"):
+                    messages = list(project_client.agents.messages.list(thread_id=thread.id, run_id=run.id))
+                thread.reusable = run.status == "completed"
             assistant_messages = [msg for msg in messages if msg.role == "assistant"]
 
             if not assistant_messages:
@@ -114,29 +377,63 @@ def run_non_deterministic(agent_id, message_text="Hello from Python!"):
                 elif isinstance(last_assistant.content, str):
                     text_value = last_assistant.content.strip()
 
-            if not text_value:
-                return None
+            return _parse_reply(text_value)
 
-            # Try parsing as JSON, else return raw text
-            try:
-                return json.loads(text_value)
-            except json.JSONDecodeError:
-                return text_value
-            
-            print("✅ Agent communication test completed successfully!")
-            
-            
     except Exception as e:
-        print(f"❌ Error during agent communication: {e}")
-        print(f"Error type: {type(e).__name__}")
-        
-        # Provide troubleshooting suggestions
-        print("\n🔧 Troubleshooting suggestions:")
-        print("1. Verify you're logged in with 'az login'")
-        print("2. Check that your project endpoint is correct")
-        print("3. Ensure you have the 'Azure AI User' role on the project")
-        print("4. Verify the agent ID exists in your project")
-        print("5. Make sure you're using a Foundry project (not hub-based)")
+        _log_failure(agent_id, e)
+
+def stream_non_deterministic(agent_id, message_text="Hello from Python!", required=(), on_fields=None):
+    """Like run_non_deterministic, but consumes the run's event stream.
+
+    The reply is parsed while it arrives (see streaming.py); once every
+    field in `required` is complete, `on_fields` is called once with the
+    fields parsed so far, from this thread. The whole reply is still
+    returned when the run ends."""
+    try:
+        start = time.perf_counter()
+        with client_pool.client() as project_client:
+            METRICS.observe("agent_phase_seconds", time.perf_counter() - start, phase="client")
+
+            if not _agent_exists(project_client, agent_id):
+                return
+
+            reply = FieldStream()
+            status = None
+            signalled = not required or on_fields is None
+            with agent_threads.thread(project_client, agent_id) as thread:
+                _post_message(project_client, agent_id, thread.id, message_text)
+                run_start = time.perf_counter()
+                with _phase("run"), project_client.agents.runs.stream(
+                    thread_id=thread.id,
+                    agent_id=agent_id,
+                    additional_instructions="Please provide a helpful and detailed response.",
+                    truncation_strategy=agent_threads.truncation,
+                ) as stream:
+                    for event_type, event_data, _ in stream:
+                        if isinstance(event_data, MessageDeltaChunk):
+                            reply.feed(event_data.text)
+                            if not signalled and reply.has(required):
+                                signalled = True
+                                METRICS.observe("agent_phase_seconds", time.perf_counter() - run_start, phase="first_fields")
+                                on_fields(dict(reply.fields))
+                        elif isinstance(event_data, ThreadRun):
+                            status = event_data.status
+                            if status == "failed":
+                                log.error("Agent run failed", extra={
+                                    "agent_id": agent_id, "thread_id": thread.id,
+                                    "error": getattr(event_data, "last_error", "unknown"),
+                                })
+                        elif event_type == AgentStreamEvent.ERROR:
+                            log.error("Agent stream error", extra={"agent_id": agent_id, "thread_id": thread.id, "error": event_data})
+                thread.reusable = status == "completed"
+            METRICS.inc("agent_runs_total", status=str(status))
+            log.debug("Agent run finished", extra={"agent_id": agent_id, "thread_id": thread.id, "status": status})
+            if status == "failed":
+                return
+            return reply.result()
+
+    except Exception as e:
+        _log_failure(agent_id, e)
 
 
 def get_azure_details_from_cli():
@@ -155,9 +452,9 @@ def get_azure_details_from_cli():
         
         # Get default resource group (if available)
         # We'll need the user to provide this or we can try to find it
-        print(f"✅ Found subscription ID: {subscription_id}")
+        log.info("Found subscription ID", extra={"subscription_id": subscription_id})
         return subscription_id
         
     except subprocess.CalledProcessError as e:
-        print(f"❌ Error getting Azure details: {e}")
+        log.error("Could not get Azure details", extra={"error": str(e)})
         return None
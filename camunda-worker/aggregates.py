@@ -0,0 +1,374 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from rules import _to_float, _to_iso_dt
+
+log = logging.getLogger("aggregates")
+
+# Per-customer rolling aggregates, maintained in-process as jobs arrive so
+# the cash and behavioural checks do not depend on upstream batch jobs for
+# `daily_cash_total_customer` and friends.
+#
+# Time is event time (`booking_datetime`), so replays and backfills build
+# the same state as live traffic. Each window is a ring of fixed-width
+# buckets holding running totals; advancing the clock clears the buckets
+# that fall out, so every update and read is O(1) amortised.
+
+CASH_PRODUCTS = {"cash_deposit", "cash_withdrawal"}
+# Full window state is dropped for customers idle longer than the widest
+# window; only the last-activity time is kept, for dormancy checks
+LAST_SEEN_RETENTION_SECONDS = 400 * 86400
+
+# -------------------------------
+# Rolling window
+# -------------------------------
+class RollingWindow:
+    """Count, amount, cash and counterparty totals over the last `size`
+    buckets of `width` seconds.
+
+    Events older than the window (relative to the newest bucket seen) are
+    not counted.
+    """
+
+    __slots__ = ("width", "size", "head", "ids", "slots", "count", "total", "cash_count", "cash_total", "parties", "kinds")
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.size = size
+        self.head = None
+        self.ids = [None] * size
+        # per slot: [count, total, cash_count, cash_total, {party: n}, {kind: n}]
+        self.slots = [None] * size
+        self.count = 0
+        self.total = 0.0
+        self.cash_count = 0
+        self.cash_total = 0.0
+        self.parties = {}
+        self.kinds = {}
+
+    def advance(self, ts: float):
+        bucket = int(ts // self.width)
+        if self.head is None:
+            self.head = bucket
+            return
+        if bucket <= self.head:
+            return
+        if bucket - self.head >= self.size:
+            # whole window expired: start over instead of evicting slot by slot
+            self.__init__(self.width, self.size)
+            self.head = bucket
+            return
+        slots = self.slots
+        for b in range(max(self.head + 1, bucket - self.size + 1), bucket + 1):
+            if slots[b % self.size] is not None:
+                self._evict(b % self.size)
+        self.head = bucket
+
+    def _evict(self, i):
+        slot = self.slots[i]
+        if slot is None:
+            return
+        self.count -= slot[0]
+        self.total -= slot[1]
+        self.cash_count -= slot[2]
+        self.cash_total -= slot[3]
+        for counts, live in ((slot[4], self.parties), (slot[5], self.kinds)):
+            for key, n in counts.items():
+                left = live[key] - n
+                if left:
+                    live[key] = left
+                else:
+                    del live[key]
+        self.ids[i] = self.slots[i] = None
+        if not self.count:
+            self.total = self.cash_total = 0.0
+
+    def add(self, ts: float, amount: float, cash: bool, party, kind) -> bool:
+        self.advance(ts)
+        bucket = int(ts // self.width)
+        if bucket <= self.head - self.size:
+            return False
+        i = bucket % self.size
+        if self.ids[i] != bucket:
+            self._evict(i)
+            self.ids[i] = bucket
+            self.slots[i] = [0, 0.0, 0, 0.0, {}, {}]
+        slot = self.slots[i]
+        slot[0] += 1
+        slot[1] += amount
+        self.count += 1
+        self.total += amount
+        if cash:
+            slot[2] += 1
+            slot[3] += amount
+            self.cash_count += 1
+            self.cash_total += amount
+        for key, counts, live in ((party, slot[4], self.parties), (kind, slot[5], self.kinds)):
+            if key:
+                counts[key] = counts.get(key, 0) + 1
+                live[key] = live.get(key, 0) + 1
+        return True
+
+    def remove(self, ts: float, amount: float, cash: bool, party, kind):
+        """Take back an `add` whose bucket is still in the window."""
+        bucket = int(ts // self.width)
+        i = bucket % self.size
+        if self.ids[i] != bucket:
+            return
+        slot = self.slots[i]
+        slot[0] -= 1
+        slot[1] -= amount
+        self.count -= 1
+        self.total -= amount
+        if cash:
+            slot[2] -= 1
+            slot[3] -= amount
+            self.cash_count -= 1
+            self.cash_total -= amount
+        for key, counts, live in ((party, slot[4], self.parties), (kind, slot[5], self.kinds)):
+            if key and counts.get(key):
+                for d in (counts, live):
+                    if d[key] > 1:
+                        d[key] -= 1
+                    else:
+                        del d[key]
+        if not slot[0]:
+            self.ids[i] = self.slots[i] = None
+        if not self.count:
+            self.total = self.cash_total = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "head": self.head,
+            # copied, so a snapshot can be serialised outside the store lock
+            "slots": {
+                str(self.ids[i]): [*slot[:4], dict(slot[4]), dict(slot[5])]
+                for i, slot in enumerate(self.slots) if slot is not None
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, width, size, state):
+        window = cls(width, size)
+        window.head = state["head"]
+        for bucket, slot in state["slots"].items():
+            bucket = int(bucket)
+            if window.head is not None and bucket <= window.head - size:
+                continue
+            i = bucket % size
+            window.ids[i] = bucket
+            window.slots[i] = slot
+            window.count += slot[0]
+            window.total += slot[1]
+            window.cash_count += slot[2]
+            window.cash_total += slot[3]
+            for counts, live in ((slot[4], window.parties), (slot[5], window.kinds)):
+                for key, n in counts.items():
+                    live[key] = live.get(key, 0) + n
+        return window
+
+# -------------------------------
+# Per-customer state & store
+# -------------------------------
+class CustomerAggregates:
+    """Rolling 24-hour (hourly buckets) and 7-day (daily buckets) windows for
+    one customer, plus the transactions already counted in them."""
+
+    __slots__ = ("day", "week", "seen")
+
+    DAY = (3600, 24)
+    WEEK = (86400, 7)
+
+    def __init__(self):
+        self.day = RollingWindow(*self.DAY)
+        self.week = RollingWindow(*self.WEEK)
+        # transaction key -> (event time, days since previous activity,
+        # (amount, cash, party, kind) as counted, or None if not known)
+        self.seen = OrderedDict()
+
+    def features(self, days_since_last) -> dict:
+        return {
+            "daily_cash_total_customer": round(self.day.cash_total, 2),
+            "daily_cash_txn_count": self.day.cash_count,
+            "customer_24h_txn_count": self.day.count,
+            "customer_24h_total": round(self.day.total, 2),
+            "customer_7d_txn_count": self.week.count,
+            "customer_7d_total": round(self.week.total, 2),
+            "customer_7d_counterparties": len(self.week.parties),
+            "customer_7d_subscriptions": self.week.kinds.get("fund_subscription", 0),
+            "customer_7d_redemptions": self.week.kinds.get("redemption", 0),
+            "customer_days_since_last_txn": days_since_last,
+        }
+
+
+class AggregateStore:
+    """Per-customer rolling aggregates, updated incrementally per job.
+
+    `observe` counts a transaction once per key (transaction ID, or the
+    process instance when there is none), so the cash and behavioural jobs
+    of one process instance, and retries of either, share one update. A
+    repeat whose time, amount or counterparty changed (a corrected re-run)
+    replaces the earlier observation instead.
+    With `path` set the state is snapshotted there every
+    `snapshot_interval` seconds by a background thread, so `observe` never
+    waits on the disk, and reloaded on start. `close` writes a last one.
+    """
+
+    def __init__(self, path=None, snapshot_interval=60.0):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.customers = {}
+        self.last_seen = {}
+        self.clock = 0.0
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._last_snapshot = time.monotonic()
+        self._due = threading.Event()
+        self._closed = False
+        self._writer = None
+        if path and os.path.exists(path):
+            self.load(path)
+        if path:
+            self._writer = threading.Thread(target=self._snapshot_loop, name="aggregate-snapshots", daemon=True)
+            self._writer.start()
+
+    def observe(self, data: dict, key=None) -> dict:
+        """Count `data` into its customer's windows and return the customer's
+        aggregates including it. Returns {} when there is no `customer_id`."""
+        customer_id = data.get("customer_id")
+        if not customer_id:
+            return {}
+        booked = _to_iso_dt(data.get("booking_datetime"))
+        ts = booked.timestamp() if booked else None
+        key = str(data.get("transaction_id") or key or "")
+
+        amount = _to_float(data.get("amount"))
+        cash = data.get("product_type") in CASH_PRODUCTS or data.get("channel") == "CASH"
+        party = data.get("beneficiary_account") or data.get("beneficiary_name")
+        kind = data.get("product_type")
+        counted = (amount, cash, party, kind)
+
+        with self._lock:
+            state = self.customers.get(customer_id)
+            if state is None:
+                state = self.customers[customer_id] = CustomerAggregates()
+            previous = self.last_seen.get(customer_id)
+            if key and key in state.seen:
+                seen_ts, days_since_last, seen = state.seen[key]
+                # without a booking time a repeat keeps the time it was first counted at
+                ts = seen_ts if ts is None else ts
+                if seen is None or (seen_ts == ts and seen == counted):
+                    return state.features(days_since_last)
+                # corrected transaction: take the old values back out
+                state.day.remove(seen_ts, *seen)
+                state.week.remove(seen_ts, *seen)
+                del state.seen[key]
+            else:
+                ts = time.time() if ts is None else ts
+                days_since_last = None if previous is None else round(max(0.0, ts - previous) / 86400, 1)
+
+            state.day.add(ts, *counted)
+            state.week.add(ts, *counted)
+            if key:
+                state.seen[key] = (ts, days_since_last, counted)
+                horizon = ts - CustomerAggregates.WEEK[0] * CustomerAggregates.WEEK[1]
+                while state.seen and next(iter(state.seen.values()))[0] < horizon:
+                    state.seen.popitem(last=False)
+            if previous is None or ts > previous:
+                self.last_seen[customer_id] = ts
+            self.clock = max(self.clock, ts)
+            features = state.features(days_since_last)
+
+        if self._writer is not None and time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self._last_snapshot = time.monotonic()
+            self._due.set()
+        return features
+
+    def evict(self):
+        """Drop window state for customers idle past the 7-day window, and
+        last-activity times past LAST_SEEN_RETENTION_SECONDS."""
+        with self._lock:
+            idle = self.clock - CustomerAggregates.WEEK[0] * CustomerAggregates.WEEK[1]
+            for customer_id in [c for c in self.customers if self.last_seen.get(c, 0) < idle]:
+                del self.customers[customer_id]
+            forgotten = self.clock - LAST_SEEN_RETENTION_SECONDS
+            for customer_id in [c for c, ts in self.last_seen.items() if ts < forgotten]:
+                del self.last_seen[customer_id]
+
+    def snapshot(self, path=None):
+        """Write the state to `path` (default: the store's) atomically."""
+        path = path or self.path
+        self._last_snapshot = time.monotonic()
+        if not path or not self._snapshot_lock.acquire(blocking=False):
+            return
+        try:
+            self._write_snapshot(path)
+        finally:
+            self._snapshot_lock.release()
+
+    def _snapshot_loop(self):
+        while True:
+            self._due.wait()
+            self._due.clear()
+            if self._closed:
+                return
+            try:
+                self.snapshot()
+            except OSError as e:
+                log.warning("Aggregate snapshot failed", extra={"path": self.path, "error": str(e)})
+
+    def close(self):
+        """Stop the snapshot thread and write a final snapshot."""
+        if self._writer is not None:
+            self._closed = True
+            self._due.set()
+            self._writer.join()
+            self._writer = None
+        self.snapshot()
+
+    def _write_snapshot(self, path):
+        self.evict()
+        with self._lock:
+            state = {
+                "version": 1,
+                "clock": self.clock,
+                "last_seen": dict(self.last_seen),
+                "customers": {
+                    customer_id: {
+                        "day": c.day.to_dict(),
+                        "week": c.week.to_dict(),
+                        "seen": [[k, ts, days, counted] for k, (ts, days, counted) in c.seen.items()],
+                    }
+                    for customer_id, c in self.customers.items()
+                },
+            }
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def load(self, path):
+        with open(path) as f:
+            state = json.load(f)
+        with self._lock:
+            self.clock = state.get("clock", 0.0)
+            self.last_seen = state.get("last_seen", {})
+            self.customers = {}
+            for customer_id, saved in state.get("customers", {}).items():
+                c = CustomerAggregates()
+                c.day = RollingWindow.from_dict(*CustomerAggregates.DAY, saved["day"])
+                c.week = RollingWindow.from_dict(*CustomerAggregates.WEEK, saved["week"])
+                # snapshots from before corrections were tracked hold no `counted`
+                c.seen = OrderedDict(
+                    (k, (ts, days, tuple(rest[0]) if rest and rest[0] is not None else None))
+                    for k, ts, days, *rest in saved["seen"]
+                )
+                self.customers[customer_id] = c
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"customers": len(self.customers), "last_seen": len(self.last_seen)}
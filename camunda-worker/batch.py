@@ -0,0 +1,504 @@
+import numpy as np
+from datetime import datetime
+
+from rules import CATEGORIES, FIELDS, PLAN, _to_iso_dt, _to_dmy_date, _to_float, _to_int
+from names import is_company, similar
+from screening import SCREENING
+
+# Columnar evaluation of the deterministic rules in rules.py, for backfills
+# that replay historical transactions in bulk.
+#
+# A batch is either a pyarrow Table / RecordBatch or a mapping of field name
+# to a 1-D array (dict of NumPy arrays, pandas DataFrame, ...), holding the
+# same fields as the `data` process variable. A missing column or a null /
+# None cell is treated exactly like a key that is absent from `data`.
+
+# -------------------------------
+# Column access
+# -------------------------------
+def _num_rows(batch) -> int:
+    if hasattr(batch, "num_rows"):
+        return batch.num_rows
+    return max((len(batch[f]) for f in FIELDS if f in batch), default=0)
+
+
+def _has_column(batch, name) -> bool:
+    if hasattr(batch, "column_names"):
+        return name in batch.column_names
+    return name in batch
+
+
+def _column(batch, name, n) -> np.ndarray:
+    if not _has_column(batch, name):
+        return np.full(n, None, dtype=object)
+
+    if hasattr(batch, "column_names"):
+        import pyarrow as pa
+        col = batch.column(name)
+        kind = col.type
+        if col.null_count == 0 and (pa.types.is_boolean(kind) or pa.types.is_integer(kind) or pa.types.is_floating(kind)):
+            return np.asarray(col.to_numpy(zero_copy_only=False))
+        values = col.to_pylist()
+    else:
+        values = batch[name]
+
+    arr = np.asarray(values)
+    if arr.dtype.kind in "biuf":
+        return arr
+    out = np.empty(len(values), dtype=object)
+    out[:] = arr.tolist() if arr.dtype.kind in "US" else (arr if arr.dtype.kind == "O" else list(values))
+    return out
+
+
+class _Columns:
+    """Lazily materialised columns of a batch, each converted at most once."""
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.n = _num_rows(batch)
+        self._cache = {}
+
+    def __getitem__(self, name) -> np.ndarray:
+        if name not in self._cache:
+            self._cache[name] = _column(self.batch, name, self.n)
+        return self._cache[name]
+
+    def get(self, name, default) -> np.ndarray:
+        """Column with absent cells replaced by `default`, like `d.get(name, default)`."""
+        key = (name, default)
+        if key not in self._cache:
+            col = self[name]
+            if col.dtype.kind == "O":
+                col = col.copy()
+                col[_absent(col)] = default
+            self._cache[key] = col
+        return self._cache[key]
+
+    def map(self, name, fn, dtype=object, default=None) -> np.ndarray:
+        """Apply `fn` once per distinct value of a column and broadcast back."""
+        key = (name, fn, default)
+        if key not in self._cache:
+            self._cache[key] = _map(self.get(name, default) if default is not None else self[name], fn, dtype)
+        return self._cache[key]
+
+
+# -------------------------------
+# Vector primitives
+# -------------------------------
+def _absent(a) -> np.ndarray:
+    if a.dtype.kind != "O":
+        return np.zeros(len(a), dtype=bool)
+    return np.equal(a, None)
+
+
+def _truthy(a) -> np.ndarray:
+    if a.dtype == bool:
+        return a
+    return a.astype(bool)
+
+
+def _eq(a, value) -> np.ndarray:
+    if a.dtype.kind != "O":
+        return np.zeros(len(a), dtype=bool)
+    return np.equal(a, value).astype(bool)
+
+
+def _ne(a, b) -> np.ndarray:
+    return np.not_equal(a, b).astype(bool)
+
+
+def _isin(a, values) -> np.ndarray:
+    out = np.zeros(len(a), dtype=bool)
+    for v in values:
+        out |= _eq(a, v)
+    return out
+
+
+def _is_false(a) -> np.ndarray:
+    if a.dtype == bool:
+        return ~a
+    return np.fromiter((v is False for v in a), dtype=bool, count=len(a))
+
+
+def _map(a, fn, dtype) -> np.ndarray:
+    # Factorise by value so expensive scalar work (date parsing, string
+    # normalisation) runs once per distinct value instead of once per row.
+    index = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in a.tolist()), dtype=np.intp, count=len(a))
+    values = np.empty(len(index), dtype=dtype)
+    values[:] = [fn(v) for v in index]
+    return values[codes]
+
+
+def _floats(a) -> np.ndarray:
+    if a.dtype.kind in "biuf":
+        return a.astype(float)
+    try:
+        out = a.astype(float)
+    except (ValueError, TypeError):
+        return _map(a, _to_float, float)
+    out[_absent(a)] = 0.0
+    return out
+
+
+def _ints(a) -> np.ndarray:
+    if a.dtype.kind in "biu":
+        return a.astype(np.int64)
+    return _map(a, _to_int, np.int64)
+
+
+def _status_vec(matrix) -> np.ndarray:
+    return np.where(matrix.all(axis=1), "pass", np.where(matrix.any(axis=1), "needs_advice", "fail")).astype(object)
+
+
+# -------------------------------
+# Per-value parsers (run once per distinct value)
+# -------------------------------
+_STR_FMT = "%Y-%m-%dT%H:%M:%S"
+_BAD = object()
+
+
+def _str_dt(s):
+    if not s or not s.strip():
+        return None
+    try:
+        return datetime.strptime(s, _STR_FMT)
+    except ValueError:
+        return _BAD
+
+
+def _iso_date(s):
+    dt = _to_iso_dt(s)
+    return dt.date() if dt else None
+
+
+def _combine(dt):
+    return datetime.combine(dt, datetime.min.time()) if dt else None
+
+
+def _lower_strip(s):
+    return (s or "").lower().strip()
+
+
+def _strip(s):
+    return (s or "").strip()
+
+
+def _edu(s):
+    return "EDU" in s
+
+
+def _copper(s):
+    return "copper" in s.lower()
+
+
+def _third_party(s):
+    narrative = (s or "").lower().strip()
+    return any(k in narrative for k in ["third", "on behalf", "obo"])
+
+
+def _acct_ok(s):
+    acct = (s or "").strip()
+    return bool(acct) and acct.isalnum() and 15 <= len(acct) <= 34
+
+
+def _name_kind(s):
+    # 0 = empty, 1 = company, 2 = personal, 3 = neither
+    name = _lower_strip(s)
+    if not name:
+        return 0
+    if is_company(name):
+        return 1
+    return 2 if name.replace(" ", "").isalpha() else 3
+
+
+def _acct_kind(s):
+    # 0 = empty, 1 = personal-like, 2 = business-like, 3 = neither
+    acct = _lower_strip(s)
+    if not acct:
+        return 0
+    if acct.startswith(("retail", "pers")):
+        return 1
+    return 2 if acct.startswith(("biz", "corp")) else 3
+
+
+def _compare(a, b, op) -> np.ndarray:
+    # Element-wise comparison of object columns, False where either side is None
+    ok = ~(_absent(a) | _absent(b))
+    out = np.zeros(len(a), dtype=bool)
+    if ok.any():
+        out[ok] = op(a[ok], b[ok]).astype(bool)
+    return out
+
+
+def _le(a, b):
+    return a <= b
+
+
+# -------------------------------
+# Vectorised rules
+# -------------------------------
+def _tr_001(c):
+    return ~(
+        _isin(c["channel"], {"SWIFT", "RTGS"})
+        & _ne(c["originator_country"], c["beneficiary_country"])
+        & (_floats(c["amount"]) > 2000)
+        & (~_truthy(c["originator_name"]) | ~_truthy(c["originator_account"]))
+    )
+
+def _tr_002(c):
+    return ~(_truthy(c["swift_mt"]) & (~_truthy(c["swift_f50_present"]) | ~_truthy(c["swift_f59_present"])))
+
+def _tr_003(c):
+    return ~(_eq(c["channel"], "SWIFT") & _truthy(c["ordering_institution_bic"]) & ~_truthy(c["originator_name"]))
+
+def _tr_004(c):
+    return ~(_is_false(c["travel_rule_complete"]) & _truthy(c.get("transaction_executed", True)))
+
+def _cdd_005(c):
+    booking = c.map("booking_datetime", _to_iso_dt)
+    due = _map(c.map("kyc_due_date", _to_dmy_date), _combine, object)
+    return _compare(booking, due, _le)
+
+def _cdd_006(c):
+    return ~(_truthy(c["customer_is_pep"]) & (~_truthy(c["edd_required"]) | ~_truthy(c["edd_performed"])))
+
+def _cdd_007(c):
+    high = _eq(c["customer_risk_rating"], "High")
+    ok = _compare(c.map("kyc_last_completed", _to_dmy_date), c.map("kyc_due_date", _to_dmy_date), _le)
+    return ~high | ok
+
+def _cdd_008(c):
+    return ~(~_truthy(c["sow_documented"]) & (_truthy(c["customer_is_pep"]) | _isin(c["customer_type"], {"domiciliary_company", "trust"})))
+
+def _str_009(c):
+    s_dt = c.map("suspicion_determined_datetime", _str_dt)
+    f_dt = c.map("str_filed_datetime", _str_dt)
+    blank = _absent(s_dt) | _absent(f_dt)
+    bad = _eq(s_dt, _BAD) | _eq(f_dt, _BAD)
+    ok = ~(blank | bad)
+    within = np.zeros(len(s_dt), dtype=bool)
+    if ok.any():
+        delta = f_dt[ok].astype("datetime64[s]") - s_dt[ok].astype("datetime64[s]")
+        within[ok] = delta <= np.timedelta64(172800, "s")
+    return blank | within
+
+def _str_010(c):
+    return ~(_eq(c["sanctions_screening"], "potential") & _truthy(c.get("transaction_executed", True)))
+
+def _san_011(c):
+    index = SCREENING.index
+    return ~(
+        c.map("originator_country", index.sanctioned_country, bool) | c.map("beneficiary_country", index.sanctioned_country, bool)
+        | c.map("ordering_institution_bic", index.sanctioned_bic, bool)
+        | c.map("beneficiary_institution_bic", index.sanctioned_bic, bool)
+    )
+
+def _san_012(c):
+    return ~(_truthy(c["high_risk_corridor"]) & ~_truthy(c["swift_f70_purpose"]))
+
+def _san_041(c):
+    index = SCREENING.index
+    if not len(index.names):
+        return np.ones(c.n, dtype=bool)
+    def listed(name):
+        return index.sanctioned_name(name) is not None
+    return ~(c.map("originator_name", listed, bool) | c.map("beneficiary_name", listed, bool))
+
+def _cash_013(c):
+    return ~(_isin(c["product_type"], {"cash_deposit", "cash_withdrawal"}) & ~_truthy(c["cash_id_verified"]))
+
+def _cash_014(c):
+    return ~((_floats(c["daily_cash_total_customer"]) > 20000) | (_ints(c["daily_cash_txn_count"]) >= 5))
+
+def _pur_016(c):
+    return ~(c.map("purpose_code", _edu, bool, "") & c.map("narrative", _copper, bool, ""))
+
+def _fx_017(c):
+    return ~(_truthy(c["fx_indicator"]) & (np.abs(_ints(c["fx_spread_bps"])) > 150))
+
+def _fx_018(c):
+    return ~(_truthy(c["is_advised"]) & _truthy(c.get("product_complex", False)) & ~_truthy(c["suitability_assessed"]))
+
+def _suit_019(c):
+    return ~(_truthy(c["is_advised"]) & ~_truthy(c["suitability_assessed"]))
+
+def _suit_020(c):
+    return ~(
+        _truthy(c["suitability_assessedsuitability-checks"])
+        & _eq(c["suitability_result"], "mismatch")
+        & _truthy(c.get("transaction_proceeds", True))
+    )
+
+def _suit_021(c):
+    return ~(_truthy(c["product_complex"]) & _eq(c["client_risk_profile"], "Low") & ~_truthy(c.get("risk_acknowledgement", False)))
+
+def _suit_022(c):
+    return ~(_truthy(c["product_has_va_exposure"]) & ~_truthy(c["va_disclosure_provided"]))
+
+def _va_024(c):
+    va = _truthy(c["product_has_va_exposure"])
+    unlicensed = np.zeros(c.n, dtype=bool)
+    if va.any():
+        unlicensed[va] = c.map("counterparty", SCREENING.index.unlicensed_vasp, bool)[va]
+    return ~unlicensed
+
+def _va_025(c):
+    return ~(_truthy(c["product_has_va_exposure"]) & (
+        ~_truthy(c["originator_name"]) | ~_truthy(c["beneficiary_name"]) | ~_truthy(c["beneficiary_account"])
+    ))
+
+def _con_026(c):
+    return ~(_eq(c["channel"], "SWIFT") & (~_truthy(c["ordering_institution_bic"]) | ~_truthy(c["beneficiary_institution_bic"])))
+
+def _con_027(c):
+    rtgs = _eq(c["channel"], "RTGS")
+    ok = _compare(c.map("value_date", _to_dmy_date), c.map("booking_datetime", _iso_date), _le)
+    return ~rtgs | ok
+
+def _con_028(c):
+    return ~(_isin(c["channel"], {"FAST", "FPS"}) & _ne(c["originator_country"], c["beneficiary_country"]))
+
+def _cor_029(c):
+    index = SCREENING.index
+    return ~(
+        _truthy(c.get("respondent_shell_bank", False))
+        | c.map("respondent_bic", index.shell_bank, bool) | c.map("ordering_institution_bic", index.shell_bank, bool)
+    )
+
+def _cor_030(c):
+    return ~(_truthy(c["payable_through"]) & ~_truthy(c["respondent_cdd_done"]))
+
+def _rec_031(c):
+    return _truthy(c["value_date"]) & _truthy(c["amount"]) & _truthy(c["beneficiary_name"])
+
+def _rec_032(c):
+    return ~(_truthy(c["is_str_related"]) & (_ints(c["retention_years"]) < 5))
+
+def _pat_035(c):
+    return ~(_truthy(c["customer_7d_subscriptions"]) & _truthy(c["customer_7d_redemptions"]) & _isin(c["channel"], {"SWIFT", "RTGS"}))
+
+def _pat_037(c):
+    return ~(
+        _eq(c["channel"], "SWIFT")
+        & (_floats(c["customer_days_since_last_txn"]) >= 180)
+        & (_floats(c["amount"]) >= 50000)
+        & ~_truthy(c["swift_f70_purpose"])
+    )
+
+def _dq_038(c):
+    return c.map("beneficiary_account", _acct_ok, bool)
+
+def _dq_039(c):
+    name = c.map("beneficiary_name", _name_kind, np.int8)
+    acct = c.map("beneficiary_account", _acct_kind, np.int8)
+    mismatch = ((name == 1) & (acct == 1)) | ((name == 2) & (acct == 2))
+    return (name != 0) & (acct != 0) & ~mismatch
+
+def _dq_040(c):
+    o_country = c.map("originator_country", _strip)
+    b_country = c.map("beneficiary_country", _strip)
+    suspect = _truthy(o_country) & _truthy(b_country) & _ne(o_country, b_country) & c.map("narrative", _third_party, bool)
+    same_name = np.zeros(c.n, dtype=bool)
+    for i in np.flatnonzero(suspect):
+        same_name[i] = similar(c["originator_name"][i], c["beneficiary_name"][i])
+    return ~same_name
+
+
+# -------------------------------
+# Rule and category tables
+# -------------------------------
+# rule ID -> vectorised equivalent of the registered per-dict rule
+VECTOR_RULES = {
+    "TR-001": _tr_001,
+    "TR-002": _tr_002,
+    "TR-003": _tr_003,
+    "TR-004": _tr_004,
+    "CDD-005": _cdd_005,
+    "CDD-006": _cdd_006,
+    "CDD-007": _cdd_007,
+    "CDD-008": _cdd_008,
+    "STR-009": _str_009,
+    "STR-010": _str_010,
+    "SAN-011": _san_011,
+    "SAN-012": _san_012,
+    "SAN-041": _san_041,
+    "CASH-013": _cash_013,
+    "CASH-014": _cash_014,
+    "PUR-016": _pur_016,
+    "FX-017": _fx_017,
+    "FX-018": _fx_018,
+    "SUIT-019": _suit_019,
+    "SUIT-020": _suit_020,
+    "SUIT-021": _suit_021,
+    "SUIT-022": _suit_022,
+    "VA-024": _va_024,
+    "VA-025": _va_025,
+    "CON-026": _con_026,
+    "CON-027": _con_027,
+    "CON-028": _con_028,
+    "COR-029": _cor_029,
+    "COR-030": _cor_030,
+    "REC-031": _rec_031,
+    "REC-032": _rec_032,
+    "PAT-035": _pat_035,
+    "PAT-037": _pat_037,
+    "DQ-038": _dq_038,
+    "DQ-039": _dq_039,
+    "DQ-040": _dq_040,
+}
+
+# -------------------------------
+# Public API
+# -------------------------------
+def evaluate_batch(batch, rule_ids=None) -> dict:
+    """Evaluate the deterministic rules over a columnar batch.
+
+    Returns a dict with `rule_ids`, a boolean `results` matrix of shape
+    (rows, len(rule_ids)) and, for every category fully covered by
+    `rule_ids`, an array of per-row `overall_status` values matching `_status`.
+    """
+    rule_ids = list(rule_ids or VECTOR_RULES)
+    cols = _Columns(batch)
+    results = np.empty((cols.n, len(rule_ids)), dtype=bool)
+    for j, rule_id in enumerate(rule_ids):
+        results[:, j] = VECTOR_RULES[rule_id](cols)
+
+    position = {rule_id: j for j, rule_id in enumerate(rule_ids)}
+    overall_status = {
+        name: _status_vec(results[:, [position[r] for r in ids]])
+        for name, ids in CATEGORIES.items()
+        if all(r in position for r in ids)
+    }
+    return {"rule_ids": rule_ids, "results": results, "overall_status": overall_status}
+
+
+def iter_rows(batch):
+    """Yield each row of a batch as the `data` dict the per-dict rules expect."""
+    n = _num_rows(batch)
+    columns = {f: _column(batch, f, n).tolist() for f in FIELDS if _has_column(batch, f)}
+    for i in range(n):
+        yield {f: values[i] for f, values in columns.items() if values[i] is not None}
+
+
+def check_equivalence(batch, rule_ids=None) -> list:
+    """Compare `evaluate_batch` against PLAN.evaluate, the per-transaction
+    path the worker runs, row by row.
+
+    Returns a list of `(row, rule_id, expected, actual)` mismatches; an empty
+    list means both paths agree on every rule and category status.
+    """
+    evaluated = evaluate_batch(batch, rule_ids)
+    rule_ids, results = evaluated["rule_ids"], evaluated["results"]
+    category = {rule_id: name for name, ids in CATEGORIES.items() for rule_id in ids}
+    mismatches = []
+    for i, d in enumerate(iter_rows(batch)):
+        expected = PLAN.evaluate(d, {category[r] for r in rule_ids})
+        for j, rule_id in enumerate(rule_ids):
+            want = expected[category[rule_id]]["tests"][rule_id]
+            if want != bool(results[i, j]):
+                mismatches.append((i, rule_id, want, bool(results[i, j])))
+        for name, statuses in evaluated["overall_status"].items():
+            if expected[name]["overall_status"] != statuses[i]:
+                mismatches.append((i, name, expected[name]["overall_status"], statuses[i]))
+    return mismatches
@@ -0,0 +1,402 @@
+"""Benchmarks for the rule engine and the Zeebe task handlers.
+
+    python benchmark.py --rows 5000 --output bench.json
+
+Three suites run against synthetic transactions (see synthetic.py):
+  rules     - each registered rule, called on a fresh Txn per row
+  handlers  - each category task function, called with a Job like Zeebe's
+  e2e       - whole process instances driven through the router's job
+              handlers with a fake Zeebe adapter and a stubbed agent
+
+Each entry reports throughput, p50/p99 latency and allocated bytes per
+call (peak traced by tracemalloc over a sample of calls). Results are
+written as JSON so runs from different releases can be compared with
+`--compare`.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from pyzeebe import Job
+
+# worker decides which variables its tasks fetch when it is imported
+if "--incremental" in sys.argv[1:]:
+    os.environ["INCREMENTAL_EVALUATION"] = "1"
+# synthetic jobs and stub verdicts must not reach the live aggregate
+# snapshot or verdict cache (bench_e2e also swaps in fresh ones)
+os.environ["AGGREGATE_SNAPSHOT_PATH"] = ""
+os.environ["VERDICT_CACHE_PATH"] = ""
+
+import prescreen
+import worker
+from aggregates import AggregateStore
+from recorder import JobRecorder
+from rules import CATEGORIES, FIELDS, RULES, Txn
+from synthetic import generate
+from verdict_cache import VerdictCache
+
+# -------------------------------
+# Measurement helpers
+# -------------------------------
+def _percentile(sorted_ns, q):
+    if not sorted_ns:
+        return 0.0
+    return sorted_ns[min(len(sorted_ns) - 1, int(q * len(sorted_ns)))] / 1000
+
+def _summary(latencies_ns, elapsed_s, alloc_bytes=None) -> dict:
+    """Throughput in calls/s, latencies in microseconds."""
+    latencies_ns = sorted(latencies_ns)
+    out = {
+        "calls": len(latencies_ns),
+        "throughput": round(len(latencies_ns) / elapsed_s, 1) if elapsed_s else 0.0,
+        "p50_us": round(_percentile(latencies_ns, 0.50), 2),
+        "p99_us": round(_percentile(latencies_ns, 0.99), 2),
+    }
+    if alloc_bytes is not None:
+        out["alloc_bytes_per_call"] = alloc_bytes
+    return out
+
+def _time_calls(fn, args_list):
+    for args in args_list[:100]:
+        fn(*args)
+    latencies = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for args in args_list:
+        t0 = clock()
+        fn(*args)
+        latencies.append(clock() - t0)
+    return latencies, (clock() - start) / 1e9
+
+def _alloc_per_call(fn, args_list) -> int:
+    """Mean peak bytes allocated by one call, over `args_list`."""
+    if not args_list:
+        return 0
+    tracemalloc.start()
+    total = 0
+    try:
+        for args in args_list:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn(*args)
+            total += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return total // len(args_list)
+
+def _job(key, task_type, variables) -> Job:
+    return Job(
+        key=key, type=task_type, process_instance_key=key, bpmn_process_id="benchmark",
+        process_definition_version=1, process_definition_key=1, element_id=task_type,
+        element_instance_key=key, custom_headers={}, worker="benchmark", retries=3,
+        deadline=0, variables=variables,
+    )
+
+# -------------------------------
+# Rule and handler microbenchmarks
+# -------------------------------
+def bench_rules(rows, alloc_sample) -> dict:
+    # behavioural rules read the customer aggregates the worker adds
+    store = AggregateStore()
+    rows = [worker.with_features(d, store.observe(d)) for d in rows]
+    results = {}
+    for rule_id, r in RULES.items():
+        fn = r.fn
+        call = lambda d: fn(Txn(d))
+        args = [(d,) for d in rows]
+        latencies, elapsed = _time_calls(call, args)
+        failures = sum(not fn(Txn(d)) for d in rows)
+        results[rule_id] = dict(
+            _summary(latencies, elapsed, _alloc_per_call(call, args[:alloc_sample])),
+            category=r.category, fail_rate=round(failures / len(rows), 4) if rows else 0.0,
+        )
+    return results
+
+# category output variable -> the task function registered for it
+CATEGORY_HANDLERS = {
+    "wire": worker.wire_transparency_task,
+    "cdd": worker.cdd_kyc_task,
+    "str": worker.str_handling_task,
+    "sanctions": worker.sanctions_task,
+    "cash": worker.cash_transactions_task,
+    "purpose": worker.purpose_checks_task,
+    "fx": worker.fx_checks_task,
+    "suitability": worker.suitability_checks_task,
+    "virtual": worker.virtual_assets_task,
+    "channel": worker.channel_consistency_task,
+    "counterparty": worker.correspondent_banking_task,
+    "record": worker.record_keeping_task,
+    "dataquality": worker.data_quality_task,
+    "behavioral": worker.behavioural_task,
+    "all": worker.all_deterministic_checks_task,
+}
+
+def bench_handlers(rows, alloc_sample) -> dict:
+    results = {}
+    for name, handler in CATEGORY_HANDLERS.items():
+        # the fused task takes `data` alongside the Job
+        args = [
+            (_job(i, name, {"data": d}), d) if name == "all" else (_job(i, name, {"data": d}),)
+            for i, d in enumerate(rows)
+        ]
+        latencies, elapsed = _time_calls(handler, args)
+        results[name] = _summary(latencies, elapsed, _alloc_per_call(handler, args[:alloc_sample]))
+    assert set(CATEGORY_HANDLERS) - {"all"} == set(CATEGORIES)
+    return results
+
+# -------------------------------
+# End-to-end through the router
+# -------------------------------
+class FakeZeebe:
+    """Stands in for pyzeebe's ZeebeAdapter: records job completions instead
+    of sending them to a gateway."""
+
+    def __init__(self):
+        self.completed = 0
+        self.failed = 0
+        self.errors = 0
+
+    async def complete_job(self, job_key, variables):
+        self.completed += 1
+
+    async def fail_job(self, job_key, retries, message, retry_back_off_ms=0, variables=None):
+        self.failed += 1
+
+    async def throw_error(self, job_key, message, variables=None, error_code=""):
+        self.errors += 1
+
+def stub_agent(latency_s, jitter_s, seed):
+    """Replacement for agent.run_non_deterministic: sleeps like a remote
+    agent run, then returns a fixed verdict."""
+    rng = random.Random(seed)
+
+    def run_non_deterministic(agent_id, message_text):
+        time.sleep(max(0.0, latency_s + rng.uniform(-jitter_s, jitter_s)))
+        return {"final_status": "pass", "summary": "benchmark stub", "agent_id": agent_id}
+    return run_non_deterministic
+
+def stub_stream(latency_s, jitter_s, seed, fields_at=0.3):
+    """Replacement for agent.stream_non_deterministic: the verdict's
+    decision fields arrive `fields_at` of the way through the run."""
+    rng = random.Random(seed)
+
+    def stream_non_deterministic(agent_id, message_text, required=(), on_fields=None):
+        latency = max(0.0, latency_s + rng.uniform(-jitter_s, jitter_s))
+        time.sleep(latency * fields_at)
+        if on_fields is not None:
+            on_fields({"final_status": "pass"})
+        time.sleep(latency * (1 - fields_at))
+        return {"final_status": "pass", "summary": "benchmark stub", "agent_id": agent_id}
+    return stream_non_deterministic
+
+# process stages in BPMN order; task types within a stage run in parallel
+SPLIT_FLOW = (
+    ("wire-transparency", "cdd-kyc", "str-handling", "sanctions", "cash-transactions",
+     "purpose-checks", "fx-checks", "suitability-checks", "virtual-assets",
+     "channel-consistency", "correspondent-banking", "record-keeping", "data-quality",
+     "pricing-conflicts", "behavioural-tests"),
+    ("non-deterministic-tests",),
+    ("ai-report",),
+    ("ai-advisor",),
+)
+FUSED_FLOW = (("customer-aggregates",), ("all-deterministic-checks",)) + SPLIT_FLOW[1:]
+
+async def _run_e2e(rows, flow, concurrency, recorder=None, reruns=0, seed=0):
+    zeebe = FakeZeebe()
+    tasks = {task.type: task for task in worker.router.tasks}
+    # per-task-type limit on running jobs, as ZeebeWorker applies it
+    limits = {t: asyncio.Semaphore(tasks[t].config.max_running_jobs) for stage in flow for t in stage}
+    # the worker's agent slots, fresh for this event loop
+    worker.ai_limits = {t: asyncio.Semaphore(n) for t, n in worker.AI_MAX_RUNNING_JOBS.items()}
+    latencies = {t: [] for stage in flow for t in stage}
+    process_latencies = []
+    paths = {}
+    keys = iter(range(1, sys.maxsize))
+
+    async def run_job(task_type, variables):
+        async with limits[task_type]:
+            job = _job(next(keys), task_type, dict(variables))
+            if recorder is not None:
+                recorder.record(job)
+            t0 = time.perf_counter_ns()
+            job = await tasks[task_type].job_handler(job, worker.JobController(job, zeebe))
+            latencies[task_type].append(time.perf_counter_ns() - t0)
+            return job.task_result or {}
+
+    rng = random.Random(seed)
+
+    async def run_process(data):
+        t0 = time.perf_counter_ns()
+        variables = {"data": data}
+        for attempt in range(1 + reruns):
+            if attempt:
+                # a correction: one rule field takes another transaction's value
+                field = rng.choice(FIELDS)
+                variables["data"] = {**variables["data"], field: rng.choice(rows).get(field)}
+            for stage in flow:
+                for result in await asyncio.gather(*(run_job(t, variables) for t in stage)):
+                    variables.update(result)
+        path = (variables.get("prescreen") or {}).get("path")
+        paths[path] = paths.get(path, 0) + 1
+        process_latencies.append(time.perf_counter_ns() - t0)
+
+    # bounded number of process instances in flight
+    gate = asyncio.Semaphore(concurrency)
+
+    async def admit(data):
+        async with gate:
+            await run_process(data)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(admit(d) for d in rows))
+    elapsed = time.perf_counter() - start
+    # streamed runs still finishing after their jobs completed
+    await asyncio.gather(*worker.stream_tails)
+    return {
+        "process": _summary(process_latencies, elapsed),
+        "tasks": {t: _summary(v, elapsed) for t, v in latencies.items()},
+        "zeebe": {"completed": zeebe.completed, "failed": zeebe.failed, "errors": zeebe.errors},
+        "verdict_cache": worker.verdict_cache.stats(),
+        "prescreen": paths,
+    }
+
+def _counted(fn, counter):
+    def call(*args, **kwargs):
+        next(counter)
+        return fn(*args, **kwargs)
+    return call
+
+def bench_e2e(rows, flow, concurrency, agent_latency_ms, agent_jitter_ms, seed, alloc_sample, use_prescreen=True,
+              stream=False, record=None, reruns=0, incremental=False) -> dict:
+    prescreen.PRESCREEN_ENABLED = use_prescreen
+    worker.AI_STREAM = "drop" if stream else "off"
+    worker.INCREMENTAL = incremental
+    worker.aggregates = AggregateStore(path=None)
+    worker.verdict_cache = VerdictCache(worker.verdict_cache.max_entries, worker.verdict_cache.ttl, path=None)
+    calls = itertools.count()
+    worker.run_non_deterministic = _counted(stub_agent(agent_latency_ms / 1000, agent_jitter_ms / 1000, seed), calls)
+    worker.stream_non_deterministic = _counted(stub_stream(agent_latency_ms / 1000, agent_jitter_ms / 1000, seed), calls)
+    stages = FUSED_FLOW if flow == "fused" else SPLIT_FLOW
+    recorder = JobRecorder(record) if record else None
+    try:
+        result = asyncio.run(_run_e2e(rows, stages, concurrency, recorder, reruns, seed))
+    finally:
+        if recorder is not None:
+            recorder.close()
+    result["agent_calls"] = next(calls)
+    # allocations from a separate, smaller run: tracing distorts timings
+    tracemalloc.start()
+    try:
+        asyncio.run(_run_e2e(rows[:alloc_sample], stages, concurrency))
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result["alloc_peak_bytes"] = peak
+    result["alloc_retained_bytes"] = current
+    result["alloc_sample"] = min(alloc_sample, len(rows))
+    result["flow"] = flow
+    result["concurrency"] = concurrency
+    result["agent_latency_ms"] = agent_latency_ms
+    result["prescreen_enabled"] = use_prescreen
+    result["stream"] = stream
+    result["reruns"] = reruns
+    result["incremental"] = incremental
+    return result
+
+# -------------------------------
+# Regression check
+# -------------------------------
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """Entries whose throughput fell by more than `tolerance` (0.1 = 10%)."""
+    regressions = []
+    for suite in ("rules", "handlers"):
+        for name, entry in current.get(suite, {}).items():
+            before = baseline.get(suite, {}).get(name)
+            if before and entry["throughput"] < before["throughput"] * (1 - tolerance):
+                regressions.append(f"{suite}/{name}: {before['throughput']} -> {entry['throughput']} calls/s")
+    before = baseline.get("e2e", {}).get("process")
+    after = current.get("e2e", {}).get("process")
+    if before and after and after["throughput"] < before["throughput"] * (1 - tolerance):
+        regressions.append(f"e2e/process: {before['throughput']} -> {after['throughput']} processes/s")
+    return regressions
+
+def _print_table(title, entries):
+    print(f"\n{title}")
+    print(f"  {'name':<26}{'calls/s':>12}{'p50 us':>14}{'p99 us':>14}{'alloc B':>10}")
+    for name, e in entries.items():
+        print(f"  {name:<26}{e['throughput']:>12}{e['p50_us']:>14}{e['p99_us']:>14}{e.get('alloc_bytes_per_call', ''):>10}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark rules, handlers and the end-to-end worker flow.")
+    parser.add_argument("--suites", default="rules,handlers,e2e", help="comma-separated: rules, handlers, e2e")
+    parser.add_argument("--rows", type=int, default=5000, help="synthetic transactions per micro suite")
+    parser.add_argument("--e2e-rows", type=int, default=500, help="process instances for the e2e suite")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--alloc-sample", type=int, default=200, help="calls traced for allocation counts")
+    parser.add_argument("--flow", choices=("split", "fused"), default="split",
+                        help="per-category tasks (split) or all-deterministic-checks (fused)")
+    parser.add_argument("--concurrency", type=int, default=64, help="process instances in flight")
+    parser.add_argument("--agent-latency-ms", type=float, default=50.0)
+    parser.add_argument("--agent-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--no-prescreen", action="store_true", help="send every AI job to the (stubbed) agent")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream agent replies and complete AI jobs once the decision is in")
+    parser.add_argument("--reruns", type=int, default=0,
+                        help="re-run each e2e process this many times, correcting one data field each time")
+    parser.add_argument("--incremental", action="store_true", help="reuse unchanged rule and agent results on re-runs")
+    parser.add_argument("--record", help="also record the e2e jobs to this file, for replay.py")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON; exit 1 if throughput regressed")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    suites = {s.strip() for s in args.suites.split(",") if s.strip()}
+    rows = list(generate(args.rows, seed=args.seed))
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "rows": args.rows,
+            "seed": args.seed,
+        },
+    }
+    if "rules" in suites:
+        results["rules"] = bench_rules(rows, args.alloc_sample)
+        _print_table("Rules", results["rules"])
+    if "handlers" in suites:
+        results["handlers"] = bench_handlers(rows, args.alloc_sample)
+        _print_table("Category handlers", results["handlers"])
+    if "e2e" in suites:
+        e2e_rows = list(generate(args.e2e_rows, seed=args.seed + 1))
+        results["e2e"] = bench_e2e(
+            e2e_rows, args.flow, args.concurrency, args.agent_latency_ms, args.agent_jitter_ms, args.seed,
+            args.alloc_sample, not args.no_prescreen, args.stream, args.record, args.reruns, args.incremental,
+        )
+        _print_table(f"End-to-end ({args.flow} flow)", {"process": results["e2e"]["process"], **results["e2e"]["tasks"]})
+        print(f"  zeebe: {results['e2e']['zeebe']}  peak alloc: {results['e2e']['alloc_peak_bytes']} B"
+              f"  prescreen: {results['e2e']['prescreen']}  agent calls: {results['e2e']['agent_calls']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import math
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process counters, gauges and histograms, keyed by metric name and
+# labels. `snapshot` gives a JSON-able copy that a supervisor can collect
+# from each worker process and combine with `merge`; `render` turns a
+# snapshot into the Prometheus text format and `serve` exposes it over HTTP.
+
+# Histogram bucket upper bounds, in seconds: from per-rule evaluation
+# times (microseconds) up to agent runs (minutes)
+BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf,
+)
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        # (name, labels) -> [bucket counts, sum, count]
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+            h[0][bisect_left(BUCKETS, value)] += 1
+            h[1] += value
+            h[2] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                "gauges": [[name, dict(labels), value] for (name, labels), value in list(self.gauges.items())],
+                "histograms": [
+                    [name, dict(labels), list(buckets), total, count]
+                    for (name, labels), (buckets, total, count) in self.histograms.items()
+                ],
+            }
+
+    def add(self, snapshot):
+        """Sum a snapshot (see `merge`) into this registry."""
+        with self._lock:
+            for name, labels, value in snapshot.get("counters", ()):
+                key = _key(name, labels)
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, value in snapshot.get("gauges", ()):
+                key = _key(name, labels)
+                self.gauges[key] = self.gauges.get(key, 0) + value
+            for name, labels, buckets, total, count in snapshot.get("histograms", ()):
+                key = _key(name, labels)
+                h = self.histograms.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+                h[0] = [a + b for a, b in zip(h[0], buckets)]
+                h[1] += total
+                h[2] += count
+
+
+def merge(snapshots) -> dict:
+    """Sum several snapshots, e.g. one per worker process, into one.
+    Gauges are summed too, so a per-process limit becomes the total."""
+    combined = Metrics()
+    for snapshot in snapshots:
+        combined.add(snapshot)
+    return combined.snapshot()
+
+# -------------------------------
+# Prometheus exposition
+# -------------------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(labels, **extra):
+    pairs = {**labels, **extra}
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(pairs.items())) + "}"
+
+def render(snapshot) -> str:
+    """`snapshot` in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for kind, entries in (("counter", snapshot.get("counters", ())), ("gauge", snapshot.get("gauges", ()))):
+        typed = set()
+        for name, labels, value in sorted(entries, key=lambda e: (e[0], sorted(e[1].items()))):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{_labels(labels)} {value}")
+    typed = set()
+    for name, labels, buckets, total, count in sorted(snapshot.get("histograms", ()), key=lambda e: (e[0], sorted(e[1].items()))):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            le = "+Inf" if bound == math.inf else repr(bound)
+            lines.append(f"{name}_bucket{_labels(labels, le=le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {total}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+def serve(port: int, source=None, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve `source()` (default: METRICS.snapshot) at http://host:port/metrics
+    from a daemon thread. Call `shutdown()` on the result to stop it."""
+    source = source or METRICS.snapshot
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render(source()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # scrapes are not worth a log line each
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+# Process-wide registry
+METRICS = Metrics()
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+BATCH_INSTRUCTIONS = (
+    "This message contains several independent transactions under `transactions`, "
+    "each keyed by an ID. Assess each one on its own exactly as you would a single "
+    "transaction, and reply with one JSON object that maps every ID to that "
+    "transaction's JSON answer."
+)
+
+
+class MicroBatcher:
+    """Coalesces concurrent agent calls into one multi-transaction message.
+
+    Payloads submitted within `window` seconds of each other (or until
+    `max_size` are waiting) are sent as a single run through `send`, an
+    async callable taking the message text and returning the parsed reply.
+    Each submitter gets its own transaction's answer back; any transaction
+    missing from the reply, or the whole batch if the reply is not a JSON
+    object, is retried as a single-transaction call.
+    """
+
+    def __init__(self, send, window=0.05, max_size=8):
+        self.send = send
+        self.window = window
+        self.max_size = max_size
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, payload):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        try:
+            if len(batch) == 1:
+                answers = {}
+            else:
+                message = {
+                    "instructions": BATCH_INSTRUCTIONS,
+                    "transactions": {f"t{i}": payload for i, (payload, _) in enumerate(batch)},
+                }
+                reply = await self.send(json.dumps(message, ensure_ascii=False))
+                answers = reply if isinstance(reply, dict) else {}
+        except Exception:
+            answers = {}
+
+        await asyncio.gather(*(self._resolve(f"t{i}", payload, future, answers) for i, (payload, future) in enumerate(batch)))
+
+    async def _resolve(self, key, payload, future, answers):
+        if future.done():
+            return
+        answer = answers.get(key)
+        try:
+            if answer is None:
+                answer = await self.send(json.dumps(payload, ensure_ascii=False))
+        except Exception as e:
+            future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(answer)
@@ -0,0 +1,225 @@
+import os
+import re
+import unicodedata
+from array import array
+from functools import lru_cache
+from math import ceil
+
+import numpy as np
+
+# Party-name normalisation and fuzzy matching.
+#
+# `normalise` turns a name into a comparison key: transliterated to ASCII
+# where a mapping is known (accents, ligatures, Cyrillic, Greek),
+# lower-cased, punctuation removed, leading and trailing legal forms
+# ("Pte Ltd", "GmbH", "S.A.", "OOO") dropped and the remaining tokens
+# sorted, so "MÜLLER, Hans" and "hans muller" share the key "hans muller".
+#
+# Similarity is the Dice coefficient of the keys' character trigrams. A
+# NameIndex finds every indexed name scoring at least `threshold` against
+# a query through an inverted trigram index with length and prefix
+# filtering: candidates come only from the query's rarest trigrams, and
+# only those of compatible length are counted against the rest. At one
+# million names a lookup takes a few hundred microseconds.
+NAME_MATCH_THRESHOLD = float(os.getenv("NAME_MATCH_THRESHOLD", "0.85"))
+# candidates must appear in this many of the probed postings (see search)
+_PROBE_HITS = 3
+
+LEGAL_FORMS = frozenset((
+    "ltd", "limited", "inc", "incorporated", "corp", "corporation", "co", "company", "llc", "llp", "lp",
+    "plc", "pte", "pty", "gmbh", "ag", "kg", "sa", "sas", "sarl", "srl", "spa", "bv", "nv", "ab", "as",
+    "oy", "kk", "jsc", "ojsc", "pjsc", "ooo", "zao", "tbk", "bhd", "sdn",
+))
+# Forms that are also common in personal names ("Ab Rahman", "Maria Co",
+# "Zao Wei"): is_company only counts them after another legal form
+AMBIGUOUS_FORMS = frozenset(("co", "lp", "sa", "sas", "spa", "ab", "as", "oy", "kk", "zao", "sdn"))
+# Forms written before the name ("OOO Romashka")
+PREFIX_FORMS = frozenset(("ooo", "jsc", "ojsc", "pjsc"))
+
+_TRANSLIT = str.maketrans({
+    "ß": "ss", "æ": "ae", "œ": "oe", "ø": "o", "ł": "l", "đ": "d", "ð": "d", "þ": "th", "ı": "i",
+    # Cyrillic
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y",
+    "ь": "", "э": "e", "ю": "yu", "я": "ya", "і": "i", "ї": "yi", "є": "ye", "ґ": "g",
+    # Greek
+    "α": "a", "β": "v", "γ": "g", "δ": "d", "ε": "e", "ζ": "z", "η": "i", "θ": "th", "ι": "i", "κ": "k",
+    "λ": "l", "μ": "m", "ν": "n", "ξ": "x", "ο": "o", "π": "p", "ρ": "r", "σ": "s", "ς": "s", "τ": "t",
+    "υ": "y", "φ": "f", "χ": "ch", "ψ": "ps", "ω": "o",
+})
+_PUNCT = re.compile(r"[\W_]+")
+
+# -------------------------------
+# Normalisation
+# -------------------------------
+@lru_cache(maxsize=65536)
+def tokens(name) -> tuple:
+    """Transliterated, lower-cased word tokens of `name`, in order."""
+    if not name:
+        return ()
+    text = str(name).casefold()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch)).translate(_TRANSLIT)
+    # "S.A." -> "sa", "Co." -> "co"; any other punctuation separates words
+    return tuple(_PUNCT.sub(" ", text.replace(".", "")).split())
+
+@lru_cache(maxsize=65536)
+def normalise(name) -> str:
+    """Comparison key: tokens without leading or trailing legal forms
+    ("OOO Gazprom", "Alpine Pte Ltd"), sorted."""
+    words = list(tokens(name))
+    while len(words) > 1 and words[-1] in LEGAL_FORMS:
+        words.pop()
+    while len(words) > 1 and words[0] in LEGAL_FORMS:
+        words.pop(0)
+    return " ".join(sorted(words))
+
+def is_company(name) -> bool:
+    """True if `name` ends in a legal form ("Alpine Pte Ltd", but not
+    "Ltd Cohen") or starts with one of PREFIX_FORMS. An ambiguous trailing
+    form needs another legal form before it, so "Maria Co" is a person."""
+    words = tokens(name)
+    if len(words) < 2:
+        return False
+    if words[0] in PREFIX_FORMS:
+        return True
+    last = words[-1]
+    if last in AMBIGUOUS_FORMS:
+        return words[-2] in LEGAL_FORMS
+    return last in LEGAL_FORMS
+
+def _grams(key: str) -> set:
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def similarity(a, b) -> float:
+    """Dice coefficient of the trigrams of `a` and `b`'s keys, 0.0 to 1.0."""
+    ka, kb = normalise(a), normalise(b)
+    if not ka or not kb:
+        return 0.0
+    if ka == kb:
+        return 1.0
+    ga, gb = _grams(ka), _grams(kb)
+    return 2 * len(ga & gb) / (len(ga) + len(gb))
+
+def similar(a, b, threshold=NAME_MATCH_THRESHOLD) -> bool:
+    return similarity(a, b) >= threshold
+
+# -------------------------------
+# Index
+# -------------------------------
+class NameIndex:
+    """Inverted trigram index over a watchlist of names.
+
+    `search` returns (score, name) pairs at or above `threshold`, best
+    first. Names with the same key are indexed once, under the first name
+    added. Postings are frozen into sorted NumPy arrays on the first
+    search after an `add` (or by calling `freeze`), so build the index
+    fully before serving lookups from it.
+    """
+
+    def __init__(self, names=()):
+        self.names = []
+        self.keys = []
+        self._sizes = array("H")
+        self._postings = {}
+        self._ids = {}
+        self._frozen = None
+        for name in names:
+            self.add(name)
+        self.freeze()
+
+    def add(self, name):
+        key = normalise(name)
+        if not key or key in self._ids:
+            return
+        i = self._ids[key] = len(self.keys)
+        self.names.append(name)
+        self.keys.append(key)
+        grams = _grams(key)
+        self._sizes.append(min(len(grams), 0xFFFF))
+        postings = self._postings
+        for gram in grams:
+            ids = postings.get(gram)
+            if ids is None:
+                ids = postings[gram] = array("I")
+            ids.append(i)
+        self._frozen = None
+
+    def freeze(self):
+        """Build the search arrays: ids renumbered in order of trigram count,
+        so the names of a compatible length are one slice of each posting."""
+        if self._frozen is None:
+            sizes = np.frombuffer(self._sizes, dtype=np.uint16)
+            order = np.argsort(sizes, kind="stable")
+            rank = np.empty(len(order), dtype=np.uint32)
+            rank[order] = np.arange(len(order), dtype=np.uint32)
+            postings = {gram: np.sort(rank[np.frombuffer(ids, dtype=np.uint32)]) for gram, ids in self._postings.items()}
+            self._frozen = (postings, sizes[order].astype(np.float64), order)
+        return self._frozen
+
+    def search(self, query, threshold=NAME_MATCH_THRESHOLD, limit=10) -> list:
+        key = normalise(query)
+        if not key or not self.keys:
+            return []
+        if threshold >= 1.0:
+            exact = self._ids.get(key)
+            return [(1.0, self.names[exact])] if exact is not None else []
+        postings, sizes, order = self.freeze()
+
+        grams = _grams(key)
+        n = len(grams)
+        # A name with Dice >= t against n query grams has between
+        # t*n/(2-t) and (2-t)*n/t grams and shares at least o = t*n/(2-t)
+        # of them, so at least k of the query's n - o + k rarest grams
+        # (absent grams being the rarest). Candidates come from those
+        # postings; the other grams only add to their counts.
+        shortest = threshold * n / (2 - threshold) - 1e-9
+        longest = (2 - threshold) * n / threshold + 1e-9
+        min_overlap = max(1, ceil(shortest))
+        k = min(_PROBE_HITS, min_overlap)
+        ordered = sorted((postings[g] for g in grams if g in postings), key=len)
+        probes = n - min_overlap + k - (n - len(ordered))
+        if probes <= 0:
+            return []
+        # ids of names with a compatible trigram count
+        lo, hi = np.searchsorted(sizes, shortest), np.searchsorted(sizes, longest, side="right")
+        parts = []
+        for ids in ordered[:probes]:
+            a, b = np.searchsorted(ids, (lo, hi))
+            parts.append(ids[a:b])
+        candidates, counts = np.unique(np.concatenate(parts), return_counts=True)
+        keep = counts >= k
+        candidates, counts = candidates[keep], counts[keep]
+        size = sizes[candidates]
+        # overlap needed for Dice >= t, per candidate
+        needed = threshold * (n + size) / 2 - 1e-9
+        left = len(ordered) - probes
+        for ids in ordered[probes:]:
+            if not len(candidates):
+                return []
+            at = np.searchsorted(ids, candidates)
+            at[at == len(ids)] = 0
+            counts += ids[at] == candidates
+            left -= 1
+            alive = counts + left >= needed
+            if not alive.all():
+                candidates, counts, size, needed = candidates[alive], counts[alive], size[alive], needed[alive]
+
+        hits = np.flatnonzero(counts >= needed)
+        if not len(hits):
+            return []
+        ids = order[candidates[hits]]
+        scores = 2 * counts[hits] / (n + size[hits])
+        best = np.lexsort((ids, -scores))[:limit]
+        return [(round(float(scores[j]), 4), self.names[ids[j]]) for j in best]
+
+    def best(self, query, threshold=NAME_MATCH_THRESHOLD):
+        """The best (score, name) match for `query`, or None."""
+        found = self.search(query, threshold, limit=1)
+        return found[0] if found else None
+
+    def __len__(self):
+        return len(self.keys)
@@ -0,0 +1,117 @@
+import json
+import os
+
+from rules import CATEGORIES, FIELDS
+
+# Rough chars-per-token ratio used to turn a token budget into a JSON length
+CHARS_PER_TOKEN = 4
+# Longest string value sent to an agent before it is clipped
+MAX_STRING_CHARS = int(os.getenv("AGENT_MAX_STRING_CHARS", "512"))
+
+# Per-agent projection:
+#   data     - the `data` fields sent to this agent: True for all of them,
+#              or a tuple of names (empty fields are always dropped)
+#   exclude  - other process variables never sent to this agent (ai_inputs
+#              and prescreen describe the AI runs themselves, see worker.py)
+#   budget   - token budget for the serialised payload
+#
+# non-deterministic-tests judges the transaction itself and ai-report
+# explains the findings, so both see the whole record. ai-advisor decides
+# on the report; of the raw record it gets the fields that frame the
+# decision (who, where, how much and the customer risk factors).
+ADVISOR_FIELDS = (
+    "transaction_id", "amount", "currency", "product_type", "channel", "booking_jurisdiction",
+    "originator_country", "beneficiary_country", "customer_type", "customer_risk_rating",
+    "customer_is_pep", "high_risk_corridor", "sanctions_screening", "is_str_related",
+)
+
+PAYLOADS = {
+    "non-deterministic-tests": {
+        "data": True,
+        "exclude": ("ai_inputs", "prescreen"),
+        "budget": int(os.getenv("AGENT_TOKEN_BUDGET_NON_DETERMINISTIC", "1500")),
+    },
+    "ai-report": {
+        "data": True,
+        "exclude": ("ai_inputs", "prescreen"),
+        "budget": int(os.getenv("AGENT_TOKEN_BUDGET_REPORT", "2000")),
+    },
+    "ai-advisor": {
+        "data": ADVISOR_FIELDS,
+        "exclude": ("ai_inputs", "prescreen", "aggregates"),
+        "budget": int(os.getenv("AGENT_TOKEN_BUDGET_ADVISOR", "2000")),
+    },
+}
+
+
+def compact_results(variables: dict) -> dict:
+    """Failed rule IDs per category, leaving out categories that fully passed."""
+    failed = {}
+    for name in CATEGORIES:
+        result = variables.get(name)
+        if not isinstance(result, dict):
+            continue
+        ids = [rule_id for rule_id, ok in (result.get("tests") or {}).items() if not ok]
+        if ids:
+            failed[name] = ids
+    return failed
+
+
+def _clip(value):
+    if isinstance(value, str) and len(value) > MAX_STRING_CHARS:
+        return value[:MAX_STRING_CHARS] + "…"
+    return value
+
+
+def _size(key, value) -> int:
+    return len(json.dumps({key: value}, ensure_ascii=False, default=str))
+
+
+def project(task_type: str, variables: dict) -> dict:
+    """Build the payload sent to the agent behind `task_type`.
+
+    Category results are reduced to `failed_rules`; `data` keeps the
+    agent's non-empty fields; everything else passes through unless excluded.
+    If the result exceeds the agent's token budget, fields are dropped in
+    a fixed order until it fits: `data` fields no rule reads, then other
+    variables, then rule fields, each in reverse name order. The number of
+    dropped fields is reported as `truncated`; `failed_rules` is never dropped.
+    """
+    spec = PAYLOADS[task_type]
+    payload = {"failed_rules": compact_results(variables)}
+    data = {}
+    if spec["data"]:
+        source = variables.get("data") or {}
+        if spec["data"] is not True:
+            source = {k: source[k] for k in spec["data"] if k in source}
+        data = {k: _clip(v) for k, v in source.items() if v not in (None, "", [], {})}
+    extras = {
+        k: _clip(v) for k, v in variables.items()
+        if k != "data" and k not in CATEGORIES and k not in spec["exclude"]
+    }
+
+    budget = spec["budget"] * CHARS_PER_TOKEN
+    size = _size("failed_rules", payload["failed_rules"]) + len('{"data":{}}')
+    size += sum(_size(k, v) for k, v in data.items()) + sum(_size(k, v) for k, v in extras.items())
+
+    truncated = 0
+    if size > budget:
+        rule_fields = set(FIELDS)
+        drop_order = (
+            [("data", k) for k in sorted((k for k in data if k not in rule_fields), reverse=True)]
+            + [("extra", k) for k in sorted(extras, reverse=True)]
+            + [("data", k) for k in sorted((k for k in data if k in rule_fields), reverse=True)]
+        )
+        for where, key in drop_order:
+            if size <= budget:
+                break
+            source = data if where == "data" else extras
+            size -= _size(key, source.pop(key))
+            truncated += 1
+
+    if spec["data"]:
+        payload["data"] = data
+    payload.update(extras)
+    if truncated:
+        payload["truncated"] = truncated
+    return payload
@@ -0,0 +1,106 @@
+import os
+
+from payload import compact_results
+from rules import CATEGORIES
+
+# Deterministic pre-screen in front of the AI agents.
+#
+# Before an agent is called, the deterministic category results and a few
+# customer risk factors are turned into a risk score. Below
+# AI_PRESCREEN_RISK_THRESHOLD the agent is skipped and a templated answer
+# is returned instead; every AI job records the decision in the
+# `prescreen` process variable:
+#
+#   {"path": "local" | "agent", "risk_score": 0.3, "threshold": 0.5, "reasons": [...]}
+#
+# Only a transaction whose categories all passed can take the local path;
+# a failed rule in any category, or a missing result, always goes to the
+# agent, as does everything with AI_PRESCREEN=0. The threshold then
+# applies to the customer risk factors, and the category weights only
+# rank what the agents are sent.
+PRESCREEN_ENABLED = os.getenv("AI_PRESCREEN", "1") != "0"
+RISK_THRESHOLD = float(os.getenv("AI_PRESCREEN_RISK_THRESHOLD", "0.5"))
+
+# score added per failed rule, by category; anything at or above the
+# default threshold on its own always reaches an agent
+CATEGORY_WEIGHTS = {
+    "sanctions": 1.0,
+    "str": 1.0,
+    "cash": 0.6,
+    "counterparty": 0.6,
+    "behavioral": 0.5,
+    "virtual": 0.5,
+    "wire": 0.4,
+    "cdd": 0.4,
+    "purpose": 0.3,
+    "fx": 0.2,
+    "suitability": 0.2,
+    "channel": 0.2,
+    "record": 0.2,
+    "dataquality": 0.1,
+}
+# score added when a `data` field holds one of the values
+RISK_FACTORS = {
+    "customer_risk_rating": ({"High"}, 0.3),
+    "customer_is_pep": ({True}, 0.3),
+    "high_risk_corridor": ({True}, 0.3),
+}
+
+def risk_score(variables: dict) -> tuple:
+    """(score, reasons) from the category results and `data` risk factors."""
+    score = 0.0
+    reasons = []
+    for name, rule_ids in compact_results(variables).items():
+        score += CATEGORY_WEIGHTS.get(name, 1.0) * len(rule_ids)
+        reasons.extend(rule_ids)
+    data = variables.get("data") or {}
+    for field, (values, weight) in RISK_FACTORS.items():
+        if data.get(field) in values:
+            score += weight
+            reasons.append(field)
+    return round(score, 3), reasons
+
+def prescreen(variables: dict) -> dict:
+    """Decide whether the agents need to see this transaction."""
+    missing = [name for name in CATEGORIES if not isinstance(variables.get(name), dict)]
+    failed = [name for name in CATEGORIES if name not in missing and variables[name].get("overall_status") != "pass"]
+    score, reasons = risk_score(variables)
+    if not PRESCREEN_ENABLED:
+        path, reasons = "agent", ["prescreen disabled"]
+    elif missing:
+        path, reasons = "agent", [f"no result for {name}" for name in missing]
+    elif failed:
+        path = "agent"
+    else:
+        path = "local" if score < RISK_THRESHOLD else "agent"
+    return {"path": path, "risk_score": score, "threshold": RISK_THRESHOLD, "reasons": reasons}
+
+# -------------------------------
+# Templated answers
+# -------------------------------
+def local_report(variables: dict, decision: dict) -> dict:
+    """Stands in for the ai-report agent's explanation."""
+    failed = compact_results(variables)
+    if failed:
+        summary = (
+            f"{sum(map(len, failed.values()))} deterministic finding(s) "
+            f"({', '.join(sorted(r for ids in failed.values() for r in ids))}) need review."
+        )
+    elif decision["reasons"]:
+        summary = (
+            f"All deterministic checks passed; risk score {decision['risk_score']} "
+            f"({', '.join(decision['reasons'])}) is below the review threshold of {decision['threshold']}."
+        )
+    else:
+        summary = "All deterministic checks passed and no customer risk factors apply."
+    return {"summary": summary, "failed_rules": failed, "risk_score": decision["risk_score"], "source": "prescreen"}
+
+def local_assessment(variables: dict, decision: dict) -> dict:
+    """Stands in for the ai-advisor agent's verdict."""
+    return {
+        # prescreen() never sends failed rules here; if it ever does, don't clear them
+        "final_status": "needs_advice" if compact_results(variables) else "pass",
+        "rationale": local_report(variables, decision)["summary"],
+        "risk_score": decision["risk_score"],
+        "source": "prescreen",
+    }
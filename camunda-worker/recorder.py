@@ -0,0 +1,114 @@
+import logging
+import os
+import struct
+import threading
+import time
+
+import msgpack
+from pyzeebe import Job
+
+log = logging.getLogger("worker")
+
+# Job recorder: with JOB_RECORD_PATH set, the worker appends every
+# activated job to that file so production traffic can be replayed
+# locally (see replay.py).
+#
+# The file is a sequence of records, each a 4-byte big-endian length
+# followed by a msgpack map:
+#
+#   {"ts": 1718000000.123, "type": "sanctions", "key": 2251799813685249,
+#    "process_instance_key": ..., "bpmn_process_id": ..., "element_id": ...,
+#    "retries": 3, "headers": {...}, "variables": {...}}
+#
+# The file is only ever appended to. Records are buffered and flushed
+# with the first record after JOB_RECORD_FLUSH_SECONDS and on shutdown; a
+# record cut short by a crash is ignored when reading. Recording stops
+# once the file reaches JOB_RECORD_MAX_MB (0 = no limit). Under
+# supervisor.py give each process its own file with a "{pid}" in the
+# path; replay.py merges several recordings by timestamp.
+JOB_RECORD_PATH = os.getenv("JOB_RECORD_PATH") or None
+JOB_RECORD_FLUSH_SECONDS = float(os.getenv("JOB_RECORD_FLUSH_SECONDS", "1"))
+JOB_RECORD_MAX_MB = float(os.getenv("JOB_RECORD_MAX_MB", "1024"))
+
+_LENGTH = struct.Struct(">I")
+
+
+class JobRecorder:
+    """Appends jobs to a length-prefixed msgpack file."""
+
+    def __init__(self, path, flush_interval=JOB_RECORD_FLUSH_SECONDS, max_bytes=JOB_RECORD_MAX_MB * 1024 * 1024):
+        self.path = path.format(pid=os.getpid())
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.records = 0
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        self._flushed = time.monotonic()
+        self._packer = msgpack.Packer(default=str)
+        self._lock = threading.Lock()
+
+    def record(self, job: Job):
+        body = self._packer.pack({
+            "ts": time.time(),
+            "type": job.type,
+            "key": job.key,
+            "process_instance_key": job.process_instance_key,
+            "bpmn_process_id": job.bpmn_process_id,
+            "element_id": job.element_id,
+            "retries": job.retries,
+            "headers": job.custom_headers,
+            "variables": job.variables,
+        })
+        with self._lock:
+            if self._file is None:
+                return
+            if self.max_bytes and self._size + len(body) + _LENGTH.size > self.max_bytes:
+                log.warning("Job recording full; no longer recording", extra={"path": self.path, "records": self.records})
+                self._close()
+                return
+            self._file.write(_LENGTH.pack(len(body)))
+            self._file.write(body)
+            self._size += len(body) + _LENGTH.size
+            self.records += 1
+            now = time.monotonic()
+            if now - self._flushed >= self.flush_interval:
+                self._file.flush()
+                self._flushed = now
+
+    async def before(self, job: Job) -> Job:
+        """Worker `before` decorator recording each job as it starts."""
+        self.record(job)
+        return job
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_records(path):
+    """Yield the records of a recording in order."""
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                return
+            (length,) = _LENGTH.unpack(header)
+            body = f.read(length)
+            if len(body) < length:
+                log.warning("Recording ends in a partial record", extra={"path": path})
+                return
+            yield msgpack.unpackb(body, strict_map_key=False)
+
+def to_job(record: dict) -> Job:
+    """Rebuild the Job a record was taken from."""
+    return Job(
+        key=record["key"], type=record["type"], process_instance_key=record["process_instance_key"],
+        bpmn_process_id=record["bpmn_process_id"], process_definition_version=1, process_definition_key=1,
+        element_id=record["element_id"], element_instance_key=record["key"], custom_headers=record["headers"],
+        worker="replay", retries=record["retries"], deadline=0, variables=record["variables"],
+    )
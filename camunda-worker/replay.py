@@ -0,0 +1,147 @@
+"""Replay recorded jobs through the worker's task handlers.
+
+    JOB_RECORD_PATH=jobs-{pid}.rec python worker.py      # record
+    python replay.py jobs-*.rec --speed 10                # replay 10x faster
+
+Jobs from one or more recordings (see recorder.py) are merged by
+timestamp and handed to the router's job handlers at their recorded
+pace divided by `--speed` (0 = as fast as the handlers allow). As with
+ZeebeWorker, no more than `max_running_jobs` of one task type run at
+once. Completions go to a fake Zeebe adapter and agents are stubbed, so
+no cluster or Azure project is needed. Customer aggregates and cached
+verdicts start empty and stay in memory, so AGGREGATE_SNAPSHOT_PATH and
+VERDICT_CACHE_PATH are neither read nor written. For each task type the report gives the handler time (calls/s,
+p50, p99) and how late jobs started against their schedule. Lateness
+shows the replay fell behind the recorded load.
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import sys
+import time
+
+# replays build their own customer aggregates and verdicts; importing
+# worker must not load the live snapshot or open the live verdict cache
+# (replay() also swaps in a fresh store)
+os.environ["AGGREGATE_SNAPSHOT_PATH"] = ""
+os.environ["VERDICT_CACHE_PATH"] = ""
+
+import prescreen
+import worker
+from aggregates import AggregateStore
+from benchmark import FakeZeebe, _print_table, _summary, stub_agent, stub_stream
+from recorder import read_records, to_job
+
+async def _replay(paths, speed, task_types, limit, max_pending):
+    zeebe = FakeZeebe()
+    tasks = {task.type: task for task in worker.router.tasks}
+    running = {t: asyncio.Semaphore(task.config.max_running_jobs) for t, task in tasks.items()}
+    worker.ai_limits = {t: asyncio.Semaphore(n) for t, n in worker.AI_MAX_RUNNING_JOBS.items()}
+    pending = asyncio.Semaphore(max_pending)
+    latencies = {}
+    lateness = {}
+    skipped = {}
+    in_flight = set()
+
+    async def run_job(record, due):
+        try:
+            task_type = record["type"]
+            async with running[task_type]:
+                late = time.perf_counter() - due
+                job = to_job(record)
+                t0 = time.perf_counter_ns()
+                await tasks[task_type].job_handler(job, worker.JobController(job, zeebe))
+                latencies.setdefault(task_type, []).append(time.perf_counter_ns() - t0)
+                lateness.setdefault(task_type, []).append(max(0, int(late * 1e9)))
+        finally:
+            pending.release()
+
+    records = heapq.merge(*(read_records(p) for p in paths), key=lambda r: r["ts"])
+    first = None
+    start = time.perf_counter()
+    count = 0
+    for record in records:
+        if limit and count >= limit:
+            break
+        task_type = record["type"]
+        if task_type not in tasks or (task_types and task_type not in task_types):
+            skipped[task_type] = skipped.get(task_type, 0) + 1
+            continue
+        if first is None:
+            first = record["ts"]
+        due = start + (record["ts"] - first) / speed if speed else time.perf_counter()
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await pending.acquire()
+        task = asyncio.ensure_future(run_job(record, due))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        count += 1
+        last = record["ts"]
+    await asyncio.gather(*in_flight)
+    await asyncio.gather(*worker.stream_tails)
+    elapsed = time.perf_counter() - start
+
+    recorded = (last - first) if count else 0.0
+    return {
+        "jobs": count,
+        "elapsed_s": round(elapsed, 3),
+        "recorded_s": round(recorded, 3),
+        "speedup": round(recorded / elapsed, 2) if elapsed else 0.0,
+        "tasks": {t: _summary(v, elapsed) for t, v in latencies.items()},
+        "lateness": {t: _summary(v, elapsed) for t, v in lateness.items()},
+        "skipped": skipped,
+        "zeebe": {"completed": zeebe.completed, "failed": zeebe.failed, "errors": zeebe.errors},
+    }
+
+def replay(paths, speed=1.0, task_types=None, limit=0, max_pending=10000, agent_latency_ms=50.0,
+           agent_jitter_ms=10.0, seed=0, use_prescreen=True, stream=False, cache=False) -> dict:
+    prescreen.PRESCREEN_ENABLED = use_prescreen
+    # fresh in-memory aggregates: never load or overwrite the live snapshot
+    worker.aggregates = AggregateStore(path=None)
+    worker.AI_STREAM = "drop" if stream else "off"
+    worker.run_non_deterministic = stub_agent(agent_latency_ms / 1000, agent_jitter_ms / 1000, seed)
+    worker.stream_non_deterministic = stub_stream(agent_latency_ms / 1000, agent_jitter_ms / 1000, seed)
+    if not cache:
+        # recorded retries and repeats would otherwise skip the stubbed agent
+        worker.verdict_cache.max_entries = 0
+    return asyncio.run(_replay(paths, speed, task_types, limit, max_pending))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded Zeebe jobs through the worker's handlers.")
+    parser.add_argument("paths", nargs="+", help="recordings written with JOB_RECORD_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="multiple of the recorded rate; 0 = unthrottled")
+    parser.add_argument("--task-types", help="comma-separated task types to replay (default: all)")
+    parser.add_argument("--limit", type=int, default=0, help="replay at most this many jobs")
+    parser.add_argument("--max-pending", type=int, default=10000, help="jobs dispatched but not yet finished")
+    parser.add_argument("--agent-latency-ms", type=float, default=50.0)
+    parser.add_argument("--agent-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-prescreen", action="store_true", help="send every AI job to the (stubbed) agent")
+    parser.add_argument("--stream", action="store_true", help="use the streaming agent path")
+    parser.add_argument("--cache", action="store_true", help="keep the verdict cache enabled")
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    task_types = {t.strip() for t in args.task_types.split(",") if t.strip()} if args.task_types else None
+    result = replay(
+        args.paths, args.speed, task_types, args.limit, args.max_pending, args.agent_latency_ms,
+        args.agent_jitter_ms, args.seed, not args.no_prescreen, args.stream, args.cache,
+    )
+    _print_table("Handlers", result["tasks"])
+    _print_table("Start lateness", result["lateness"])
+    print(f"\n  {result['jobs']} jobs, {result['recorded_s']} s recorded, replayed in {result['elapsed_s']} s "
+          f"({result['speedup']}x)  zeebe: {result['zeebe']}")
+    if result["skipped"]:
+        print(f"  skipped: {result['skipped']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
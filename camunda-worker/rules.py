@@ -0,0 +1,714 @@
+import json
+import sys
+from datetime import datetime, date
+from hashlib import blake2b
+from time import perf_counter
+
+from names import NAME_MATCH_THRESHOLD, is_company, similar
+from screening import SCREENING
+
+# -------------------------------
+# Helpers
+# -------------------------------
+def _to_iso_dt(s: str) -> datetime | None:
+    if not s or not s.strip():
+        return None
+    try:
+        return datetime.fromisoformat(s)
+    except ValueError:
+        return None
+
+def _to_dmy_date(s: str) -> date | None:
+    if not s or not s.strip():
+        return None
+    try:
+        return datetime.strptime(s, "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+def _to_float(s) -> float:
+    try:
+        return float(s)
+    except (ValueError, TypeError):
+        return 0.0
+
+def _to_int(s) -> int:
+    try:
+        return int(s)
+    except (ValueError, TypeError):
+        return 0
+
+def _status(results: dict) -> str:
+    if all(results.values()):
+        return "pass"
+    elif any(results.values()):
+        return "needs_advice"
+    return "fail"
+
+# -------------------------------
+# Normalised transaction record
+# -------------------------------
+_UNSET = object()
+
+def _intern(s):
+    return sys.intern(s) if type(s) is str else s
+
+class Txn:
+    """One transaction's `data` dict, parsed at most once per field.
+
+    Country and channel codes are interned up front; dates, amounts and
+    normalised text are derived lazily the first time a rule asks for them.
+    Plain flags are read through `get`, which is the underlying dict's own.
+    """
+
+    __slots__ = (
+        "data", "get", "channel", "originator_country", "beneficiary_country",
+        "_amount", "_booking_dt", "_kyc_due", "_kyc_last_completed", "_value_date",
+        "_narrative_lower", "_counterparty_lower", "_originator_name_stripped",
+        "_beneficiary_name_stripped", "_beneficiary_account_stripped",
+        "_beneficiary_name_lower", "_beneficiary_account_lower", "_originator_country_stripped",
+        "_beneficiary_country_stripped",
+    )
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.get = data.get
+        self.channel = _intern(data.get("channel"))
+        self.originator_country = _intern(data.get("originator_country"))
+        self.beneficiary_country = _intern(data.get("beneficiary_country"))
+        self._amount = self._booking_dt = self._kyc_due = self._kyc_last_completed = \
+            self._value_date = self._narrative_lower = self._counterparty_lower = \
+            self._originator_name_stripped = self._beneficiary_name_stripped = \
+            self._beneficiary_account_stripped = self._beneficiary_name_lower = \
+            self._beneficiary_account_lower = self._originator_country_stripped = \
+            self._beneficiary_country_stripped = _UNSET
+
+    @property
+    def amount(self) -> float:
+        if self._amount is _UNSET:
+            self._amount = _to_float(self.data.get("amount"))
+        return self._amount
+
+    @property
+    def booking_dt(self) -> datetime | None:
+        if self._booking_dt is _UNSET:
+            self._booking_dt = _to_iso_dt(self.data.get("booking_datetime"))
+        return self._booking_dt
+
+    @property
+    def kyc_due(self) -> date | None:
+        if self._kyc_due is _UNSET:
+            self._kyc_due = _to_dmy_date(self.data.get("kyc_due_date"))
+        return self._kyc_due
+
+    @property
+    def kyc_last_completed(self) -> date | None:
+        if self._kyc_last_completed is _UNSET:
+            self._kyc_last_completed = _to_dmy_date(self.data.get("kyc_last_completed"))
+        return self._kyc_last_completed
+
+    @property
+    def value_date(self) -> date | None:
+        if self._value_date is _UNSET:
+            self._value_date = _to_dmy_date(self.data.get("value_date"))
+        return self._value_date
+
+    @property
+    def narrative_lower(self) -> str:
+        if self._narrative_lower is _UNSET:
+            self._narrative_lower = (self.data.get("narrative") or "").lower()
+        return self._narrative_lower
+
+    @property
+    def counterparty_lower(self) -> str:
+        if self._counterparty_lower is _UNSET:
+            self._counterparty_lower = (self.data.get("counterparty") or "").lower()
+        return self._counterparty_lower
+
+    @property
+    def originator_name_stripped(self) -> str:
+        if self._originator_name_stripped is _UNSET:
+            self._originator_name_stripped = (self.data.get("originator_name") or "").strip()
+        return self._originator_name_stripped
+
+    @property
+    def beneficiary_name_stripped(self) -> str:
+        if self._beneficiary_name_stripped is _UNSET:
+            self._beneficiary_name_stripped = (self.data.get("beneficiary_name") or "").strip()
+        return self._beneficiary_name_stripped
+
+    @property
+    def beneficiary_account_stripped(self) -> str:
+        if self._beneficiary_account_stripped is _UNSET:
+            self._beneficiary_account_stripped = (self.data.get("beneficiary_account") or "").strip()
+        return self._beneficiary_account_stripped
+
+    @property
+    def beneficiary_name_lower(self) -> str:
+        if self._beneficiary_name_lower is _UNSET:
+            self._beneficiary_name_lower = (self.data.get("beneficiary_name") or "").lower().strip()
+        return self._beneficiary_name_lower
+
+    @property
+    def beneficiary_account_lower(self) -> str:
+        if self._beneficiary_account_lower is _UNSET:
+            self._beneficiary_account_lower = (self.data.get("beneficiary_account") or "").lower().strip()
+        return self._beneficiary_account_lower
+
+    @property
+    def originator_country_stripped(self) -> str:
+        if self._originator_country_stripped is _UNSET:
+            self._originator_country_stripped = (self.data.get("originator_country") or "").strip()
+        return self._originator_country_stripped
+
+    @property
+    def beneficiary_country_stripped(self) -> str:
+        if self._beneficiary_country_stripped is _UNSET:
+            self._beneficiary_country_stripped = (self.data.get("beneficiary_country") or "").strip()
+        return self._beneficiary_country_stripped
+
+# -------------------------------
+# Rule registry
+# -------------------------------
+# Cost classes, cheapest first: flag lookups, number/date parsing, text scans
+FLAG, PARSE, TEXT = 0, 1, 2
+COST_NAMES = {FLAG: "flag", PARSE: "parse", TEXT: "text"}
+
+class Rule:
+    """Registry entry for one deterministic rule.
+
+    `guard` is `(field, values)`: unless `data[field]` equals one of
+    `values` (or is truthy, when `values` is None) the rule cannot fail, so
+    a plan records a pass without calling it.
+    """
+
+    __slots__ = ("id", "category", "fn", "cost", "fields", "guard")
+
+    def __init__(self, rule_id, category, fn, cost, fields, guard=None):
+        self.id = rule_id
+        self.category = category
+        self.fn = fn
+        self.cost = cost
+        self.fields = fields
+        self.guard = guard
+
+# rule ID -> Rule, in declaration order
+RULES = {}
+
+def rule(rule_id, category, cost, fields, guard=None):
+    def register(fn):
+        RULES[rule_id] = Rule(rule_id, category, fn, cost, tuple(fields), guard)
+        return fn
+    return register
+
+# -------------------------------
+# A. Wire transparency & travel rule
+# -------------------------------
+@rule("TR-001", "wire", PARSE, guard=("channel", {"SWIFT", "RTGS"}),
+      fields=("channel", "originator_country", "beneficiary_country", "amount", "originator_name", "originator_account"))
+def tr_001(d): 
+    return not (
+        d.channel in {"SWIFT", "RTGS"} and
+        d.originator_country != d.beneficiary_country and
+        d.amount > 2000 and
+        any(not d.get(f) for f in ["originator_name", "originator_account"])
+    )
+
+@rule("TR-002", "wire", FLAG, guard=("swift_mt", None), fields=("swift_mt", "swift_f50_present", "swift_f59_present"))
+def tr_002(d): 
+    return not (d.get("swift_mt") and (not d.get("swift_f50_present") or not d.get("swift_f59_present")))
+
+@rule("TR-003", "wire", FLAG, guard=("channel", {"SWIFT"}),
+      fields=("channel", "ordering_institution_bic", "originator_name"))
+def tr_003(d): 
+    return not (d.channel == "SWIFT" and d.get("ordering_institution_bic") and not d.get("originator_name"))
+
+@rule("TR-004", "wire", FLAG, guard=("travel_rule_complete", {False}),
+      fields=("travel_rule_complete", "transaction_executed"))
+def tr_004(d): 
+    return not (d.get("travel_rule_complete") is False and d.get("transaction_executed", True))
+
+# -------------------------------
+# B. CDD / KYC freshness & EDD
+# -------------------------------
+@rule("CDD-005", "cdd", PARSE, fields=("booking_datetime", "kyc_due_date"))
+def cdd_005(d):
+    booking_dt = d.booking_dt
+    due_dt = d.kyc_due
+    if not booking_dt or not due_dt:
+        return False
+    return booking_dt <= datetime.combine(due_dt, datetime.min.time())
+
+@rule("CDD-006", "cdd", FLAG, guard=("customer_is_pep", None),
+      fields=("customer_is_pep", "edd_required", "edd_performed"))
+def cdd_006(d): 
+    return not (d.get("customer_is_pep") and (not d.get("edd_required") or not d.get("edd_performed")))
+
+@rule("CDD-007", "cdd", PARSE, guard=("customer_risk_rating", {"High"}),
+      fields=("customer_risk_rating", "kyc_last_completed", "kyc_due_date"))
+def cdd_007(d):
+    if d.get("customer_risk_rating") == "High":
+        last_completed = d.kyc_last_completed
+        due_date = d.kyc_due
+        if not last_completed or not due_date:
+            return False
+        return last_completed <= due_date
+    return True
+
+@rule("CDD-008", "cdd", FLAG, fields=("sow_documented", "customer_is_pep", "customer_type"))
+def cdd_008(d): 
+    return not ((not d.get("sow_documented")) and (d.get("customer_is_pep") or d.get("customer_type") in {"domiciliary_company", "trust"}))
+
+# -------------------------------
+# C. STR / Suspicion handling
+# -------------------------------
+@rule("STR-009", "str", PARSE, guard=("suspicion_determined_datetime", None),
+      fields=("suspicion_determined_datetime", "str_filed_datetime"))
+def str_009(d):
+    fmt = "%Y-%m-%dT%H:%M:%S"
+    s_dt, f_dt = d.get("suspicion_determined_datetime"), d.get("str_filed_datetime")
+    if s_dt and f_dt and s_dt.strip() and f_dt.strip():
+        try:
+            delta = datetime.strptime(f_dt, fmt) - datetime.strptime(s_dt, fmt)
+            return delta.total_seconds() <= 172800
+        except ValueError:
+            return False
+    return True
+
+@rule("STR-010", "str", FLAG, guard=("sanctions_screening", {"potential"}),
+      fields=("sanctions_screening", "transaction_executed"))
+def str_010(d): 
+    return not (d.get("sanctions_screening") == "potential" and d.get("transaction_executed", True))
+
+# -------------------------------
+# D. Sanctions & geography
+# -------------------------------
+@rule("SAN-011", "sanctions", TEXT,
+      fields=("originator_country", "beneficiary_country", "ordering_institution_bic", "beneficiary_institution_bic"))
+def san_011(d):
+    # sanctioned jurisdiction or institution on either side (screening.py)
+    index = SCREENING.index
+    return not (
+        index.sanctioned_country(d.originator_country) or index.sanctioned_country(d.beneficiary_country)
+        or index.sanctioned_bic(d.get("ordering_institution_bic")) or index.sanctioned_bic(d.get("beneficiary_institution_bic"))
+    )
+
+@rule("SAN-012", "sanctions", FLAG, guard=("high_risk_corridor", None),
+      fields=("high_risk_corridor", "swift_f70_purpose"))
+def san_012(d): 
+    return not (d.get("high_risk_corridor") and not d.get("swift_f70_purpose"))
+
+@rule("SAN-041", "sanctions", TEXT, fields=("originator_name", "beneficiary_name"))
+def san_041(d):
+    # fuzzy match of either party against the sanctioned names list
+    index = SCREENING.index
+    return not (index.sanctioned_name(d.get("originator_name")) or index.sanctioned_name(d.get("beneficiary_name")))
+
+# -------------------------------
+# E. Cash structuring & ID
+# -------------------------------
+@rule("CASH-013", "cash", FLAG, guard=("product_type", {"cash_deposit", "cash_withdrawal"}),
+      fields=("product_type", "cash_id_verified"))
+def cash_013(d): 
+    return not (d.get("product_type") in {"cash_deposit", "cash_withdrawal"} and not d.get("cash_id_verified"))
+
+@rule("CASH-014", "cash", PARSE, fields=("daily_cash_total_customer", "daily_cash_txn_count"))
+def cash_014(d): 
+    return not (_to_float(d.get("daily_cash_total_customer")) > 20000 or _to_int(d.get("daily_cash_txn_count")) >= 5)
+
+# -------------------------------
+# F. Purpose & narrative quality
+# -------------------------------
+@rule("PUR-016", "purpose", TEXT, guard=("purpose_code", None), fields=("purpose_code", "narrative"))
+def pur_016(d): 
+    return not ("EDU" in d.get("purpose_code", "") and "copper" in d.narrative_lower)
+
+# -------------------------------
+# G. FX reasonableness & fair dealing
+# -------------------------------
+@rule("FX-017", "fx", PARSE, guard=("fx_indicator", None), fields=("fx_indicator", "fx_spread_bps"))
+def fx_017(d): 
+    return not (d.get("fx_indicator") and abs(_to_int(d.get("fx_spread_bps"))) > 150)
+
+@rule("FX-018", "fx", FLAG, guard=("is_advised", None),
+      fields=("is_advised", "product_complex", "suitability_assessed"))
+def fx_018(d): 
+    return not (d.get("is_advised") and d.get("product_complex", False) and not d.get("suitability_assessed"))
+
+# -------------------------------
+# H. Suitability / appropriateness
+# -------------------------------
+@rule("SUIT-019", "suitability", FLAG, guard=("is_advised", None), fields=("is_advised", "suitability_assessed"))
+def suit_019(d): 
+    return not (d.get("is_advised") and not d.get("suitability_assessed"))
+
+@rule("SUIT-020", "suitability", FLAG, guard=("suitability_assessedsuitability-checks", None),
+      fields=("suitability_assessedsuitability-checks", "suitability_result", "transaction_proceeds"))
+def suit_020(d): 
+    return not (d.get("suitability_assessedsuitability-checks") and d.get("suitability_result") == "mismatch" and d.get("transaction_proceeds", True))
+
+@rule("SUIT-021", "suitability", FLAG, guard=("product_complex", None),
+      fields=("product_complex", "client_risk_profile", "risk_acknowledgement"))
+def suit_021(d): 
+    return not (d.get("product_complex") and d.get("client_risk_profile") == "Low" and not d.get("risk_acknowledgement", False))
+
+@rule("SUIT-022", "suitability", FLAG, guard=("product_has_va_exposure", None),
+      fields=("product_has_va_exposure", "va_disclosure_provided"))
+def suit_022(d): 
+    return not (d.get("product_has_va_exposure") and not d.get("va_disclosure_provided"))
+
+# -------------------------------
+# I. Virtual assets
+# -------------------------------
+@rule("VA-024", "virtual", TEXT, guard=("product_has_va_exposure", None),
+      fields=("product_has_va_exposure", "counterparty"))
+def va_024(d):
+    return not (d.get("product_has_va_exposure") and SCREENING.index.unlicensed_vasp(d.get("counterparty")))
+
+@rule("VA-025", "virtual", FLAG, guard=("product_has_va_exposure", None),
+      fields=("product_has_va_exposure", "originator_name", "beneficiary_name", "beneficiary_account"))
+def va_025(d): 
+    return not (d.get("product_has_va_exposure") and any(not d.get(f) for f in ["originator_name", "beneficiary_name", "beneficiary_account"]))
+
+# -------------------------------
+# J. Channel & field consistency
+# -------------------------------
+@rule("CON-026", "channel", FLAG, guard=("channel", {"SWIFT"}),
+      fields=("channel", "ordering_institution_bic", "beneficiary_institution_bic"))
+def con_026(d): 
+    return not (d.channel == "SWIFT" and (not d.get("ordering_institution_bic") or not d.get("beneficiary_institution_bic")))
+
+@rule("CON-027", "channel", PARSE, guard=("channel", {"RTGS"}), fields=("channel", "value_date", "booking_datetime"))
+def con_027(d):
+    if d.channel == "RTGS":
+        vdate = d.value_date
+        bdate = d.booking_dt
+        if not vdate or not bdate:
+            return False
+        return vdate <= bdate.date()
+    return True
+
+@rule("CON-028", "channel", FLAG, guard=("channel", {"FAST", "FPS"}),
+      fields=("channel", "originator_country", "beneficiary_country"))
+def con_028(d): 
+    return not (d.channel in {"FAST", "FPS"} and d.originator_country != d.beneficiary_country)
+
+# -------------------------------
+# K. Counterparty & correspondent banking
+# -------------------------------
+@rule("COR-029", "counterparty", FLAG, fields=("respondent_shell_bank", "respondent_bic", "ordering_institution_bic"))
+def cor_029(d):
+    # upstream flag, or the respondent / ordering institution is a listed shell bank
+    index = SCREENING.index
+    return not (
+        d.get("respondent_shell_bank", False)
+        or index.shell_bank(d.get("respondent_bic")) or index.shell_bank(d.get("ordering_institution_bic"))
+    )
+
+@rule("COR-030", "counterparty", FLAG, guard=("payable_through", None),
+      fields=("payable_through", "respondent_cdd_done"))
+def cor_030(d): 
+    return not (d.get("payable_through") and not d.get("respondent_cdd_done"))
+
+# -------------------------------
+# L. Record-keeping & reconstruction
+# -------------------------------
+@rule("REC-031", "record", FLAG, fields=("value_date", "amount", "beneficiary_name"))
+def rec_031(d): 
+    return all(d.get(f) for f in ["value_date", "amount", "beneficiary_name"])
+
+@rule("REC-032", "record", PARSE, guard=("is_str_related", None), fields=("is_str_related", "retention_years"))
+def rec_032(d): 
+    return not (d.get("is_str_related") and _to_int(d.get("retention_years")) < 5)
+
+# -------------------------------
+# N. Behavioural / patterning
+# -------------------------------
+# These read the customer_* aggregates that worker.py adds to `data` from
+# its rolling per-customer store (aggregates.py).
+@rule("PAT-035", "behavioral", FLAG, guard=("customer_7d_redemptions", None),
+      fields=("customer_7d_subscriptions", "customer_7d_redemptions", "channel"))
+def pat_035(d):
+    # subscription and redemption within 7 days, now leaving by external wire
+    return not (d.get("customer_7d_subscriptions") and d.get("customer_7d_redemptions") and d.channel in {"SWIFT", "RTGS"})
+
+@rule("PAT-037", "behavioral", PARSE, guard=("customer_days_since_last_txn", None),
+      fields=("customer_days_since_last_txn", "channel", "amount", "swift_f70_purpose"))
+def pat_037(d):
+    # dormant customer, sudden high-value SWIFT wire with no stated purpose
+    return not (
+        d.channel == "SWIFT" and
+        _to_float(d.get("customer_days_since_last_txn")) >= 180 and
+        d.amount >= 50000 and
+        not d.get("swift_f70_purpose")
+    )
+
+# -------------------------------
+# O. Data quality
+# -------------------------------
+@rule("DQ-038", "dataquality", TEXT, fields=("beneficiary_account",))
+def dq_038(d):
+    acct = d.beneficiary_account_stripped
+    # must not be empty, alphanumeric, and between 15–34 chars
+    return bool(acct) and acct.isalnum() and 15 <= len(acct) <= 34
+
+
+@rule("DQ-039", "dataquality", TEXT, fields=("beneficiary_name", "beneficiary_account"))
+def dq_039(d):
+    name = d.beneficiary_name_lower
+    acct = d.beneficiary_account_lower
+
+    # guard for empty values
+    if not name or not acct:
+        return False
+
+    # determine company / personal type by legal-form words and character composition
+    company = is_company(name)
+    personal = name.replace(" ", "").isalpha() and not company
+
+    acct_personal_like = acct.startswith(("retail", "pers"))
+    acct_business_like = acct.startswith(("biz", "corp"))
+
+    # fail if company name uses personal-like account or vice versa
+    return not ((company and acct_personal_like) or (personal and acct_business_like))
+
+
+@rule("DQ-040", "dataquality", TEXT, guard=("narrative", None),
+      fields=("originator_name", "beneficiary_name", "originator_country", "beneficiary_country", "narrative"))
+def dq_040(d):
+    originator_country = d.originator_country_stripped
+    beneficiary_country = d.beneficiary_country_stripped
+    narrative = d.narrative_lower
+
+    cross_border = bool(originator_country and beneficiary_country and originator_country != beneficiary_country)
+    third_party = any(k in narrative for k in ["third", "on behalf", "obo"])
+    if not (cross_border and third_party):
+        return True
+
+    # suspicious if the same party (allowing for spelling, word order and
+    # legal form) is on both sides, cross-border, and mentions third-party
+    return not similar(d.originator_name_stripped, d.beneficiary_name_stripped)
+
+# -------------------------------
+# Categories & evaluation plan
+# -------------------------------
+# output variable -> {rule ID: rule}, matching the per-category @router.task handlers
+CATEGORIES = {}
+for _rule in RULES.values():
+    CATEGORIES.setdefault(_rule.category, {})[_rule.id] = _rule.fn
+
+# every `data` field read by at least one rule
+FIELDS = tuple(sorted({field for _rule in RULES.values() for field in _rule.fields}))
+
+# scalar value -> digest; most fields take few distinct values (countries,
+# flags, channels), so most lookups hit
+_FINGERPRINTS = {}
+
+def fingerprint(value) -> str:
+    """Stable digest of one field value, equal across processes. Short
+    scalars are their own digest ("bool:True", "str:'SG'"); anything
+    longer is a 16-hex-digit BLAKE2b hash."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        key = (value.__class__, value)
+        digest = _FINGERPRINTS.get(key)
+        if digest is None:
+            body = f"{value.__class__.__name__}:{value!r}"
+            digest = body if len(body) <= 24 else blake2b(body.encode("utf-8"), digest_size=8).hexdigest()
+            if len(_FINGERPRINTS) >= 65536:
+                _FINGERPRINTS.clear()
+            _FINGERPRINTS[key] = digest
+        return digest
+    body = json.dumps(value, sort_keys=True, default=str)
+    return blake2b(body.encode("utf-8"), digest_size=8).hexdigest()
+
+def _code_digest(rule_ids) -> str:
+    """Digest of the rules' code and the matching threshold, so results
+    from a different rule version are never reused."""
+    h = blake2b(f"{NAME_MATCH_THRESHOLD}".encode(), digest_size=8)
+    for rule_id in rule_ids:
+        code = RULES[rule_id].fn.__code__
+        h.update(rule_id.encode())
+        h.update(code.co_code)
+        h.update(repr((code.co_consts, code.co_names)).encode())
+    return h.hexdigest()
+
+class Plan:
+    """Compiled evaluation plan over a set of registered rules.
+
+    `evaluate` returns the same output variables as the per-category
+    handlers, keeping registry order within each category. Rules whose
+    guard does not hold are recorded as passing without being called.
+    With `record` set, `evaluate` also times every rule and reports it as
+    record(rule_id, seconds, "pass" | "fail" | "skipped"). `status` orders each category cheapest-first and stops as soon as the
+    overall status is decided. `describe` exposes the plan for inspection.
+
+    `evaluate_incremental` takes the category variables of an earlier run
+    and reuses each rule's result when none of its input fields changed
+    (see there).
+    """
+
+    def __init__(self, rule_ids=None):
+        self.categories = {}
+        for rule_id in rule_ids or RULES:
+            r = RULES[rule_id]
+            field, values = r.guard or (None, None)
+            if values is not None:
+                # a tuple compares with ==, like the rules themselves; a set
+                # would raise TypeError on an unhashable value such as a list
+                values = tuple(values)
+            self.categories.setdefault(r.category, []).append((r.id, r.fn, field, values, r.cost))
+        self.cheapest_first = {
+            name: sorted(steps, key=lambda step: (step[4], step[2] is None))
+            for name, steps in self.categories.items()
+        }
+        self.fields = {
+            name: tuple(sorted({f for step in steps for f in RULES[step[0]].fields}))
+            for name, steps in self.categories.items()
+        }
+        self.code = {name: _code_digest([step[0] for step in steps]) for name, steps in self.categories.items()}
+        # categories with a rule reading the screening lists also depend on their version
+        self.screened = {
+            name: any("SCREENING" in RULES[step[0]].fn.__code__.co_names for step in steps)
+            for name, steps in self.categories.items()
+        }
+
+    def evaluate(self, data, categories=None, record=None) -> dict:
+        if record is not None:
+            return self._evaluate_recorded(data, categories, record)
+        d = data if isinstance(data, Txn) else Txn(data)
+        get = d.get
+        out = {}
+        for name in categories or self.categories:
+            tests = {}
+            for rule_id, fn, field, values, _ in self.categories[name]:
+                if field is not None and not (get(field) in values if values is not None else get(field)):
+                    tests[rule_id] = True
+                else:
+                    tests[rule_id] = fn(d)
+            out[name] = {"overall_status": _status(tests), "tests": tests}
+        return out
+
+    def _evaluate_recorded(self, data, categories, record) -> dict:
+        d = data if isinstance(data, Txn) else Txn(data)
+        get = d.get
+        clock = perf_counter
+        out = {}
+        for name in categories or self.categories:
+            tests = {}
+            for rule_id, fn, field, values, _ in self.categories[name]:
+                start = clock()
+                if field is not None and not (get(field) in values if values is not None else get(field)):
+                    tests[rule_id] = True
+                    record(rule_id, clock() - start, "skipped")
+                else:
+                    ok = tests[rule_id] = fn(d)
+                    record(rule_id, clock() - start, "pass" if ok else "fail")
+            out[name] = {"overall_status": _status(tests), "tests": tests}
+        return out
+
+    def evaluate_incremental(self, data, previous, categories=None, stats=None) -> dict:
+        """Like `evaluate`, reusing results from `previous`, the variables of
+        an earlier run.
+
+        Each category's output also carries `fingerprint`: a digest of its
+        rules' code (and of the screening lists' content, where read) under "rules"
+        and a digest per input field under "fields". A rule's earlier
+        result is reused when the "rules" digest matches and none of the
+        rule's own fields changed. `changed` lists the rules whose result
+        differs from the earlier run. With `stats` given, the numbers of
+        reused and evaluated rules are added to its "reused" and
+        "evaluated" keys.
+        """
+        d = data if isinstance(data, Txn) else Txn(data)
+        get = d.get
+        names = list(categories or self.categories)
+        raw = d.data.get
+        needed = self.fields[names[0]] if len(names) == 1 else {f for name in names for f in self.fields[name]}
+        cached = _FINGERPRINTS.get
+        digests = {}
+        for f in needed:
+            value = raw(f)
+            try:
+                digests[f] = cached((value.__class__, value)) or fingerprint(value)
+            except TypeError:  # unhashable
+                digests[f] = fingerprint(value)
+        lists = None
+        out = {}
+        reused = evaluated = 0
+        for name in names:
+            code = self.code[name]
+            if self.screened[name]:
+                if lists is None:
+                    lists = SCREENING.index.digest
+                code = f"{code}:{lists}"
+            fields = {f: digests[f] for f in self.fields[name]}
+            steps = self.categories[name]
+
+            prior = previous.get(name) if previous else None
+            prior_tests = (prior.get("tests") or {}) if isinstance(prior, dict) else {}
+            old = prior.get("fingerprint") if isinstance(prior, dict) else None
+            old_fields = old.get("fields") if isinstance(old, dict) and old.get("rules") == code else None
+
+            if old_fields == fields and len(prior_tests) == len(steps) and all(step[0] in prior_tests for step in steps):
+                # nothing this category reads changed
+                tests = {step[0]: prior_tests[step[0]] for step in steps}
+                reused += len(steps)
+            else:
+                changed = {f for f, digest in fields.items() if old_fields.get(f) != digest} if old_fields else None
+                tests = {}
+                for rule_id, fn, field, values, _ in steps:
+                    if changed is not None and rule_id in prior_tests and changed.isdisjoint(RULES[rule_id].fields):
+                        tests[rule_id] = prior_tests[rule_id]
+                        reused += 1
+                        continue
+                    evaluated += 1
+                    if field is not None and not (get(field) in values if values is not None else get(field)):
+                        tests[rule_id] = True
+                    else:
+                        tests[rule_id] = fn(d)
+            entry = {"overall_status": _status(tests), "tests": tests, "fingerprint": {"rules": code, "fields": fields}}
+            if prior_tests:
+                entry["changed"] = [rule_id for rule_id, ok in tests.items() if rule_id in prior_tests and prior_tests[rule_id] != ok]
+            out[name] = entry
+        if stats is not None:
+            stats["reused"] = stats.get("reused", 0) + reused
+            stats["evaluated"] = stats.get("evaluated", 0) + evaluated
+        return out
+
+    def status(self, data, category) -> str:
+        d = data if isinstance(data, Txn) else Txn(data)
+        get = d.get
+        seen_pass = seen_fail = False
+        for _, fn, field, values, _ in self.cheapest_first[category]:
+            if field is not None and not (get(field) in values if values is not None else get(field)):
+                ok = True
+            else:
+                ok = fn(d)
+            if ok:
+                seen_pass = True
+            else:
+                seen_fail = True
+            if seen_pass and seen_fail:
+                return "needs_advice"
+        return "pass" if not seen_fail else "fail"
+
+    def describe(self) -> list:
+        return [
+            {
+                "id": rule_id,
+                "category": name,
+                "cost": COST_NAMES[cost],
+                "fields": list(RULES[rule_id].fields),
+                "guard": None if field is None else {"field": field, "values": None if values is None else sorted(values, key=repr)},
+            }
+            for name, steps in self.cheapest_first.items()
+            for rule_id, _, field, values, cost in steps
+        ]
+
+# Default plan over every registered rule
+PLAN = Plan()
+
+def evaluate_all(d) -> dict:
+    """Run every category against one `data` dict, returning the same output
+    variables the per-category handlers would."""
+    return PLAN.evaluate(d)
@@ -0,0 +1,300 @@
+"""Offline bulk screening of transaction files against the deterministic rules.
+
+    python screen.py transactions.csv --output results/ --format parquet
+
+Input is CSV, JSONL or Parquet with one transaction per row, using the
+same field names as the `data` process variable. It is read in chunks of
+`--chunk-size` rows, and each chunk is evaluated with batch.evaluate_batch
+in a process pool. At most two chunks per worker are in flight, so memory
+stays flat whatever the input size.
+
+Results go to a directory with one part file per chunk
+(`part-000000.parquet` / `.jsonl`). Each row holds `row` (its position
+in the input), `transaction_id` when the input has one, one boolean
+column per rule and one `<category>_status` column per category. Part
+files are written atomically, so `--resume` skips chunks whose part
+already exists and reads their fail counts back from it.
+`_manifest.json` is written when the run completes.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from batch import evaluate_batch
+from rules import CATEGORIES, FIELDS, RULES
+from screening import SCREENING
+
+# Typed fields when reading CSV, so a row reads as the same values it
+# would have in JSON (booleans and numbers); every other cell stays a string
+BOOLEAN_FIELDS = {
+    "swift_f50_present", "swift_f59_present", "travel_rule_complete", "transaction_executed",
+    "customer_is_pep", "edd_required", "edd_performed", "sow_documented", "high_risk_corridor",
+    "cash_id_verified", "fx_indicator", "is_advised", "product_complex", "suitability_assessed",
+    "suitability_assessedsuitability-checks", "transaction_proceeds", "risk_acknowledgement",
+    "product_has_va_exposure", "va_disclosure_provided", "respondent_shell_bank", "payable_through",
+    "respondent_cdd_done", "is_str_related",
+}
+BOOLEANS = {
+    "true": True, "t": True, "yes": True, "y": True, "1": True,
+    "false": False, "f": False, "no": False, "n": False, "0": False,
+}
+NUMERIC_FIELDS = {
+    "amount", "daily_cash_total_customer", "daily_cash_txn_count", "fx_spread_bps", "retention_years",
+    "customer_24h_txn_count", "customer_24h_total", "customer_7d_txn_count", "customer_7d_total",
+    "customer_7d_counterparties", "customer_7d_subscriptions", "customer_7d_redemptions",
+    "customer_days_since_last_txn",
+}
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet", ".pq": "parquet"}
+
+# -------------------------------
+# Readers: yield (chunk, bytes or rows consumed so far)
+# -------------------------------
+def _csv_value(field, value):
+    if value == "":
+        return None
+    if field in BOOLEAN_FIELDS:
+        return BOOLEANS.get(value.strip().lower(), value)
+    if field in NUMERIC_FIELDS:
+        # as json.loads would: integers stay int
+        text = value.strip()
+        try:
+            return int(text)
+        except ValueError:
+            pass
+        try:
+            return float(text)
+        except ValueError:
+            return value
+    return value
+
+def _counting_lines(f, position):
+    for line in f:
+        position[0] += len(line)
+        yield line.decode("utf-8")
+
+def read_csv(path, chunk_size):
+    position = [0]
+    with open(path, "rb") as f:
+        reader = csv.DictReader(_counting_lines(f, position))
+        chunk = []
+        for record in reader:
+            chunk.append({k: _csv_value(k, v) for k, v in record.items() if k})
+            if len(chunk) == chunk_size:
+                yield chunk, position[0]
+                chunk = []
+        if chunk:
+            yield chunk, position[0]
+
+def read_jsonl(path, chunk_size):
+    position = 0
+    with open(path, "rb") as f:
+        chunk = []
+        for line in f:
+            position += len(line)
+            if line.strip():
+                chunk.append(json.loads(line))
+            if len(chunk) == chunk_size:
+                yield chunk, position
+                chunk = []
+        if chunk:
+            yield chunk, position
+
+def read_parquet(path, chunk_size):
+    import pyarrow.parquet as pq
+    done = 0
+    for record_batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        done += record_batch.num_rows
+        yield record_batch, done
+
+def _input_size(path, fmt):
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    return os.path.getsize(path)
+
+# -------------------------------
+# Chunk evaluation (runs in the pool)
+# -------------------------------
+def _columns(chunk):
+    """A list of `data` dicts as the column mapping evaluate_batch takes."""
+    if not isinstance(chunk, list):
+        return chunk
+    names = {"transaction_id", *FIELDS}
+    return {name: [d.get(name) for d in chunk] for name in names if any(name in d for d in chunk)}
+
+def _part_path(out_dir, index, fmt):
+    return os.path.join(out_dir, f"part-{index:06d}.{fmt}")
+
+def screen_chunk(index, chunk, first_row, out_dir, fmt) -> dict:
+    """Evaluate one chunk and write its part file; returns per-rule fail counts."""
+    batch = _columns(chunk)
+    evaluated = evaluate_batch(batch)
+    results = evaluated["results"]
+    n = len(results)
+
+    columns = {"row": list(range(first_row, first_row + n))}
+    if hasattr(batch, "column_names"):
+        if "transaction_id" in batch.column_names:
+            columns["transaction_id"] = batch.column("transaction_id").to_pylist()
+    elif "transaction_id" in batch:
+        columns["transaction_id"] = list(batch["transaction_id"])
+    for j, rule_id in enumerate(evaluated["rule_ids"]):
+        columns[rule_id] = results[:, j].tolist()
+    for name, statuses in evaluated["overall_status"].items():
+        columns[f"{name}_status"] = statuses.tolist()
+
+    path = _part_path(out_dir, index, fmt)
+    tmp = f"{path}.tmp"
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.table(columns), tmp)
+    else:
+        names = list(columns)
+        with io.open(tmp, "w", encoding="utf-8") as f:
+            for row in zip(*(columns[name] for name in names)):
+                f.write(json.dumps(dict(zip(names, row)), ensure_ascii=False))
+                f.write("\n")
+    os.replace(tmp, path)
+    return {
+        "index": index,
+        "rows": n,
+        "failures": {rule_id: int(n - results[:, j].sum()) for j, rule_id in enumerate(evaluated["rule_ids"])},
+    }
+
+def count_part(index, out_dir, fmt) -> dict:
+    """Per-rule fail counts of a part file written by an earlier run, so a
+    resumed run's manifest covers the chunks it skipped."""
+    path = _part_path(out_dir, index, fmt)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        columns = pq.read_table(path, columns=list(RULES)).to_pydict()
+    else:
+        columns = {rule_id: [] for rule_id in RULES}
+        with io.open(path, encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                for rule_id, results in columns.items():
+                    results.append(row[rule_id])
+    n = len(columns[next(iter(RULES))])
+    return {
+        "index": index,
+        "rows": n,
+        "failures": {rule_id: n - sum(results) for rule_id, results in columns.items()},
+        "resumed": True,
+    }
+
+# -------------------------------
+# Driver
+# -------------------------------
+def screen(path, out_dir, fmt="jsonl", input_format=None, chunk_size=10000, workers=None, resume=False, progress=True) -> dict:
+    """Screen `path` into part files under `out_dir`; returns the run manifest."""
+    input_format = input_format or FORMATS.get(os.path.splitext(path)[1].lower())
+    if input_format not in ("csv", "jsonl", "parquet"):
+        raise ValueError(f"cannot tell the format of {path}; pass --input-format")
+    reader = {"csv": read_csv, "jsonl": read_jsonl, "parquet": read_parquet}[input_format]
+    os.makedirs(out_dir, exist_ok=True)
+
+    settings = {
+        "input": os.path.abspath(path), "input_format": input_format, "format": fmt, "chunk_size": chunk_size,
+        # results depend on the screening lists (SCREENING_INDEX_PATH)
+        "screening_index": SCREENING.index.digest,
+    }
+    settings_path = os.path.join(out_dir, "_settings.json")
+    if resume and os.path.exists(settings_path):
+        with open(settings_path) as f:
+            previous = json.load(f)
+        if previous != settings:
+            raise ValueError(f"cannot resume: {out_dir} was written with {previous}")
+    elif not resume and any(name.startswith("part-") for name in os.listdir(out_dir)):
+        raise ValueError(f"{out_dir} already holds results; pass --resume to continue them")
+    with open(settings_path, "w") as f:
+        json.dump(settings, f, indent=2)
+
+    total = _input_size(path, input_format)
+    workers = workers or os.cpu_count() or 1
+    rows = skipped = 0
+    failures = {rule_id: 0 for rule_id in RULES}
+    start = last_report = time.monotonic()
+
+    def collect(future):
+        nonlocal rows, skipped
+        result = future.result()
+        if result.get("resumed"):
+            skipped += result["rows"]
+        else:
+            rows += result["rows"]
+        for rule_id, n in result["failures"].items():
+            failures[rule_id] += n
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        first_row = 0
+        for index, (chunk, consumed) in enumerate(reader(path, chunk_size)):
+            n = chunk.num_rows if hasattr(chunk, "num_rows") else len(chunk)
+            # keep at most two chunks per worker in flight
+            while len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+            if resume and os.path.exists(_part_path(out_dir, index, fmt)):
+                pending.add(pool.submit(count_part, index, out_dir, fmt))
+            else:
+                pending.add(pool.submit(screen_chunk, index, chunk, first_row, out_dir, fmt))
+            first_row += n
+            del chunk
+
+            now = time.monotonic()
+            if progress and now - last_report >= 1.0:
+                last_report = now
+                rate = rows / (now - start) if now > start else 0.0
+                print(f"\r{100 * consumed / total if total else 100:5.1f}%  {rows + skipped} rows"
+                      f"  ({skipped} resumed)  {rate:,.0f} rows/s", end="", file=sys.stderr, flush=True)
+        for future in pending:
+            collect(future)
+
+    elapsed = time.monotonic() - start
+    manifest = dict(
+        settings,
+        rows=rows + skipped,
+        screened=rows,
+        resumed=skipped,
+        seconds=round(elapsed, 2),
+        failures=failures,
+        categories={name: list(ids) for name, ids in CATEGORIES.items()},
+    )
+    with open(os.path.join(out_dir, "_manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    if progress:
+        print(f"\r100.0%  {rows + skipped} rows  ({skipped} resumed)  in {elapsed:.1f}s", file=sys.stderr)
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen a transaction file against the deterministic rules.")
+    parser.add_argument("input", help="CSV, JSONL or Parquet file of transactions")
+    parser.add_argument("--output", "-o", required=True, help="directory for the result part files")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl", help="result file format")
+    parser.add_argument("--input-format", choices=("csv", "jsonl", "parquet"), help="default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="rows per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--resume", action="store_true", help="skip chunks already written to --output")
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+    args = parser.parse_args(argv)
+
+    try:
+        manifest = screen(
+            args.input, args.output, fmt=args.format, input_format=args.input_format,
+            chunk_size=args.chunk_size, workers=args.workers, resume=args.resume, progress=not args.quiet,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    flagged = {rule_id: n for rule_id, n in manifest["failures"].items() if n}
+    print(json.dumps({"rows": manifest["rows"], "failures": flagged}, indent=2))
+
+if __name__ == "__main__":
+    main()
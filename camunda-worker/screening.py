@@ -0,0 +1,221 @@
+import json
+import logging
+from hashlib import blake2b
+import os
+import threading
+
+from metrics import METRICS
+from names import NAME_MATCH_THRESHOLD, NameIndex
+
+log = logging.getLogger("screening")
+
+# Screening lists behind the sanctions, virtual-asset and correspondent
+# banking rules, loaded from a local JSON file:
+#
+#   {
+#     "version": "2025-06-01",
+#     "jurisdictions": ["IR", "KP", ...],        ISO country codes
+#     "bic_prefixes": ["BKID", "BKIDIR", ...],   sanctioned institutions, as BIC prefixes
+#     "vasps": ["Example Exchange", ...],        unlicensed VASP names
+#     "shell_banks": ["SHLLKYKY", ...],          shell-bank BICs (8 or 11 characters)
+#     "names": ["Example Trading LLC", ...]      sanctioned parties and their aliases
+#   }
+#
+# Every list is optional. The index is built once per load into sets, a
+# prefix trie and a fuzzy name index (names.py), so each code lookup is a
+# hash probe or a walk of at most 11 characters. SCREENING_INDEX_PATH
+# names the file; it is loaded on import and, once `watch` is running,
+# reloaded whenever the file changes. Replace the file atomically (write a
+# temporary file, then rename it over).
+SCREENING_INDEX_PATH = os.getenv("SCREENING_INDEX_PATH") or None
+SCREENING_RELOAD_SECONDS = float(os.getenv("SCREENING_RELOAD_SECONDS", "30"))
+
+# Used when no file is configured: the lists the rules hard-coded before
+DEFAULT_LISTS = {"version": "builtin", "jurisdictions": ["IR", "KP"], "vasps": ["unlicensed_vasp"]}
+
+def normalise_name(name) -> str:
+    return " ".join(str(name or "").lower().split())
+
+def normalise_code(code) -> str:
+    return str(code or "").strip().upper().replace(" ", "")
+
+# -------------------------------
+# Prefix trie
+# -------------------------------
+_END = ""  # marks a complete prefix; never a real character key
+
+class PrefixTrie:
+    """Set of prefixes; `match` tells whether any of them starts a string."""
+
+    __slots__ = ("root", "size", "longest")
+
+    def __init__(self, prefixes=()):
+        self.root = {}
+        self.size = 0
+        self.longest = 0
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def add(self, prefix: str):
+        if not prefix:
+            return
+        node = self.root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        if _END not in node:
+            node[_END] = True
+            self.size += 1
+            self.longest = max(self.longest, len(prefix))
+
+    def match(self, s: str) -> str | None:
+        """The shortest prefix of `s` in the trie, or None."""
+        node = self.root
+        for i, ch in enumerate(s[:self.longest]):
+            node = node.get(ch)
+            if node is None:
+                return None
+            if _END in node:
+                return s[:i + 1]
+        return None
+
+    def __len__(self):
+        return self.size
+
+# -------------------------------
+# Index
+# -------------------------------
+class ScreeningIndex:
+    """Immutable lookup structures built from one version of the lists."""
+
+    __slots__ = ("version", "digest", "jurisdictions", "bic_prefixes", "vasps", "shell_banks", "names")
+
+    def __init__(self, version=None, jurisdictions=(), bic_prefixes=(), vasps=(), shell_banks=(), names=()):
+        self.version = version
+        self.jurisdictions = frozenset(filter(None, map(normalise_code, jurisdictions)))
+        prefixes = sorted(set(filter(None, map(normalise_code, bic_prefixes))))
+        self.bic_prefixes = PrefixTrie(prefixes)
+        self.vasps = frozenset(filter(None, map(normalise_name, vasps)))
+        self.shell_banks = frozenset(filter(None, map(normalise_code, shell_banks)))
+        self.names = NameIndex(names)
+        # content digest of the lists as loaded; `version` is optional and
+        # self-declared, so results depending on the lists key on this
+        body = json.dumps([
+            sorted(self.jurisdictions), prefixes, sorted(self.vasps), sorted(self.shell_banks), sorted(self.names.keys),
+        ], separators=(",", ":"), ensure_ascii=False)
+        self.digest = blake2b(body.encode("utf-8"), digest_size=8).hexdigest()
+
+    @classmethod
+    def from_dict(cls, lists: dict) -> "ScreeningIndex":
+        unknown = set(lists) - {"version", "jurisdictions", "bic_prefixes", "vasps", "shell_banks", "names"}
+        if unknown:
+            raise ValueError(f"unknown screening lists: {', '.join(sorted(unknown))}")
+        return cls(**lists)
+
+    @classmethod
+    def load(cls, path) -> "ScreeningIndex":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def sanctioned_country(self, code) -> bool:
+        return normalise_code(code) in self.jurisdictions
+
+    def sanctioned_bic(self, bic) -> bool:
+        return bool(bic) and self.bic_prefixes.match(normalise_code(bic)) is not None
+
+    def unlicensed_vasp(self, name) -> bool:
+        return bool(name) and normalise_name(name) in self.vasps
+
+    def shell_bank(self, bic) -> bool:
+        """True when `bic`, or the 8-character institution code it starts
+        with, is a listed shell bank."""
+        if not bic:
+            return False
+        bic = normalise_code(bic)
+        return bic in self.shell_banks or bic[:8] in self.shell_banks
+
+    def sanctioned_name(self, name, threshold=NAME_MATCH_THRESHOLD):
+        """The best (score, listed name) match for `name`, or None."""
+        if not name or not len(self.names):
+            return None
+        return self.names.best(name, threshold)
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "digest": self.digest,
+            "jurisdictions": len(self.jurisdictions),
+            "bic_prefixes": len(self.bic_prefixes),
+            "vasps": len(self.vasps),
+            "shell_banks": len(self.shell_banks),
+            "names": len(self.names),
+        }
+
+
+class Screening:
+    """Holds the current ScreeningIndex and swaps in a new one when its
+    file changes.
+
+    Rules read `index` once per evaluation and never see a half-built
+    index: a reload builds the new index completely, then replaces the
+    reference. A file that fails to load is logged and the previous index
+    stays in use.
+    """
+
+    def __init__(self, path=None, interval=SCREENING_RELOAD_SECONDS):
+        self.path = path
+        self.interval = interval
+        self.index = ScreeningIndex.from_dict(DEFAULT_LISTS)
+        self._stamp = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if path:
+            self.reload()
+
+    def reload(self) -> bool:
+        """Load the file if it changed since the last load; True if it did."""
+        with self._lock:
+            stamp = None
+            try:
+                st = os.stat(self.path)
+                stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+                if stamp == self._stamp:
+                    return False
+                index = ScreeningIndex.load(self.path)
+            except (OSError, ValueError, TypeError) as e:
+                # a broken file is reported once, not on every check
+                self._stamp = stamp
+                METRICS.inc("screening_index_reload_errors_total")
+                log.error("Could not load screening index; keeping the current one",
+                          extra={"path": self.path, "error": str(e), "version": self.index.version})
+                return False
+            self.index = index
+            self._stamp = stamp
+        METRICS.inc("screening_index_reloads_total")
+        for name, n in index.stats().items():
+            if name not in ("version", "digest"):
+                METRICS.set("screening_index_entries", n, list=name)
+        log.info("Loaded screening index", extra={"path": self.path, **index.stats()})
+        return True
+
+    def watch(self):
+        """Check the file for changes every `interval` seconds from a daemon thread."""
+        if not self.path or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="screening-reload", daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.reload()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+# Process-wide index, loaded on import
+SCREENING = Screening(SCREENING_INDEX_PATH)
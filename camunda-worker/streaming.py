@@ -0,0 +1,112 @@
+import json
+
+# Incremental parsing of an agent's JSON verdict while it is being streamed.
+#
+# Agents answer with one JSON object, usually short decision fields first
+# and a long narrative after them:
+#
+#   {"final_status": "pass", "risk_level": "low", "summary": "..."}
+#
+# FieldStream is fed the text deltas as they arrive and yields each
+# top-level field as soon as its value is complete, so a caller waiting
+# for `final_status` can act on it before the narrative has been
+# generated. Text before the first "{" (a ```json fence, a preamble) is
+# skipped. Nested values are returned once they close; only top-level
+# fields are reported.
+
+class FieldStream:
+    """Feed text chunks; completed top-level fields collect in `fields`."""
+
+    def __init__(self):
+        self.text = ""
+        self.fields = {}
+        self.done = False
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+
+    def feed(self, chunk: str) -> dict:
+        """Add `chunk`; returns the fields completed by it."""
+        self.text += chunk
+        new = {}
+        text = self.text
+        i = self._pos
+        while i < len(text) and not self.done:
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._key_start is not None:
+                            self._key = json.loads(text[self._key_start:i + 1])
+                            self._key_start = None
+                        elif self._value_start is not None:
+                            self._complete(text[self._value_start:i + 1], new)
+            elif not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._key is None:
+                        self._key_start = i
+                    elif self._value_start is None:
+                        self._value_start = i
+            elif ch in "{[":
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    self._complete(text[self._value_start:i + 1], new)
+                elif self._depth == 0:
+                    # a bare scalar as the last value ends with the object
+                    if self._value_start is not None:
+                        self._complete(text[self._value_start:i], new)
+                    self.done = True
+            elif self._depth == 1 and self._key is not None:
+                if ch == ",":
+                    if self._value_start is not None:
+                        self._complete(text[self._value_start:i], new)
+                elif self._value_start is None and not ch.isspace() and ch != ":":
+                    self._value_start = i
+            i += 1
+        self._pos = i
+        return new
+
+    def _complete(self, raw: str, new: dict):
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            value = raw.strip()
+        self.fields[self._key] = new[self._key] = value
+        self._key = None
+        self._value_start = None
+
+    def has(self, names) -> bool:
+        return all(name in self.fields for name in names)
+
+    def result(self):
+        """The whole reply: the parsed object, or the raw text if it is not JSON."""
+        text = self.text.strip()
+        if self.done:
+            start = text.find("{")
+            try:
+                return json.loads(text[start:text.rfind("}") + 1])
+            except json.JSONDecodeError:
+                pass
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return text or None
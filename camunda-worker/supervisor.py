@@ -0,0 +1,230 @@
+"""Run the worker as several processes, each serving a group of task types.
+
+    python supervisor.py --groups rules=8,stateful=1,ai=1
+
+Each child process runs worker.main() with its own gRPC channel and only
+its group's task types, so rule evaluation spreads across cores instead
+of sharing one GIL. The supervisor:
+  - restarts children that exit unexpectedly, backing off when they keep
+    crashing;
+  - on SIGTERM / SIGINT asks every child to drain (stop activating jobs,
+    finish running ones) and kills any still running after --drain-timeout;
+  - collects each child's metrics snapshots and serves the combined
+    totals at http://127.0.0.1:--metrics-port/metrics (and writes them
+    as JSON to --metrics-path).
+
+The `stateful` group holds the task types that read the per-customer
+aggregates, which live in one process's memory. Keep it at one process,
+or each process would see only part of every customer's history. In the
+fused flow that is only customer-aggregates, which hands the aggregates
+to all-deterministic-checks as a process variable.
+"""
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+from logs import setup_logging
+from metrics import Metrics, merge, serve
+
+log = logging.getLogger("supervisor")
+
+GROUPS = {
+    "rules": (
+        "wire-transparency", "cdd-kyc", "str-handling", "sanctions", "purpose-checks",
+        "fx-checks", "suitability-checks", "virtual-assets", "channel-consistency",
+        "correspondent-banking", "record-keeping", "data-quality", "pricing-conflicts",
+        "all-deterministic-checks",
+    ),
+    # read or update the per-customer aggregates (aggregates.py)
+    "stateful": ("cash-transactions", "behavioural-tests", "customer-aggregates"),
+    "ai": ("non-deterministic-tests", "ai-report", "ai-advisor"),
+}
+STATEFUL = {"stateful"}
+
+def parse_groups(spec: str) -> dict:
+    """"rules=8,ai=1" -> {"rules": 8, "ai": 1}; groups left out run no process."""
+    counts = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, n = part.partition("=")
+        if name not in GROUPS:
+            raise ValueError(f"unknown group {name!r}; expected one of {', '.join(GROUPS)}")
+        counts[name] = int(n or 1)
+    return counts
+
+def run_worker(group, task_types, metrics_queue, metrics_interval):
+    """Child process entry point."""
+    if group not in STATEFUL:
+        # only the stateful group owns the aggregate snapshot
+        os.environ["AGGREGATE_SNAPSHOT_PATH"] = ""
+    import asyncio
+    import worker
+    asyncio.run(worker.main(task_types=task_types, metrics_queue=metrics_queue, metrics_interval=metrics_interval))
+
+
+class Child:
+    __slots__ = ("group", "index", "process", "started", "failures", "restart_at")
+
+    def __init__(self, group, index):
+        self.group = group
+        self.index = index
+        self.process = None
+        self.started = 0.0
+        self.failures = 0
+        self.restart_at = 0.0
+
+    @property
+    def name(self):
+        return f"{self.group}-{self.index}"
+
+
+class Supervisor:
+    def __init__(self, counts, target=run_worker, drain_timeout=60.0, metrics_interval=5.0, metrics_path=None,
+                 metrics_port=0, max_backoff=60.0, stable_after=30.0):
+        self.target = target
+        self.drain_timeout = drain_timeout
+        self.metrics_interval = metrics_interval
+        self.metrics_path = metrics_path
+        self.metrics_port = metrics_port
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.ctx = mp.get_context("spawn")
+        self.metrics_queue = self.ctx.Queue()
+        self.children = [Child(group, i) for group, n in counts.items() for i in range(n)]
+        # latest snapshot per live pid, and the counters and histograms of
+        # children that exited, summed into one registry as they are reaped;
+        # read by the metrics HTTP thread, hence the lock
+        self.snapshots = {}
+        self.retired = Metrics()
+        self._lock = threading.Lock()
+        self.restarts = 0
+        self.stopping = False
+
+    def start(self, child):
+        child.process = self.ctx.Process(
+            target=self.target,
+            args=(child.group, GROUPS[child.group], self.metrics_queue, self.metrics_interval),
+            name=f"worker-{child.name}",
+            daemon=False,
+        )
+        child.process.start()
+        child.started = time.monotonic()
+        log.info("Started worker", extra={"worker": child.name, "pid": child.process.pid})
+
+    def _reaped(self, child):
+        """Handle an exited child: keep its metrics and schedule a restart."""
+        pid, code = child.process.pid, child.process.exitcode
+        self._collect_metrics()
+        with self._lock:
+            if pid in self.snapshots:
+                # a dead process's gauges (in-flight jobs, limits) no longer hold
+                self.retired.add({**self.snapshots.pop(pid), "gauges": []})
+        child.process = None
+        if self.stopping:
+            return
+        now = time.monotonic()
+        child.failures = 1 if now - child.started >= self.stable_after else child.failures + 1
+        delay = min(self.max_backoff, 2 ** (child.failures - 1))
+        child.restart_at = now + delay
+        self.restarts += 1
+        log.warning("Worker exited; restarting", extra={"worker": child.name, "pid": pid, "exit_code": code, "delay": delay})
+
+    def _collect_metrics(self):
+        while True:
+            try:
+                pid, snapshot = self.metrics_queue.get_nowait()
+            except queue.Empty:
+                return
+            with self._lock:
+                self.snapshots[pid] = snapshot
+
+    def combined_metrics(self) -> dict:
+        with self._lock:
+            combined = merge([self.retired.snapshot(), *self.snapshots.values()])
+        combined["gauges"].append(["supervisor_processes", {}, sum(1 for c in self.children if c.process is not None)])
+        combined["counters"].append(["supervisor_restarts_total", {}, self.restarts])
+        return combined
+
+    def write_metrics(self):
+        if not self.metrics_path:
+            return
+        tmp = f"{self.metrics_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.combined_metrics(), f)
+        os.replace(tmp, self.metrics_path)
+
+    def request_stop(self, *_):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        server = serve(self.metrics_port, self.combined_metrics) if self.metrics_port else None
+        for child in self.children:
+            self.start(child)
+
+        last_write = time.monotonic()
+        while not self.stopping:
+            time.sleep(0.2)
+            self._collect_metrics()
+            now = time.monotonic()
+            for child in self.children:
+                if child.process is not None and not child.process.is_alive():
+                    self._reaped(child)
+                if child.process is None and not self.stopping and now >= child.restart_at:
+                    self.start(child)
+            if now - last_write >= self.metrics_interval:
+                self.write_metrics()
+                last_write = now
+        self.shutdown()
+        if server is not None:
+            server.shutdown()
+
+    def shutdown(self):
+        log.info("Draining workers")
+        live = [c for c in self.children if c.process is not None and c.process.is_alive()]
+        for child in live:
+            child.process.terminate()  # SIGTERM: the child drains, then exits
+        deadline = time.monotonic() + self.drain_timeout
+        for child in live:
+            child.process.join(max(0.0, deadline - time.monotonic()))
+            if child.process.is_alive():
+                log.warning("Worker did not drain in time; killing it", extra={"worker": child.name, "drain_timeout": self.drain_timeout})
+                child.process.kill()
+                child.process.join()
+        for child in self.children:
+            if child.process is not None:
+                self._reaped(child)
+        self._collect_metrics()
+        self.write_metrics()
+        log.info("Workers stopped")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run worker processes per group of task types.")
+    parser.add_argument(
+        "--groups", default=os.getenv("SUPERVISOR_GROUPS", f"rules={os.cpu_count() or 1},stateful=1,ai=1"),
+        help=f"processes per group, e.g. rules=8,stateful=1,ai=1 (groups: {', '.join(GROUPS)})",
+    )
+    parser.add_argument("--drain-timeout", type=float, default=float(os.getenv("SUPERVISOR_DRAIN_TIMEOUT", "60")))
+    parser.add_argument("--metrics-interval", type=float, default=5.0, help="seconds between metrics snapshots")
+    parser.add_argument("--metrics-path", default=os.getenv("SUPERVISOR_METRICS_PATH"), help="combined metrics JSON file")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("METRICS_PORT", "9464")),
+                        help="serve combined Prometheus metrics on this local port (0: off)")
+    args = parser.parse_args(argv)
+    try:
+        counts = parse_groups(args.groups)
+    except ValueError as e:
+        parser.error(str(e))
+    setup_logging()
+    Supervisor(counts, drain_timeout=args.drain_timeout, metrics_interval=args.metrics_interval,
+               metrics_path=args.metrics_path, metrics_port=args.metrics_port).run()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
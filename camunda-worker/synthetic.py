@@ -0,0 +1,172 @@
+import random
+from datetime import datetime, timedelta
+
+# -------------------------------
+# Value pools
+# -------------------------------
+# (value, weight) pairs; weights are relative
+CHANNELS = (("SWIFT", 40), ("RTGS", 15), ("FAST", 15), ("FPS", 10), ("SEPA", 10), ("CASH", 10))
+COUNTRIES = (
+    ("SG", 25), ("HK", 20), ("CH", 20), ("GB", 10), ("US", 10), ("AE", 5),
+    ("CN", 4), ("DE", 4), ("IR", 1), ("KP", 1),
+)
+JURISDICTIONS = (("SG", "MAS"), ("HK", "HKMA"), ("CH", "FINMA"))
+CURRENCIES = ("SGD", "HKD", "CHF", "USD", "EUR", "GBP")
+PRODUCT_TYPES = (("wire_transfer", 60), ("cash_deposit", 10), ("cash_withdrawal", 5), ("fx_spot", 10), ("fund_subscription", 8), ("redemption", 4), ("structured_note", 3))
+CUSTOMER_TYPES = (("individual", 70), ("corporate", 20), ("domiciliary_company", 5), ("trust", 5))
+RISK_RATINGS = (("Low", 50), ("Medium", 35), ("High", 15))
+PURPOSE_CODES = ("EDU", "GDS", "SVC", "SAL", "INV", "TRD", "FAM")
+SANCTIONS_SCREENING = (("none", 90), ("potential", 5), ("cleared", 5))
+
+FIRST_NAMES = ("Wei", "Mei", "Hans", "Anna", "Omar", "Priya", "Liam", "Sofia", "Kenji", "Chloe")
+LAST_NAMES = ("Tan", "Lim", "Muller", "Schmidt", "Haddad", "Sharma", "Smith", "Rossi", "Sato", "Wong")
+COMPANY_WORDS = ("Harbour", "Alpine", "Lion", "Jade", "Summit", "Pacific", "Orion", "Meridian", "Crescent", "Delta")
+COMPANY_SUFFIXES = ("Ltd", "Pte Ltd", "Inc", "LLC", "AG", "Co", "Pty Ltd")
+COUNTERPARTIES = (("", 70), ("Licensed Exchange", 20), ("unlicensed_vasp", 5), ("OTC Desk", 5))
+NARRATIVES = (
+    "invoice payment", "school fees", "salary", "investment top-up",
+    "family support", "invoice # for copper cathodes", "payment on behalf of client",
+    "third party settlement", "consulting services", "property deposit",
+)
+ACCOUNT_PREFIXES = (("", 70), ("RETAIL", 10), ("PERS", 5), ("BIZ", 10), ("CORP", 5))
+
+# -------------------------------
+# Generator
+# -------------------------------
+def _pick(rng, weighted):
+    return rng.choices([v for v, _ in weighted], weights=[w for _, w in weighted])[0]
+
+def _person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+def _company(rng):
+    return f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}"
+
+def _account(rng, country):
+    prefix = _pick(rng, ACCOUNT_PREFIXES)
+    body = "".join(rng.choice("0123456789") for _ in range(rng.randint(12, 24)))
+    account = f"{prefix}{country}{body}"
+    # a few malformed accounts for the data-quality rules
+    roll = rng.random()
+    if roll < 0.02:
+        return ""
+    if roll < 0.04:
+        return account[:8]
+    if roll < 0.05:
+        return account[:10] + "-" + account[10:]
+    return account
+
+def _bic(rng, country):
+    return "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(4)) + country + "XX"
+
+def _dmy(d) -> str:
+    return d.strftime("%d/%m/%Y")
+
+def transaction(rng: random.Random, index: int = 0, customers: int = 1000, start: datetime = datetime(2025, 1, 1), spacing: int = 60) -> dict:
+    """One synthetic `data` dict covering every field the rules read.
+
+    Distributions are chosen so that each rule both passes and fails on
+    some share of transactions; the same `rng` state always yields the
+    same transaction.
+    """
+    booking_jurisdiction, regulator = rng.choice(JURISDICTIONS)
+    channel = _pick(rng, CHANNELS)
+    originator_country = _pick(rng, COUNTRIES)
+    beneficiary_country = originator_country if rng.random() < 0.6 else _pick(rng, COUNTRIES)
+    customer_type = _pick(rng, CUSTOMER_TYPES)
+    corporate = customer_type != "individual"
+    originator_name = _company(rng) if corporate else _person(rng)
+    if rng.random() < 0.01:
+        originator_name = ""
+    beneficiary_name = originator_name if rng.random() < 0.05 else (_company(rng) if rng.random() < 0.4 else _person(rng))
+    if rng.random() < 0.02:
+        beneficiary_name = ""
+
+    # booking times advance with `index`, `spacing` seconds apart on average
+    booked = start + timedelta(seconds=index * spacing + rng.randrange(spacing))
+    value_date = booked.date() + timedelta(days=0 if rng.random() < 0.9 else rng.choice((-1, 1, 2)))
+    kyc_last_completed = booked.date() - timedelta(days=rng.randrange(30, 360 if rng.random() < 0.95 else 1200))
+    kyc_due_date = kyc_last_completed + timedelta(days=rng.choice((365, 730, 1095)))
+    if rng.random() < 0.03:
+        kyc_due_date = kyc_last_completed - timedelta(days=30)
+
+    suspicion = rng.random() < 0.05
+    suspicion_dt = booked + timedelta(hours=rng.randrange(1, 48))
+    str_filed_dt = suspicion_dt + timedelta(hours=rng.randrange(1, 96))
+
+    is_advised = rng.random() < 0.3
+    product_complex = rng.random() < 0.2
+    va_exposure = rng.random() < 0.1
+    is_pep = rng.random() < 0.05
+    product_type = _pick(rng, PRODUCT_TYPES)
+    cash = channel == "CASH" or product_type.startswith("cash_")
+    fx = rng.random() < 0.25
+
+    return {
+        "transaction_id": f"TXN-{index:08d}",
+        "customer_id": f"CUST-{rng.randrange(customers):06d}",
+        "booking_jurisdiction": booking_jurisdiction,
+        "regulator": regulator,
+        "booking_datetime": booked.strftime("%Y-%m-%dT%H:%M:%S"),
+        "value_date": _dmy(value_date) if rng.random() > 0.02 else "",
+        "amount": round(rng.lognormvariate(8.5, 1.5), 2) if rng.random() > 0.01 else None,
+        "currency": rng.choice(CURRENCIES),
+        "channel": channel,
+        "product_type": rng.choice(("cash_deposit", "cash_withdrawal")) if channel == "CASH" else product_type,
+        "originator_name": originator_name,
+        "originator_account": _account(rng, originator_country) if rng.random() > 0.01 else "",
+        "originator_country": originator_country,
+        "beneficiary_name": beneficiary_name,
+        "beneficiary_account": _account(rng, beneficiary_country),
+        "beneficiary_country": beneficiary_country,
+        "ordering_institution_bic": _bic(rng, originator_country) if rng.random() > 0.03 else "",
+        "beneficiary_institution_bic": _bic(rng, beneficiary_country) if rng.random() > 0.03 else "",
+        "swift_mt": "MT103" if channel == "SWIFT" else "",
+        "swift_f50_present": rng.random() > 0.03,
+        "swift_f59_present": rng.random() > 0.03,
+        "swift_f70_purpose": rng.choice(NARRATIVES) if rng.random() > 0.1 else "",
+        "travel_rule_complete": rng.random() > 0.05,
+        "transaction_executed": rng.random() > 0.1,
+        "customer_type": customer_type,
+        "customer_risk_rating": _pick(rng, RISK_RATINGS),
+        "customer_is_pep": is_pep,
+        "edd_required": is_pep or rng.random() < 0.1,
+        "edd_performed": rng.random() > 0.1,
+        "sow_documented": rng.random() > 0.08,
+        "kyc_last_completed": _dmy(kyc_last_completed),
+        "kyc_due_date": _dmy(kyc_due_date),
+        "suspicion_determined_datetime": suspicion_dt.strftime("%Y-%m-%dT%H:%M:%S") if suspicion else "",
+        "str_filed_datetime": str_filed_dt.strftime("%Y-%m-%dT%H:%M:%S") if suspicion else "",
+        "sanctions_screening": _pick(rng, SANCTIONS_SCREENING),
+        "high_risk_corridor": rng.random() < 0.1,
+        "cash_id_verified": rng.random() > 0.05 if cash else None,
+        "daily_cash_total_customer": round(rng.uniform(0, 25000), 2) if cash else 0,
+        "daily_cash_txn_count": rng.randint(1, 6) if cash else 0,
+        "purpose_code": rng.choice(PURPOSE_CODES) if rng.random() > 0.2 else "",
+        "narrative": rng.choice(NARRATIVES) if rng.random() > 0.05 else "",
+        "fx_indicator": fx,
+        "fx_spread_bps": rng.randint(-200, 200) if fx else 0,
+        "is_advised": is_advised,
+        "product_complex": product_complex,
+        "suitability_assessed": rng.random() > 0.1 if is_advised else False,
+        "suitability_assessedsuitability-checks": is_advised and rng.random() > 0.1,
+        "suitability_result": _pick(rng, (("match", 90), ("mismatch", 10))) if is_advised else "",
+        "transaction_proceeds": rng.random() > 0.2,
+        "client_risk_profile": _pick(rng, RISK_RATINGS),
+        "risk_acknowledgement": rng.random() > 0.2,
+        "product_has_va_exposure": va_exposure,
+        "va_disclosure_provided": rng.random() > 0.1 if va_exposure else False,
+        "counterparty": _pick(rng, COUNTERPARTIES) if va_exposure else "",
+        "respondent_shell_bank": rng.random() < 0.01,
+        "payable_through": rng.random() < 0.05,
+        "respondent_cdd_done": rng.random() > 0.1,
+        "is_str_related": suspicion,
+        "retention_years": rng.choice((3, 5, 7, 10)),
+    }
+
+def generate(n: int, seed: int = 0, customers: int = 1000, spacing: int = 60):
+    """Yield `n` synthetic transactions in booking-time order, reproducible
+    for a given seed."""
+    rng = random.Random(seed)
+    for i in range(n):
+        yield transaction(rng, i, customers, spacing=spacing)
@@ -0,0 +1,47 @@
+import pytest
+
+from names import is_company, normalise, similar
+
+# is_company decides whether DQ-039 reads a party as a company or a person;
+# personal names that contain a short legal-form token must stay people.
+
+@pytest.mark.parametrize("name", [
+    "Ab Rahman bin Ismail",
+    "Mohd Ab Aziz",
+    "Nur As Syifa",
+    "Maria Sa",
+    "Sa Nguyen",
+    "Maria Co",
+    "Co Thi Lan",
+    "Zao Wei",
+    "Anna Kk",
+    "Ltd Cohen",
+    "Liam Haddad",
+    "Ltd",
+    "",
+    None,
+])
+def test_personal_names(name):
+    assert not is_company(name)
+
+
+@pytest.mark.parametrize("name", [
+    "Alpine Pte Ltd",
+    "Harbour Orion LLC",
+    "Pacific Delta Inc",
+    "Müller GmbH",
+    "Alpine Lion AG",
+    "Maybank Sdn Bhd",
+    "Gazprom PJSC",
+    "OOO Romashka",
+    "Alpine Holdings Ltd Co",
+    "Delta Lion Pty Ltd",
+])
+def test_companies(name):
+    assert is_company(name)
+
+
+def test_normalise_drops_legal_forms():
+    assert normalise("MÜLLER, Hans") == normalise("hans muller")
+    assert normalise("Alpine Pte Ltd") == normalise("alpine")
+    assert similar("Harbour Orion LLC", "Harbour Orion Ltd")
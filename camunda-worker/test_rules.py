@@ -0,0 +1,18 @@
+import pytest
+
+from rules import CATEGORIES, PLAN, RULES
+
+# Guarded fields can hold anything a process variable can, including
+# lists and objects; a guard compares them like the rule does (==).
+
+GUARDED = sorted({r.guard[0] for r in RULES.values() if r.guard and r.guard[1] is not None})
+
+
+@pytest.mark.parametrize("field", GUARDED)
+@pytest.mark.parametrize("value", [["High"], {"channel": "SWIFT"}, [False]])
+def test_unhashable_guard_values(field, value):
+    data = {field: value}
+    results = PLAN.evaluate(data)
+    assert results == PLAN.evaluate({})
+    for name in CATEGORIES:
+        assert PLAN.status(data, name) == results[name]["overall_status"]
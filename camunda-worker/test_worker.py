@@ -0,0 +1,61 @@
+import asyncio
+import os
+
+# worker reads these when it is imported
+os.environ["INCREMENTAL_EVALUATION"] = "1"
+os.environ["AGGREGATE_SNAPSHOT_PATH"] = ""
+os.environ["VERDICT_CACHE_PATH"] = ""
+
+import synthetic
+import worker
+from benchmark import FakeZeebe, _job
+from metrics import METRICS
+from rules import CATEGORIES, PLAN
+
+
+def _run(task_type, variables, key=1):
+    """Run `variables` through the router's handler for `task_type`, as
+    ZeebeWorker would; returns (task result, fake adapter)."""
+    task = next(t for t in worker.router.tasks if t.type == task_type)
+    zeebe = FakeZeebe()
+    job = _job(key, task_type, dict(variables))
+    job = asyncio.run(task.job_handler(job, worker.JobController(job, zeebe)))
+    return job.task_result, zeebe
+
+
+def _outcomes(results) -> dict:
+    """Status and rule results per category, without incremental bookkeeping."""
+    return {name: {k: results[name][k] for k in ("overall_status", "tests")} for name in CATEGORIES}
+
+
+def _reused() -> int:
+    counters = METRICS.snapshot()["counters"]
+    return sum(value for name, labels, value in counters if name == "rule_reuse_total" and labels == {"result": "reused"})
+
+
+def test_fused_task_reruns_incrementally():
+    assert worker.INCREMENTAL
+    data = next(synthetic.generate(1, seed=11))
+    variables = {"data": data}
+    first, zeebe = _run("all-deterministic-checks", variables)
+    assert zeebe.failed == 0 and set(CATEGORIES) <= set(first)
+
+    # the re-run fetches the earlier category results as well
+    variables.update(first)
+    reused = _reused()
+    second, zeebe = _run("all-deterministic-checks", variables)
+    assert zeebe.failed == 0
+    assert _reused() - reused == sum(len(ids) for ids in CATEGORIES.values())
+    assert _outcomes(second) == _outcomes(first)
+
+
+def test_fused_task_rerun_after_correction():
+    data = next(synthetic.generate(1, seed=12))
+    variables = {"data": data, "aggregates": {}}
+    first, _ = _run("all-deterministic-checks", variables)
+    corrected = {**data, "travel_rule_complete": False, "transaction_executed": True}
+    variables.update(first, data=corrected)
+    second, zeebe = _run("all-deterministic-checks", variables)
+    assert zeebe.failed == 0
+    assert _outcomes(second) == _outcomes(PLAN.evaluate(corrected))
+    assert _outcomes(second) != _outcomes(first)
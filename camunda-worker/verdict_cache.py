@@ -0,0 +1,120 @@
+import hashlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import METRICS
+
+
+def canonical_key(agent_id: str, payload) -> str:
+    """Content address for an agent call: agent ID plus a hash of its input."""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return f"{agent_id}:{hashlib.sha256(body.encode('utf-8')).hexdigest()}"
+
+
+class VerdictCache:
+    """LRU + TTL cache of agent verdicts keyed by `canonical_key`.
+
+    Entries live in memory up to `max_entries`; with `path` set they are
+    also written to a SQLite file, so a restarted worker still answers
+    replays and retries from cache. The file is only read when the cache
+    is opened, to load its newest `max_entries` verdicts, and written by a
+    background thread that commits whatever has queued up in one
+    transaction, so neither `get` nor `put` waits on the disk; `close`
+    flushes it. Only successful (non-None) verdicts should be stored.
+    """
+
+    def __init__(self, max_entries=10000, ttl=86400.0, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = queue.SimpleQueue()
+        self._writer = None
+        if path:
+            self._load(path)
+            self._writer = threading.Thread(target=self._write_loop, args=(path,), name="verdict-cache", daemon=True)
+            self._writer.start()
+
+    def _load(self, path):
+        db = sqlite3.connect(path)
+        try:
+            db.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+            db.execute("DELETE FROM verdicts WHERE expires < ?", (time.time(),))
+            db.commit()
+            rows = db.execute(
+                "SELECT key, value, expires FROM verdicts ORDER BY expires DESC LIMIT ?", (max(0, self.max_entries),)
+            ).fetchall()
+        finally:
+            db.close()
+        for key, value, expires in reversed(rows):
+            self._entries[key] = (expires, json.loads(value))
+        METRICS.set("verdict_cache_entries", len(self._entries))
+
+    def get(self, agent_id, payload):
+        if self.max_entries <= 0:
+            return None
+        key = canonical_key(agent_id, payload)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        METRICS.inc("verdict_cache_lookups_total", result="miss" if entry is None else "hit")
+        return None if entry is None else entry[1]
+
+    def put(self, agent_id, payload, value):
+        if self.max_entries <= 0 or value is None:
+            return
+        key = canonical_key(agent_id, payload)
+        entry = (time.time() + self.ttl, value)
+        with self._lock:
+            self._store(key, entry)
+            entries = len(self._entries)
+        METRICS.set("verdict_cache_entries", entries)
+        if self._writer is not None:
+            self._writes.put((key, json.dumps(value), entry[0]))
+
+    def _write_loop(self, path):
+        db = sqlite3.connect(path)
+        stop = False
+        while not stop:
+            rows = [self._writes.get()]
+            while True:
+                try:
+                    rows.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in rows
+            rows = [row for row in rows if row is not None]
+            if rows:
+                db.executemany("INSERT OR REPLACE INTO verdicts (key, value, expires) VALUES (?, ?, ?)", rows)
+                db.commit()
+        db.close()
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def close(self):
+        """Write out queued verdicts."""
+        if self._writer is not None:
+            self._writes.put(None)
+            self._writer.join()
+            self._writer = None
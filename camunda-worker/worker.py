@@ -1,407 +1,558 @@
 import asyncio
 import logging
-from pyzeebe import ZeebeClient, ZeebeWorker, ZeebeTaskRouter, create_camunda_cloud_channel, Job, JobController
+from pyzeebe import ZeebeClient, ZeebeTaskRouter, create_camunda_cloud_channel, Job, JobController
 from pyzeebe.errors import BusinessError
-from datetime import datetime, date
-import requests
-from openai import OpenAI
+from pyzeebe.proto.gateway_pb2 import SetVariablesRequest
+from pyzeebe.proto.gateway_pb2_grpc import GatewayStub
+from pyzeebe.task.exception_handler import default_exception_handler
+from rules import CATEGORIES, PLAN, fingerprint
 import os
-from agent import run_non_deterministic
+from activation import AdaptiveLimit, TunedWorker, task_options, task_settings
+from agent import agent_threads, run_non_deterministic, stream_non_deterministic
+from aggregates import AggregateStore
+from logs import setup_logging
+from metrics import METRICS, serve
+from micro_batch import MicroBatcher
+from payload import project
+from prescreen import local_assessment, local_report, prescreen
+from recorder import JOB_RECORD_PATH, JobRecorder
+from screening import SCREENING
+from verdict_cache import VerdictCache
+import itertools
 import json
+import signal
 import time
-
-client = OpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),  
-    base_url="https://YOUR-RESOURCE-NAME.openai.azure.com/openai/v1/"
-    )
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 worker = None
 client = None
+gateway = None
 
 # Define tasks
 router = ZeebeTaskRouter()
 
-# Setup logging
-# logging.basicConfig(level=logging.Debug)
-
-from datetime import datetime, date
-
-# -------------------------------
-# Helpers
-# -------------------------------
-def _to_iso_dt(s: str) -> datetime | None:
-    if not s or not s.strip():
-        return None
-    try:
-        return datetime.fromisoformat(s)
-    except ValueError:
-        return None
-
-def _to_dmy_date(s: str) -> date | None:
-    if not s or not s.strip():
-        return None
-    try:
-        return datetime.strptime(s, "%d/%m/%Y").date()
-    except ValueError:
-        return None
-
-def _to_float(s) -> float:
-    try:
-        return float(s)
-    except (ValueError, TypeError):
-        return 0.0
-
-def _to_int(s) -> int:
-    try:
-        return int(s)
-    except (ValueError, TypeError):
-        return 0
-
-def _status(results: dict) -> str:
-    if all(results.values()):
-        return "pass"
-    elif any(results.values()):
-        return "needs_advice"
-    return "fail"
+# Activation settings per task type (see activation.py for the env overrides)
+TASK_SETTINGS = {}
+
+def tuned(task_type: str, kind: str = "rule", **defaults) -> dict:
+    TASK_SETTINGS[task_type] = task_settings(task_type, kind, **defaults)
+    return task_options(TASK_SETTINGS[task_type])
+
+# Per-customer rolling windows behind the cash and behavioural checks,
+# snapshotted to AGGREGATE_SNAPSHOT_PATH so a restart keeps its history
+aggregates = AggregateStore(
+    path=os.getenv("AGGREGATE_SNAPSHOT_PATH") or None,
+    snapshot_interval=float(os.getenv("AGGREGATE_SNAPSHOT_SECONDS", "60")),
+)
+
+def with_aggregates(job: Job, data: dict) -> dict:
+    """`data` plus the customer's rolling aggregates."""
+    data = data or {}
+    return with_features(data, aggregates.observe(data, key=job.process_instance_key))
+
+def with_features(data: dict, features: dict) -> dict:
+    """`data` with the aggregate `features` it lacks; upstream values win."""
+    return {**data, **{k: v for k, v in features.items() if data.get(k) is None}}
+
+log = logging.getLogger("worker")
+
+# Per-rule timing and outcome (metrics rule_evaluation_seconds and
+# rule_evaluations_total) for every RULE_METRICS_EVERY-th evaluation;
+# 0 turns it off
+RULE_METRICS_EVERY = int(os.getenv("RULE_METRICS_EVERY", "10"))
+_evaluations = itertools.count()
+
+def record_rule(rule_id: str, seconds: float, result: str):
+    METRICS.observe("rule_evaluation_seconds", seconds, rule=rule_id)
+    METRICS.inc("rule_evaluations_total", rule=rule_id, result=result)
+
+# Incremental mode (INCREMENTAL_EVALUATION=1), for transactions that are
+# corrected and re-screened in the same process instance: category
+# handlers reuse the earlier result of every rule whose input fields did
+# not change (see Plan.evaluate_incremental), and an AI stage whose input
+# fingerprint matches its last run completes without calling the agent,
+# leaving that run's variables in place (see ai_fingerprint).
+INCREMENTAL = os.getenv("INCREMENTAL_EVALUATION", "0") == "1"
+
+def evaluate(data: dict, categories=None, previous=None) -> dict:
+    if INCREMENTAL:
+        stats = {}
+        out = PLAN.evaluate_incremental(data, previous, categories, stats)
+        METRICS.inc("rule_reuse_total", stats["reused"], result="reused")
+        METRICS.inc("rule_reuse_total", stats["evaluated"], result="evaluated")
+        return out
+    if RULE_METRICS_EVERY and next(_evaluations) % RULE_METRICS_EVERY == 0:
+        return PLAN.evaluate(data, categories, record=record_rule)
+    return PLAN.evaluate(data, categories)
 
 # -------------------------------
 # A. Wire transparency & travel rule
 # -------------------------------
-def tr_001(d): 
-    return not (
-        d.get("channel") in {"SWIFT", "RTGS"} and
-        d.get("originator_country") != d.get("beneficiary_country") and
-        _to_float(d.get("amount")) > 2000 and
-        any(not d.get(f) for f in ["originator_name", "originator_account"])
-    )
-
-def tr_002(d): 
-    return not (d.get("swift_mt") and (not d.get("swift_f50_present") or not d.get("swift_f59_present")))
-
-def tr_003(d): 
-    return not (d.get("channel") == "SWIFT" and d.get("ordering_institution_bic") and not d.get("originator_name"))
-
-def tr_004(d): 
-    return not (d.get("travel_rule_complete") is False and d.get("transaction_executed", True))
-
-@router.task("wire-transparency")
+@router.task("wire-transparency", **tuned("wire-transparency"))
 def wire_transparency_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {
-        "TR-001": tr_001(d),
-        "TR-002": tr_002(d),
-        "TR-003": tr_003(d),
-        "TR-004": tr_004(d)
-    }
-    return {"wire": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(job.variables.get("data", {}), ["wire"], job.variables)
 
 # -------------------------------
 # B. CDD / KYC freshness & EDD
 # -------------------------------
-def cdd_005(d):
-    booking_dt = _to_iso_dt(d.get("booking_datetime"))
-    due_dt = _to_dmy_date(d.get("kyc_due_date"))
-    if not booking_dt or not due_dt:
-        return False
-    return booking_dt <= datetime.combine(due_dt, datetime.min.time())
-
-def cdd_006(d): 
-    return not (d.get("customer_is_pep") and (not d.get("edd_required") or not d.get("edd_performed")))
-
-def cdd_007(d):
-    if d.get("customer_risk_rating") == "High":
-        last_completed = _to_dmy_date(d.get("kyc_last_completed"))
-        due_date = _to_dmy_date(d.get("kyc_due_date"))
-        if not last_completed or not due_date:
-            return False
-        return last_completed <= due_date
-    return True
-
-def cdd_008(d): 
-    return not ((not d.get("sow_documented")) and (d.get("customer_is_pep") or d.get("customer_type") in {"domiciliary_company", "trust"}))
-
-@router.task("cdd-kyc")
+@router.task("cdd-kyc", **tuned("cdd-kyc"))
 def cdd_kyc_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {
-        "CDD-005": cdd_005(d),
-        "CDD-006": cdd_006(d),
-        "CDD-007": cdd_007(d),
-        "CDD-008": cdd_008(d)
-    }
-    return {"cdd": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(job.variables.get("data", {}), ["cdd"], job.variables)
 
 # -------------------------------
 # C. STR / Suspicion handling
 # -------------------------------
-def str_009(d):
-    fmt = "%Y-%m-%dT%H:%M:%S"
-    s_dt, f_dt = d.get("suspicion_determined_datetime"), d.get("str_filed_datetime")
-    if s_dt and f_dt and s_dt.strip() and f_dt.strip():
-        try:
-            delta = datetime.strptime(f_dt, fmt) - datetime.strptime(s_dt, fmt)
-            return delta.total_seconds() <= 172800
-        except ValueError:
-            return False
-    return True
-
-def str_010(d): 
-    return not (d.get("sanctions_screening") == "potential" and d.get("transaction_executed", True))
-
-@router.task("str-handling")
+@router.task("str-handling", **tuned("str-handling"))
 def str_handling_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {"STR-009": str_009(d), "STR-010": str_010(d)}
-    return {"str": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(job.variables.get("data", {}), ["str"], job.variables)
 
 # -------------------------------
 # D. Sanctions & geography
 # -------------------------------
-def san_011(d): 
-    return not (d.get("originator_country") in {"IR", "KP"} or d.get("beneficiary_country") in {"IR", "KP"})
-
-def san_012(d): 
-    return not (d.get("high_risk_corridor") and not d.get("swift_f70_purpose"))
-
-@router.task("sanctions")
+@router.task("sanctions", **tuned("sanctions"))
 def sanctions_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {"SAN-011": san_011(d), "SAN-012": san_012(d)}
-    return {"sanctions": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(job.variables.get("data", {}), ["sanctions"], job.variables)
 
 # -------------------------------
 # E. Cash structuring & ID
 # -------------------------------
-def cash_013(d): 
-    return not (d.get("product_type") in {"cash_deposit", "cash_withdrawal"} and not d.get("cash_id_verified"))
-
-def cash_014(d): 
-    return not (_to_float(d.get("daily_cash_total_customer")) > 20000 or _to_int(d.get("daily_cash_txn_count")) >= 5)
-
-@router.task("cash-transactions")
+@router.task("cash-transactions", **tuned("cash-transactions"))
 def cash_transactions_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {"CASH-013": cash_013(d), "CASH-014": cash_014(d)}
-    return {"cash": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(with_aggregates(job, job.variables.get("data")), ["cash"], job.variables)
 
 # -------------------------------
 # F. Purpose & narrative quality
 # -------------------------------
-def pur_016(d): 
-    return not ("EDU" in d.get("purpose_code", "") and "copper" in (d.get("narrative", "")).lower())
-
-@router.task("purpose-checks")
+@router.task("purpose-checks", **tuned("purpose-checks"))
 def purpose_checks_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {"PUR-016": pur_016(d)}
-    return {"purpose": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(job.variables.get("data", {}), ["purpose"], job.variables)
 
 # -------------------------------
 # G. FX reasonableness & fair dealing
 # -------------------------------
-def fx_017(d): 
-    return not (d.get("fx_indicator") and abs(_to_int(d.get("fx_spread_bps"))) > 150)
-
-def fx_018(d): 
-    return not (d.get("is_advised") and d.get("product_complex", False) and not d.get("suitability_assessed"))
-
-@router.task("fx-checks")
+@router.task("fx-checks", **tuned("fx-checks"))
 def fx_checks_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {"FX-017": fx_017(d), "FX-018": fx_018(d)}
-    return {"fx": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(job.variables.get("data", {}), ["fx"], job.variables)
 
 # -------------------------------
 # H. Suitability / appropriateness
 # -------------------------------
-def suit_019(d): 
-    return not (d.get("is_advised") and not d.get("suitability_assessed"))
-
-def suit_020(d): 
-    return not (d.get("suitability_assessedsuitability-checks") and d.get("suitability_result") == "mismatch" and d.get("transaction_proceeds", True))
-
-def suit_021(d): 
-    return not (d.get("product_complex") and d.get("client_risk_profile") == "Low" and not d.get("risk_acknowledgement", False))
-
-def suit_022(d): 
-    return not (d.get("product_has_va_exposure") and not d.get("va_disclosure_provided"))
-
-@router.task("suitability-checks")
+@router.task("suitability-checks", **tuned("suitability-checks"))
 def suitability_checks_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {
-        "SUIT-019": suit_019(d),
-        "SUIT-020": suit_020(d),
-        "SUIT-021": suit_021(d),
-        "SUIT-022": suit_022(d)
-    }
-    return {"suitability": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(job.variables.get("data", {}), ["suitability"], job.variables)
 
 # -------------------------------
 # I. Virtual assets
 # -------------------------------
-def va_024(d): 
-    return not (d.get("product_has_va_exposure") and d.get("counterparty", "").lower() in {"unlicensed_vasp"})
-
-def va_025(d): 
-    return not (d.get("product_has_va_exposure") and any(not d.get(f) for f in ["originator_name", "beneficiary_name", "beneficiary_account"]))
-
-@router.task("virtual-assets")
+@router.task("virtual-assets", **tuned("virtual-assets"))
 def virtual_assets_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {"VA-024": va_024(d), "VA-025": va_025(d)}
-    return {"virtual": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(job.variables.get("data", {}), ["virtual"], job.variables)
 
 # -------------------------------
 # J. Channel & field consistency
 # -------------------------------
-def con_026(d): 
-    return not (d.get("channel") == "SWIFT" and (not d.get("ordering_institution_bic") or not d.get("beneficiary_institution_bic")))
-
-def con_027(d):
-    if d.get("channel") == "RTGS":
-        vdate = _to_dmy_date(d.get("value_date"))
-        bdate = _to_iso_dt(d.get("booking_datetime"))
-        if not vdate or not bdate:
-            return False
-        return vdate <= bdate.date()
-    return True
-
-def con_028(d): 
-    return not (d.get("channel") in {"FAST", "FPS"} and d.get("originator_country") != d.get("beneficiary_country"))
-
-@router.task("channel-consistency")
+@router.task("channel-consistency", **tuned("channel-consistency"))
 def channel_consistency_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {"CON-026": con_026(d), "CON-027": con_027(d), "CON-028": con_028(d)}
-    return {"channel": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(job.variables.get("data", {}), ["channel"], job.variables)
 
 # -------------------------------
 # K. Counterparty & correspondent banking
 # -------------------------------
-def cor_029(d): 
-    return not d.get("respondent_shell_bank", False)
-
-def cor_030(d): 
-    return not (d.get("payable_through") and not d.get("respondent_cdd_done"))
-
-@router.task("correspondent-banking")
+@router.task("correspondent-banking", **tuned("correspondent-banking"))
 def correspondent_banking_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {"COR-029": cor_029(d), "COR-030": cor_030(d)}
-    return {"counterparty": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(job.variables.get("data", {}), ["counterparty"], job.variables)
 
 # -------------------------------
 # L. Record-keeping & reconstruction
 # -------------------------------
-def rec_031(d): 
-    return all(d.get(f) for f in ["value_date", "amount", "beneficiary_name"])
-
-def rec_032(d): 
-    return not (d.get("is_str_related") and _to_int(d.get("retention_years")) < 5)
-
-@router.task("record-keeping")
+@router.task("record-keeping", **tuned("record-keeping"))
 def record_keeping_task(job: Job) -> dict:
-    d = job.variables.get("data", {})
-    tests = {"REC-031": rec_031(d), "REC-032": rec_032(d)}
-    return {"record": {"overall_status": _status(tests), "tests": tests}}
+    return evaluate(job.variables.get("data", {}), ["record"], job.variables)
 
 
 # -------------------------------
 # O. Data quality
 # -------------------------------
-def dq_038(d):
-    acct = (d.get("beneficiary_account") or "").strip()
-    # must not be empty, alphanumeric, and between 15–34 chars
-    return bool(acct) and acct.isalnum() and 15 <= len(acct) <= 34
-
-
-def dq_039(d):
-    name = (d.get("beneficiary_name") or "").lower().strip()
-    acct = (d.get("beneficiary_account") or "").lower().strip()
-
-    # guard for empty values
-    if not name or not acct:
-        return False
-
-    # determine company / personal type by keywords and character composition
-    is_company = any(x in name for x in [" ltd", " inc", " co", " pty", " llc"])
-    is_personal = name.replace(" ", "").isalpha() and not is_company
-
-    acct_personal_like = acct.startswith(("retail", "pers"))
-    acct_business_like = acct.startswith(("biz", "corp"))
-
-    # fail if company name uses personal-like account or vice versa
-    return not ((is_company and acct_personal_like) or (is_personal and acct_business_like))
-
-
-def dq_040(d):
-    originator_name = (d.get("originator_name") or "").strip()
-    beneficiary_name = (d.get("beneficiary_name") or "").strip()
-    originator_country = (d.get("originator_country") or "").strip()
-    beneficiary_country = (d.get("beneficiary_country") or "").strip()
-    narrative = (d.get("narrative") or "").lower().strip()
-
-    same_name = bool(originator_name and beneficiary_name and originator_name == beneficiary_name)
-    cross_border = bool(originator_country and beneficiary_country and originator_country != beneficiary_country)
-    third_party = any(k in narrative for k in ["third", "on behalf", "obo"])
-
-    # suspicious if same name, cross-border, and mentions third-party
-    return not (same_name and cross_border and third_party)
-
-
-@router.task("data-quality")
+@router.task("data-quality", **tuned("data-quality"))
 def data_quality_task(job: Job) -> dict:
-    d = job.variables.get("data", {})  # safe default
-    tests = {
-        "DQ-038": dq_038(d),
-        "DQ-039": dq_039(d),
-        "DQ-040": dq_040(d)
-    }
-    return {"dataquality": {"overall_status": _status(tests), "tests": tests}}
-
-@router.task("pricing-conflicts")
+    return evaluate(job.variables.get("data", {}), ["dataquality"], job.variables)
+
+# -------------------------------
+# All deterministic checks in a single job
+# -------------------------------
+@router.task("all-deterministic-checks",
+             variables_to_fetch=["data", "aggregates"] + (list(CATEGORIES) if INCREMENTAL else []),
+             **tuned("all-deterministic-checks"))
+def all_deterministic_checks_task(job: Job, data: dict = None, aggregates: dict = None, **previous) -> dict:
+    # `previous`: the earlier category results fetched in incremental mode,
+    # which evaluate reads from job.variables
+    if aggregates is None:
+        # process definitions without a customer-aggregates task before this one
+        return evaluate(with_aggregates(job, data), previous=job.variables)
+    return evaluate(with_features(data or {}, aggregates), previous=job.variables)
+
+# The only part of the fused flow that touches the per-customer store, so
+# all-deterministic-checks itself can run in any process
+@router.task("customer-aggregates", variables_to_fetch=["data"], **tuned("customer-aggregates"))
+def customer_aggregates_task(job: Job, data: dict = None) -> dict:
+    return {"aggregates": aggregates.observe(data or {}, key=job.process_instance_key)}
+
+@router.task("pricing-conflicts", **tuned("pricing-conflicts"))
 def pricing_conflicts_task(job: Job) -> dict:
     return {}
 
 
-@router.task("behavioural-tests")
+# -------------------------------
+# N. Behavioural / patterning
+# -------------------------------
+@router.task("behavioural-tests", **tuned("behavioural-tests"))
 def behavioural_task(job: Job) -> dict:
-    return {}
+    return evaluate(with_aggregates(job, job.variables.get("data")), ["behavioral"], job.variables)
 
-@router.task("non-deterministic-tests")
-def handle_non_deterministic(job: Job):
-    result = run_non_deterministic(agent_id="asst_Fx3yFSNAjijmM5xLPK871GZz", message_text=json.dumps(dict(job.variables)))
-    print("getting non deterministic tests")
+# -------------------------------
+# AI agents
+# -------------------------------
+# Max in-flight agent calls per task type. Agent calls run on their own
+# thread pool, so rule jobs on the default executor never queue behind them.
+AI_MAX_RUNNING_JOBS = {
+    "non-deterministic-tests": int(os.getenv("AI_MAX_RUNNING_NON_DETERMINISTIC", "4")),
+    "ai-report": int(os.getenv("AI_MAX_RUNNING_REPORT", "4")),
+    "ai-advisor": int(os.getenv("AI_MAX_RUNNING_ADVISOR", "4")),
+}
+
+ai_executor = ThreadPoolExecutor(max_workers=sum(AI_MAX_RUNNING_JOBS.values()), thread_name_prefix="ai-agent")
+ai_limits = {task_type: asyncio.Semaphore(limit) for task_type, limit in AI_MAX_RUNNING_JOBS.items()}
+
+# Verdicts keyed by agent ID + input hash, so retries and replays skip the agent
+verdict_cache = VerdictCache(
+    max_entries=int(os.getenv("VERDICT_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("VERDICT_CACHE_TTL_SECONDS", "86400")),
+    path=os.getenv("VERDICT_CACHE_PATH") or None,
+)
+
+# Micro-batching: with AI_BATCH_SIZE > 1, jobs of one task type arriving within
+# AI_BATCH_WINDOW_MS of each other share a single agent run
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "1"))
+AI_BATCH_WINDOW = float(os.getenv("AI_BATCH_WINDOW_MS", "50")) / 1000
+ai_batchers = {}
+
+# Adaptive backpressure: AI job activation shrinks while agent calls are slow
+# or failing, and grows back once they recover
+ai_backpressure = {
+    task_type: AdaptiveLimit(
+        limit,
+        target_latency=float(os.getenv("AI_TARGET_LATENCY_SECONDS", "30")),
+        max_error_rate=float(os.getenv("AI_MAX_ERROR_RATE", "0.2")),
+    )
+    for task_type, limit in AI_MAX_RUNNING_JOBS.items()
+}
+
+# Streaming: with AI_STREAM=drop or attach (and AI_BATCH_SIZE=1) the agent's
+# reply is parsed as it streams in and the job completes as soon as the
+# task's AI_STREAM_FIELDS are in. The rest of the run (the narrative)
+# finishes in the background, holding its agent slot; `attach` then sets
+# the whole reply on the process instance, `drop` only caches it.
+AI_STREAM = os.getenv("AI_STREAM", "off")
+STREAM_FIELDS = {
+    "non-deterministic-tests": os.getenv("AI_STREAM_FIELDS_NON_DETERMINISTIC", "final_status"),
+    "ai-report": os.getenv("AI_STREAM_FIELDS_REPORT", "final_status"),
+    "ai-advisor": os.getenv("AI_STREAM_FIELDS_ADVISOR", "final_status"),
+}
+STREAM_FIELDS = {task_type: tuple(f.strip() for f in fields.split(",") if f.strip()) for task_type, fields in STREAM_FIELDS.items()}
+stream_tails = set()
+
+def ai_defaults(task_type: str) -> dict:
+    jobs = AI_MAX_RUNNING_JOBS[task_type] * AI_BATCH_SIZE
+    return {"max_running_jobs": jobs, "max_jobs_to_activate": jobs}
+
+async def call_agent(task_type: str, agent_id: str, message_text: str, on_fields=None):
+    async with ai_limits[task_type]:
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        ok = False
+        if on_fields is None:
+            call = partial(run_non_deterministic, agent_id=agent_id, message_text=message_text)
+        else:
+            call = partial(stream_non_deterministic, agent_id=agent_id, message_text=message_text,
+                           required=STREAM_FIELDS[task_type], on_fields=on_fields)
+        try:
+            result = await loop.run_in_executor(ai_executor, call)
+            ok = result is not None
+            return result
+        finally:
+            limit = ai_backpressure[task_type]
+            limit.record(time.monotonic() - start, ok)
+            METRICS.set("ai_running_limit", limit.current, task_type=task_type)
+
+async def run_agent(task_type: str, agent_id: str, variables: dict, attach=None):
+    """The agent's verdict for `variables`. When streaming, this may be only
+    the fields parsed so far; `attach` is then awaited with the whole reply
+    once the run ends."""
+    payload = project(task_type, dict(variables))
+    cached = verdict_cache.get(agent_id, payload)
+    if cached is not None:
+        return cached
+    if AI_BATCH_SIZE > 1:
+        if (task_type, agent_id) not in ai_batchers:
+            ai_batchers[(task_type, agent_id)] = MicroBatcher(
+                partial(call_agent, task_type, agent_id), window=AI_BATCH_WINDOW, max_size=AI_BATCH_SIZE
+            )
+        result = await ai_batchers[(task_type, agent_id)].submit(payload)
+    elif AI_STREAM != "off" and STREAM_FIELDS[task_type]:
+        return await stream_agent(task_type, agent_id, payload, attach)
+    else:
+        result = await call_agent(task_type, agent_id, json.dumps(payload, ensure_ascii=False))
+    verdict_cache.put(agent_id, payload, result)
     return result
 
-@router.task("ai-report")
-def handle_ai_report(job: Job):
-    result = run_non_deterministic(agent_id="asst_8njckKJMwvDFd7mHabUIz8AL", message_text=json.dumps(dict(job.variables)))
-    print(result)
-    time.sleep(10)
-    return {"report": result}
+async def stream_agent(task_type: str, agent_id: str, payload: dict, attach=None):
+    loop = asyncio.get_running_loop()
+    early = loop.create_future()
+
+    def on_fields(fields):
+        # called from the agent thread
+        loop.call_soon_threadsafe(lambda: early.done() or early.set_result(fields))
+
+    full = asyncio.ensure_future(call_agent(task_type, agent_id, json.dumps(payload, ensure_ascii=False), on_fields))
+    await asyncio.wait((early, full), return_when=asyncio.FIRST_COMPLETED)
+    if full.done():
+        early.cancel()
+        result = full.result()
+        verdict_cache.put(agent_id, payload, result)
+        return result
+    METRICS.inc("ai_stream_early_total", task_type=task_type)
+    tail = asyncio.ensure_future(finish_stream(task_type, agent_id, payload, full, attach))
+    stream_tails.add(tail)
+    tail.add_done_callback(stream_tails.discard)
+    return early.result()
+
+async def finish_stream(task_type: str, agent_id: str, payload: dict, full, attach):
+    """Wait out a run whose job already completed early."""
+    try:
+        result = await full
+    except Exception as e:
+        log.warning("Streamed agent run failed after its job completed",
+                    extra={"task_type": task_type, "agent_id": agent_id, "error": str(e)})
+        return
+    if result is None:
+        log.warning("Streamed agent run failed after its job completed", extra={"task_type": task_type, "agent_id": agent_id})
+        return
+    verdict_cache.put(agent_id, payload, result)
+    if attach is not None and AI_STREAM == "attach" and isinstance(result, dict):
+        await attach(result)
+
+async def attach_variables(job: Job, name, result: dict):
+    """Set the complete reply on the job's process instance, under `name`
+    (or merged at the top level when `name` is None)."""
+    if gateway is None:
+        return
+    try:
+        await gateway.SetVariables(SetVariablesRequest(
+            elementInstanceKey=job.process_instance_key,
+            variables=json.dumps({name: result} if name else result),
+        ))
+        METRICS.inc("ai_stream_attached_total", task_type=job.type, status="ok")
+    except Exception as e:
+        # the instance may have ended in the meantime
+        METRICS.inc("ai_stream_attached_total", task_type=job.type, status="error")
+        log.warning("Could not attach agent reply", extra={"job_key": job.key, "error": str(e)})
+
+def gate(task_type: str, variables: dict) -> dict:
+    """Pre-screen decision for one AI job (see prescreen.py)."""
+    decision = prescreen(variables)
+    METRICS.inc("ai_prescreen_total", task_type=task_type, path=decision["path"])
+    return decision
+
+# AI stages in process order, and the variables that only describe their
+# runs (left out of input fingerprints)
+AI_STAGES = ("non-deterministic-tests", "ai-report", "ai-advisor")
+AI_OUTPUTS = {"report", "assessment", "prescreen", "ai_inputs"}
+
+def ai_fingerprint(task_type: str, variables: dict) -> str:
+    """Digest of the inputs of the agent behind `task_type`: the payload it
+    would be sent without the AI stages' own outputs, plus the result
+    digests of the stages before it. So a stage re-runs when a failing
+    rule, any field it is sent or an earlier stage's verdict changed."""
+    runs = variables.get("ai_inputs") or {}
+    skip = AI_OUTPUTS.union(*(run.get("outputs", ()) for run in runs.values()))
+    payload = project(task_type, {k: v for k, v in variables.items() if k not in skip})
+    upstream = {t: (runs.get(t) or {}).get("result") for t in AI_STAGES[:AI_STAGES.index(task_type)]}
+    return fingerprint([payload, upstream])
+
+def unchanged(task_type: str, variables: dict, inputs) -> bool:
+    """True when this stage already ran on the same inputs."""
+    if not INCREMENTAL:
+        return False
+    reuse = ((variables.get("ai_inputs") or {}).get(task_type) or {}).get("inputs") == inputs
+    METRICS.inc("ai_reuse_total", task_type=task_type, result="reused" if reuse else "called")
+    return reuse
+
+def with_inputs(task_type: str, variables: dict, inputs, out: dict) -> dict:
+    """`out` plus the updated `ai_inputs` variable, in incremental mode."""
+    if not INCREMENTAL:
+        return out
+    outputs = [k for k in out if k != "prescreen"]
+    run = {"inputs": inputs, "result": fingerprint({k: out[k] for k in outputs})}
+    if task_type == "non-deterministic-tests":
+        run["outputs"] = outputs
+    return {**out, "ai_inputs": {**(variables.get("ai_inputs") or {}), task_type: run}}
+
+@router.task("non-deterministic-tests", **tuned("non-deterministic-tests", "ai", **ai_defaults("non-deterministic-tests")))
+async def handle_non_deterministic(job: Job):
+    inputs = ai_fingerprint("non-deterministic-tests", job.variables) if INCREMENTAL else None
+    if unchanged("non-deterministic-tests", job.variables, inputs):
+        return {}
+    decision = gate("non-deterministic-tests", job.variables)
+    if decision["path"] == "local":
+        log.debug("non-deterministic tests skipped", extra={"job_key": job.key, "risk_score": decision["risk_score"]})
+        return with_inputs("non-deterministic-tests", job.variables, inputs, {"prescreen": decision})
+    result = await run_agent("non-deterministic-tests", "asst_Fx3yFSNAjijmM5xLPK871GZz", job.variables,
+                             attach=partial(attach_variables, job, None))
+    log.debug("non-deterministic tests done", extra={"job_key": job.key})
+    if not isinstance(result, dict):
+        return result
+    return with_inputs("non-deterministic-tests", job.variables, inputs, {**result, "prescreen": decision})
+
+@router.task("ai-report", **tuned("ai-report", "ai", **ai_defaults("ai-report")))
+async def handle_ai_report(job: Job):
+    inputs = ai_fingerprint("ai-report", job.variables) if INCREMENTAL else None
+    if unchanged("ai-report", job.variables, inputs):
+        return {}
+    decision = gate("ai-report", job.variables)
+    if decision["path"] == "local":
+        result = local_report(job.variables, decision)
+    else:
+        result = await run_agent("ai-report", "asst_8njckKJMwvDFd7mHabUIz8AL", job.variables,
+                                 attach=partial(attach_variables, job, "report"))
+    log.debug("ai report done", extra={"job_key": job.key, "path": decision["path"]})
+    return with_inputs("ai-report", job.variables, inputs, {"report": result, "prescreen": decision})
+
+@router.task("ai-advisor", **tuned("ai-advisor", "ai", **ai_defaults("ai-advisor")))
+async def handle_ai_advisor(job: Job):
+    inputs = ai_fingerprint("ai-advisor", job.variables) if INCREMENTAL else None
+    if unchanged("ai-advisor", job.variables, inputs):
+        return {}
+    decision = gate("ai-advisor", job.variables)
+    if decision["path"] == "local":
+        result = local_assessment(job.variables, decision)
+    else:
+        result = await run_agent("ai-advisor", "asst_kxtuR7cEFyyRUh58CPC3ex8c", job.variables,
+                                 attach=partial(attach_variables, job, "assessment"))
+    log.debug("ai advice done", extra={"job_key": job.key, "path": decision["path"]})
+    return with_inputs("ai-advisor", job.variables, inputs, {"assessment": result, "prescreen": decision})
 
-@router.task("ai-advisor")
-def handle_non_deterministic(job: Job):
-    result = run_non_deterministic(agent_id="asst_kxtuR7cEFyyRUh58CPC3ex8c", message_text=json.dumps(dict(job.variables)))
-    print(result)
-    time.sleep(10)
-    return {"assessment": result}
+# -------------------------------
+# Job metrics
+# -------------------------------
+job_started = {}
+
+async def start_timer(job: Job) -> Job:
+    job_started[job.key] = time.perf_counter()
+    return job
+
+async def stop_timer(job: Job) -> Job:
+    started = job_started.pop(job.key, None)
+    if started is not None:
+        METRICS.observe("zeebe_job_duration_seconds", time.perf_counter() - started, task_type=job.type)
+    METRICS.inc("zeebe_jobs_total", task_type=job.type)
+    return job
+
+async def count_failure(exception: Exception, job: Job, job_controller: JobController):
+    METRICS.inc("zeebe_job_failures_total", task_type=job.type)
+    await default_exception_handler(exception, job, job_controller)
+
+async def watch_loop_lag(interval: float = 0.5):
+    """Observe how late the event loop wakes up a sleeping task; anything
+    but a few milliseconds means something is blocking the loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        METRICS.observe("event_loop_lag_seconds", max(0.0, loop.time() - start - interval))
+
+async def report_metrics(queue, interval: float):
+    """Send this process's metrics snapshot to a supervisor every `interval` seconds."""
+    while True:
+        queue.put((os.getpid(), METRICS.snapshot()))
+        await asyncio.sleep(interval)
+
+# Prometheus metrics at http://127.0.0.1:METRICS_PORT/metrics; 0 disables.
+# Under supervisor.py the supervisor serves the combined metrics instead.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
 
 # Create a channel, the worker and include the router with tasks
-async def main():
-    global client, worker
-    print("Worker starting")
+async def main(task_types=None, metrics_queue=None, metrics_interval=5.0):
+    """Run the worker. `task_types` limits it to those task types; with
+    `metrics_queue` set it reports metrics snapshots there (see supervisor.py)
+    instead of serving them on METRICS_PORT.
+    SIGTERM / SIGINT stop activating jobs and drain the running ones."""
+    global client, worker, gateway
+    setup_logging()
+    log.info("Worker starting", extra={"task_types": ",".join(task_types) if task_types else "all"})
     
     # ADD YOUR CREDENTIALS HERE
     grpc_channel = create_camunda_cloud_channel(client_id='',
                                     client_secret='',
                                     cluster_id='',
                                     region="")
-    worker = ZeebeWorker(grpc_channel)
+    recorder = JobRecorder(JOB_RECORD_PATH) if JOB_RECORD_PATH else None
+    if recorder is not None:
+        log.info("Recording jobs", extra={"path": recorder.path})
+    worker = TunedWorker(
+        grpc_channel,
+        settings=TASK_SETTINGS,
+        limits={task_type: (limit, AI_BATCH_SIZE) for task_type, limit in ai_backpressure.items()},
+        before=[start_timer] + ([recorder.before] if recorder is not None else []),
+        after=[stop_timer],
+        exception_handler=count_failure,
+    )
     client = ZeebeClient(grpc_channel)
+    gateway = GatewayStub(grpc_channel)
     worker.include_router(router)
-    await worker.work()
-
-asyncio.run(main())
+    if task_types:
+        for task_type in [task.type for task in worker.tasks if task.type not in task_types]:
+            worker.remove_task(task_type)
+
+    loop = asyncio.get_running_loop()
+    stopping = []
+    def drain():
+        if not stopping:
+            log.info("Worker draining")
+            stopping.append(asyncio.ensure_future(worker.stop()))
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, drain)
+
+    server = None
+    if metrics_queue is not None:
+        reporter = asyncio.ensure_future(report_metrics(metrics_queue, metrics_interval))
+    else:
+        reporter = None
+        if METRICS_PORT:
+            server = serve(METRICS_PORT)
+            log.info("Serving metrics", extra={"port": METRICS_PORT})
+    lag = asyncio.ensure_future(watch_loop_lag())
+    SCREENING.watch()
+    try:
+        await worker.work()
+    finally:
+        if stream_tails:
+            # let streamed runs whose jobs already completed finish
+            await asyncio.gather(*stream_tails, return_exceptions=True)
+        # delete the pooled agent threads and write out cached verdicts
+        await loop.run_in_executor(None, agent_threads.close)
+        await loop.run_in_executor(None, verdict_cache.close)
+        lag.cancel()
+        SCREENING.stop()
+        if reporter is not None:
+            reporter.cancel()
+            metrics_queue.put((os.getpid(), METRICS.snapshot()))
+        if server is not None:
+            server.shutdown()
+        aggregates.close()
+        if recorder is not None:
+            recorder.close()
+        log.info("Worker stopped")
+
+if __name__ == "__main__":
+    asyncio.run(main())